@@ -1,13 +1,25 @@
+import json
 import logging
 import logging.config
 import os
-from asyncio import get_event_loop
-from datetime import date
+import time
+from asyncio import (AbstractEventLoop,
+                     get_event_loop,
+                     ensure_future,
+                     gather)
+from contextlib import contextmanager
+from datetime import (date,
+                      timedelta)
+from functools import wraps
+from typing import (Callable,
+                    Dict,
+                    Optional)
 
 import click
 import pkg_resources
 from python_utils.data_access import get_engine
-from sqlalchemy.engine.url import make_url
+from sqlalchemy.engine.url import (URL,
+                                   make_url)
 from sqlalchemy_utils import (database_exists,
                               create_database,
                               drop_database)
@@ -15,10 +27,77 @@ from sqlalchemy_utils import (database_exists,
 from vizier.config import (PACKAGE,
                            CONFIG_DIR_NAME,
                            LOGGING_CONF_FILE_NAME,
-                           FIRST_FILM_YEAR)
+                           FIRST_FILM_YEAR,
+                           CACHE_FILE_PATH,
+                           ARCHIVE_PATH,
+                           LEASE_DURATION_IN_SECONDS,
+                           CACHE_MAX_SIZE_IN_BYTES,
+                           CACHE_TTLS_IN_SECONDS,
+                           DEFAULT_CACHE_TTL_IN_SECONDS,
+                           WRITE_BACKENDS,
+                           COPY_WRITE_BACKEND,
+                           REFRESH_YEARS_COUNT,
+                           FILMS_MAX_AGE_IN_DAYS,
+                           METRICS_DUMP_INTERVAL_IN_SECONDS,
+                           CONNECTIONS_LIMIT,
+                           CONNECTIONS_PER_HOST_LIMIT,
+                           KEEPALIVE_TIMEOUT_IN_SECONDS,
+                           DNS_CACHE_TTL_IN_SECONDS,
+                           CONNECT_TIMEOUT_IN_SECONDS,
+                           READ_TIMEOUT_IN_SECONDS,
+                           PIPELINE_QUEUE_SIZE,
+                           RESOLVERS_COUNT,
+                           PLOTS_FETCHERS_COUNT,
+                           FETCHERS_COUNT,
+                           DESERIALIZERS_COUNT,
+                           WRITERS_COUNT,
+                           BENCHMARK_START_YEAR,
+                           BENCHMARK_YEARS_COUNT,
+                           BENCHMARK_FILMS_PER_YEAR,
+                           BENCHMARK_LATENCY_IN_SECONDS,
+                           BENCHMARK_ERROR_RATE,
+                           BENCHMARK_PORT,
+                           BENCHMARK_RESULTS_PATH,
+                           RECOMMENDATION_WEIGHTS,
+                           YEARS_BUCKET_SIZE,
+                           RECOMMENDATIONS_COUNT,
+                           PLOTS_INDEX_PATH,
+                           PLOTS_INDEX_FEATURES_COUNT,
+                           PLOTS_INDEX_TABLES_COUNT,
+                           PLOTS_INDEX_BITS_COUNT,
+                           PLOTS_INDEX_BATCH_SIZE,
+                           FEATURES_EXPORT_PATH,
+                           API_HOST,
+                           API_PORT,
+                           API_CACHE_MAX_SIZE,
+                           API_CACHE_TTL_IN_SECONDS,
+                           API_MAX_IDS_COUNT,
+                           API_MAX_RECOMMENDATIONS_COUNT)
+from vizier.api import serve_api
+from vizier.benchmark import (Upstreams,
+                              run_benchmark,
+                              save_result)
+from vizier.export import export_features
+from vizier.metrics import (start_metrics_server,
+                            dump_metrics)
 from vizier.models.base import Base
-from vizier.services.defterdar import (parse_films,
-                                       parse_films_articles)
+from vizier.recommend import (PlotsIndex,
+                              load_films_features,
+                              find_film,
+                              find_similar_films,
+                              update_plots_index)
+from vizier.services.archive import RawFilmsArchive
+from vizier.services.cache import ResponsesCache
+from vizier.services.defterdar import (create_indexes,
+                                       crawl_films,
+                                       drop_secondary_indexes,
+                                       parse_films,
+                                       parse_films_articles,
+                                       refresh_films,
+                                       replay_films,
+                                       run_crawl_worker)
+from vizier.services.transport import (TransportSettings,
+                                       create_session)
 
 logger = logging.getLogger(__file__)
 
@@ -42,27 +121,613 @@ def set_logging(logging_conf_file_path: str, verbose: bool):
         logging.getLogger().setLevel(logging.INFO)
 
 
+@contextmanager
+def exporting_metrics(*, port: Optional[int],
+                      path: Optional[str],
+                      interval: float,
+                      loop: AbstractEventLoop):
+    runner = (None if port is None
+              else loop.run_until_complete(start_metrics_server(port=port)))
+    dumping = (None if path is None
+               else ensure_future(dump_metrics(path,
+                                               interval=interval),
+                                  loop=loop))
+    try:
+        yield
+    finally:
+        if dumping is not None:
+            dumping.cancel()
+            loop.run_until_complete(gather(dumping,
+                                           return_exceptions=True))
+        if runner is not None:
+            loop.run_until_complete(runner.cleanup())
+
+
+@contextmanager
+def bulk_loading(*, enabled: bool,
+                 db_uri: URL,
+                 loop: AbstractEventLoop):
+    if not enabled:
+        yield
+        return
+    loop.run_until_complete(drop_secondary_indexes(db_uri=db_uri,
+                                                   loop=loop))
+    try:
+        yield
+    except BaseException:
+        logger.warning('Bulk load is interrupted, indexes are rebuilt '
+                       'by "create_indexes" command or next bulk load.')
+        raise
+    loop.run_until_complete(create_indexes(db_uri=db_uri,
+                                           loop=loop))
+
+
+@contextmanager
+def http_session(settings: TransportSettings, *,
+                 loop: AbstractEventLoop):
+    session = loop.run_until_complete(create_session(settings))
+    try:
+        yield session
+    finally:
+        loop.run_until_complete(session.close())
+
+
+def transport_options(function: Callable) -> Callable:
+    @wraps(function)
+    def wrapped(*args,
+                connections_limit: int,
+                connections_per_host_limit: int,
+                keepalive_timeout: float,
+                dns_cache_ttl: int,
+                connect_timeout: float,
+                read_timeout: float,
+                **kwargs):
+        settings = TransportSettings(
+            connections_limit=connections_limit,
+            connections_per_host_limit=connections_per_host_limit,
+            keepalive_timeout=keepalive_timeout,
+            dns_cache_ttl=dns_cache_ttl,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout)
+        return function(*args,
+                        transport_settings=settings,
+                        **kwargs)
+
+    options = [
+        click.option('--connections-limit', default=CONNECTIONS_LIMIT,
+                     help='Maximum number of open HTTP connections.'),
+        click.option('--connections-per-host-limit',
+                     default=CONNECTIONS_PER_HOST_LIMIT,
+                     help='Maximum number of open HTTP connections '
+                          'to a single host.'),
+        click.option('--keepalive-timeout',
+                     default=KEEPALIVE_TIMEOUT_IN_SECONDS,
+                     help='Seconds to keep idle HTTP connections open.'),
+        click.option('--dns-cache-ttl', default=DNS_CACHE_TTL_IN_SECONDS,
+                     help='Seconds to cache resolved hosts for.'),
+        click.option('--connect-timeout', default=CONNECT_TIMEOUT_IN_SECONDS,
+                     help='Timeout of HTTP connection in seconds.'),
+        click.option('--read-timeout', default=READ_TIMEOUT_IN_SECONDS,
+                     help='Timeout of HTTP response reading in seconds.'),
+    ]
+    for option in reversed(options):
+        wrapped = option(wrapped)
+    return wrapped
+
+
+def pipeline_options(function: Callable) -> Callable:
+    @wraps(function)
+    def wrapped(*args,
+                queue_size: int,
+                resolvers_count: int,
+                plots_fetchers_count: int,
+                fetchers_count: int,
+                deserializers_count: int,
+                writers_count: int,
+                **kwargs):
+        settings = dict(queue_size=queue_size,
+                        resolvers_count=resolvers_count,
+                        plots_fetchers_count=plots_fetchers_count,
+                        fetchers_count=fetchers_count,
+                        deserializers_count=deserializers_count,
+                        writers_count=writers_count)
+        return function(*args,
+                        pipeline_settings=settings,
+                        **kwargs)
+
+    options = [
+        click.option('--queue-size', default=PIPELINE_QUEUE_SIZE,
+                     help='Maximum number of batches waiting '
+                          'between films pipeline stages.'),
+        click.option('--resolvers-count', default=RESOLVERS_COUNT,
+                     help='Number of concurrent IMDb ids resolvers.'),
+        click.option('--plots-fetchers-count', default=PLOTS_FETCHERS_COUNT,
+                     help='Number of concurrent plots fetchers.'),
+        click.option('--fetchers-count', default=FETCHERS_COUNT,
+                     help='Number of concurrent films data fetchers.'),
+        click.option('--deserializers-count', default=DESERIALIZERS_COUNT,
+                     help='Number of concurrent films data deserializers.'),
+        click.option('--writers-count', default=WRITERS_COUNT,
+                     help='Number of concurrent database writers.'),
+    ]
+    for option in reversed(options):
+        wrapped = option(wrapped)
+    return wrapped
+
+
 @main.command(name='run')
 @click.option('--clean', is_flag=True, help='Removes database.')
 @click.option('--init', is_flag=True, help='Initializes database.')
+@click.option('--cache-path', default=CACHE_FILE_PATH,
+              help='Path to HTTP responses cache file.')
+@click.option('--cache-max-size', default=CACHE_MAX_SIZE_IN_BYTES,
+              help='Maximum size of HTTP responses cache in bytes.')
+@click.option('--no-cache', is_flag=True,
+              help='Disables HTTP responses cache.')
+@click.option('--archive-path', default=ARCHIVE_PATH,
+              help='Path to directory with raw responses archive.')
+@click.option('--no-archive', is_flag=True,
+              help='Disables archiving of raw responses.')
+@click.option('--offline', is_flag=True,
+              help='Uses only cached HTTP responses.')
+@click.option('--cache-streamed', is_flag=True,
+              help='Caches streamed articles listings, '
+                   'so they are available in offline mode.')
+@click.option('--resume', is_flag=True,
+              help='Skips work completed by previous runs.')
+@click.option('--start-year', default=FIRST_FILM_YEAR,
+              help='First year of films to parse.')
+@click.option('--stop-year', type=int,
+              help='Year to stop parsing films at, '
+                   'defaults to the next one.')
+@click.option('--overlap', is_flag=True,
+              help='Parses films of every year as soon as '
+                   'its articles are found.')
+@click.option('--worker', is_flag=True,
+              help='Shares work with other processes '
+                   'running with this flag.')
+@click.option('--reset-leases', is_flag=True,
+              help='Makes workers process again units completed '
+                   'by previous runs, should be passed to first worker.')
+@click.option('--lease-duration', default=LEASE_DURATION_IN_SECONDS,
+              help='Seconds after which work of unresponsive worker '
+                   'is taken over.')
+@click.option('--write-backend', type=click.Choice(WRITE_BACKENDS),
+              default=WRITE_BACKENDS[0],
+              help='Database writing strategy, '
+                   '"copy" is faster for initial loads.')
+@click.option('--bulk-load', is_flag=True,
+              help='Drops secondary indexes and foreign keys '
+                   'before loading and rebuilds them afterwards.')
+@click.option('--metrics-port', type=int,
+              help='Port to serve Prometheus metrics on.')
+@click.option('--metrics-path',
+              help='Path to periodically dump JSON metrics to.')
+@click.option('--metrics-interval', default=METRICS_DUMP_INTERVAL_IN_SECONDS,
+              help='Interval of metrics dumps in seconds.')
+@pipeline_options
+@transport_options
 @click.pass_context
-def run(ctx: click.Context, clean: bool, init: bool):
+def run(ctx: click.Context, clean: bool, init: bool,
+        cache_path: str,
+        cache_max_size: int,
+        no_cache: bool,
+        archive_path: str,
+        no_archive: bool,
+        offline: bool,
+        cache_streamed: bool,
+        resume: bool,
+        start_year: int,
+        stop_year: Optional[int],
+        overlap: bool,
+        worker: bool,
+        reset_leases: bool,
+        lease_duration: int,
+        write_backend: str,
+        bulk_load: bool,
+        metrics_port: Optional[int],
+        metrics_path: Optional[str],
+        metrics_interval: float,
+        pipeline_settings: Dict[str, int],
+        transport_settings: TransportSettings):
+    if no_cache and offline:
+        raise click.UsageError('Offline mode requires cache.')
+    if no_cache and cache_streamed:
+        raise click.UsageError('Streamed responses caching requires cache.')
+    if worker and resume:
+        raise click.UsageError('Workers always resume shared work.')
+    if worker and overlap:
+        raise click.UsageError('Workers process stages one after another.')
+    if reset_leases and not worker:
+        raise click.UsageError('Only workers use leases.')
+    if worker and bulk_load:
+        raise click.UsageError('Workers cannot tell when load is finished '
+                               'to rebuild indexes.')
     if clean:
         ctx.invoke(clean_db)
     if init:
         ctx.invoke(init_db)
     logging.info('Running "Vizier" service.')
     db_uri = make_url(ctx.obj['db_uri'])
+    if stop_year is None:
+        stop_year = date.today().year + 1
+    loop = get_event_loop()
+    use_copy = write_backend == COPY_WRITE_BACKEND
+    cache = None if no_cache else ResponsesCache(
+        cache_path,
+        max_size=cache_max_size,
+        ttls=CACHE_TTLS_IN_SECONDS,
+        default_ttl=DEFAULT_CACHE_TTL_IN_SECONDS,
+        offline=offline,
+        cache_streamed=cache_streamed)
+    archive = None if no_archive else RawFilmsArchive(archive_path)
+    try:
+        with exporting_metrics(port=metrics_port,
+                               path=metrics_path,
+                               interval=metrics_interval,
+                               loop=loop), \
+                http_session(transport_settings,
+                             loop=loop) as session, \
+                bulk_loading(enabled=bulk_load,
+                             db_uri=db_uri,
+                             loop=loop):
+            if worker:
+                loop.run_until_complete(run_crawl_worker(
+                    start_year=start_year,
+                    stop_year=stop_year,
+                    lease_duration=timedelta(seconds=lease_duration),
+                    reset=reset_leases,
+                    **pipeline_settings,
+                    db_uri=db_uri,
+                    use_copy=use_copy,
+                    session=session,
+                    cache=cache,
+                    archive=archive,
+                    loop=loop))
+                return
+            if overlap:
+                loop.run_until_complete(crawl_films(
+                    start_year=start_year,
+                    stop_year=stop_year,
+                    **pipeline_settings,
+                    db_uri=db_uri,
+                    use_copy=use_copy,
+                    resume=resume,
+                    session=session,
+                    cache=cache,
+                    archive=archive,
+                    loop=loop))
+                return
+            loop.run_until_complete(parse_films_articles(
+                db_uri=db_uri,
+                start_year=start_year,
+                stop_year=stop_year,
+                use_copy=use_copy,
+                resume=resume,
+                session=session,
+                cache=cache,
+                loop=loop))
+            loop.run_until_complete(parse_films(
+                start_year=start_year,
+                stop_year=stop_year,
+                **pipeline_settings,
+                db_uri=db_uri,
+                use_copy=use_copy,
+                resume=resume,
+                session=session,
+                cache=cache,
+                archive=archive,
+                loop=loop))
+    finally:
+        if cache is not None:
+            cache.close()
+        if archive is not None:
+            archive.close()
+
+
+@main.command(name='refresh')
+@click.option('--years', default=REFRESH_YEARS_COUNT,
+              help='Number of recent years to look for new articles in.')
+@click.option('--max-age', default=FILMS_MAX_AGE_IN_DAYS,
+              help='Age in days after which films data is re-fetched.')
+@click.option('--cache-path', default=CACHE_FILE_PATH,
+              help='Path to HTTP responses cache file.')
+@click.option('--cache-max-size', default=CACHE_MAX_SIZE_IN_BYTES,
+              help='Maximum size of HTTP responses cache in bytes.')
+@click.option('--no-cache', is_flag=True,
+              help='Disables HTTP responses cache.')
+@click.option('--cache-streamed', is_flag=True,
+              help='Caches streamed articles listings.')
+@click.option('--archive-path', default=ARCHIVE_PATH,
+              help='Path to directory with raw responses archive.')
+@click.option('--no-archive', is_flag=True,
+              help='Disables archiving of raw responses.')
+@click.option('--write-backend', type=click.Choice(WRITE_BACKENDS),
+              default=WRITE_BACKENDS[0],
+              help='Database writing strategy.')
+@click.option('--metrics-port', type=int,
+              help='Port to serve Prometheus metrics on.')
+@click.option('--metrics-path',
+              help='Path to periodically dump JSON metrics to.')
+@click.option('--metrics-interval', default=METRICS_DUMP_INTERVAL_IN_SECONDS,
+              help='Interval of metrics dumps in seconds.')
+@pipeline_options
+@transport_options
+@click.pass_context
+def refresh(ctx: click.Context,
+            years: int,
+            max_age: int,
+            cache_path: str,
+            cache_max_size: int,
+            no_cache: bool,
+            cache_streamed: bool,
+            archive_path: str,
+            no_archive: bool,
+            write_backend: str,
+            metrics_port: Optional[int],
+            metrics_path: Optional[str],
+            metrics_interval: float,
+            pipeline_settings: Dict[str, int],
+            transport_settings: TransportSettings):
+    """Fetches new films articles and re-fetches outdated films."""
+    if no_cache and cache_streamed:
+        raise click.UsageError('Streamed responses caching requires cache.')
+    logging.info('Refreshing "Vizier" films.')
+    db_uri = make_url(ctx.obj['db_uri'])
     next_year = date.today().year + 1
     loop = get_event_loop()
-    loop.run_until_complete(parse_films_articles(db_uri=db_uri,
-                                                 start_year=FIRST_FILM_YEAR,
-                                                 stop_year=next_year,
-                                                 loop=loop))
-    loop.run_until_complete(parse_films(start_year=FIRST_FILM_YEAR,
-                                        stop_year=next_year,
-                                        db_uri=db_uri,
-                                        loop=loop))
+    use_copy = write_backend == COPY_WRITE_BACKEND
+    max_age = timedelta(days=max_age)
+    # cached responses should not be older than refreshed data
+    ttls = {url: min(ttl, max_age.total_seconds())
+            for url, ttl in CACHE_TTLS_IN_SECONDS.items()}
+    cache = None if no_cache else ResponsesCache(
+        cache_path,
+        max_size=cache_max_size,
+        ttls=ttls,
+        default_ttl=DEFAULT_CACHE_TTL_IN_SECONDS,
+        cache_streamed=cache_streamed)
+    archive = None if no_archive else RawFilmsArchive(archive_path)
+    try:
+        with exporting_metrics(port=metrics_port,
+                               path=metrics_path,
+                               interval=metrics_interval,
+                               loop=loop), \
+                http_session(transport_settings,
+                             loop=loop) as session:
+            loop.run_until_complete(refresh_films(
+                start_year=next_year - years,
+                stop_year=next_year,
+                max_age=max_age,
+                **pipeline_settings,
+                db_uri=db_uri,
+                use_copy=use_copy,
+                session=session,
+                cache=cache,
+                archive=archive,
+                loop=loop))
+    finally:
+        if cache is not None:
+            cache.close()
+        if archive is not None:
+            archive.close()
+
+
+@main.command(name='replay')
+@click.option('--archive-path', default=ARCHIVE_PATH,
+              help='Path to directory with raw responses archive.')
+@click.option('--start-year', type=int,
+              help='First year of archived films to replay.')
+@click.option('--stop-year', type=int,
+              help='Year to stop replaying archived films at.')
+@click.option('--write-backend', type=click.Choice(WRITE_BACKENDS),
+              default=WRITE_BACKENDS[0],
+              help='Database writing strategy.')
+@click.pass_context
+def replay(ctx: click.Context,
+           archive_path: str,
+           start_year: Optional[int],
+           stop_year: Optional[int],
+           write_backend: str):
+    """Saves archived raw responses to database without network."""
+    logging.info(f'Replaying "{archive_path}" archive.')
+    db_uri = make_url(ctx.obj['db_uri'])
+    loop = get_event_loop()
+    use_copy = write_backend == COPY_WRITE_BACKEND
+    loop.run_until_complete(replay_films(archive_path=archive_path,
+                                         start_year=start_year,
+                                         stop_year=stop_year,
+                                         db_uri=db_uri,
+                                         use_copy=use_copy,
+                                         loop=loop))
+
+
+@main.command(name='benchmark')
+@click.option('--db-uri', required=True,
+              help='URI of database to benchmark on, '
+                   'it is recreated by every run.')
+@click.option('--start-year', default=BENCHMARK_START_YEAR,
+              help='First year of films to parse.')
+@click.option('--years', default=BENCHMARK_YEARS_COUNT,
+              help='Number of years to parse.')
+@click.option('--films-per-year', default=BENCHMARK_FILMS_PER_YEAR,
+              help='Number of films articles per year.')
+@click.option('--latency', default=BENCHMARK_LATENCY_IN_SECONDS,
+              help='Mean upstreams response delay in seconds.')
+@click.option('--error-rate', default=BENCHMARK_ERROR_RATE,
+              help='Fraction of upstreams responses '
+                   'with "A Timeout Occurred" status.')
+@click.option('--port', default=BENCHMARK_PORT,
+              help='First port of upstreams stand-ins.')
+@click.option('--write-backend', type=click.Choice(WRITE_BACKENDS),
+              default=WRITE_BACKENDS[0],
+              help='Database writing strategy.')
+@click.option('--results-path', default=BENCHMARK_RESULTS_PATH,
+              help='Path to JSON lines file to append result to.')
+def benchmark(db_uri: str,
+              start_year: int,
+              years: int,
+              films_per_year: int,
+              latency: float,
+              error_rate: float,
+              port: int,
+              write_backend: str,
+              results_path: str):
+    """Measures films parsing throughput against local upstreams."""
+    upstreams = Upstreams(films_per_year=films_per_year,
+                          latency=latency,
+                          error_rate=error_rate)
+    loop = get_event_loop()
+    result = loop.run_until_complete(run_benchmark(
+        start_year=start_year,
+        stop_year=start_year + years,
+        upstreams=upstreams,
+        port=port,
+        write_backend=write_backend,
+        db_uri=db_uri))
+    save_result(result,
+                path=results_path)
+    click.echo(json.dumps(result,
+                          indent=2))
+
+
+@main.command(name='recommend')
+@click.argument('film')
+@click.option('--count', default=RECOMMENDATIONS_COUNT,
+              help='Number of similar films to show.')
+@click.option('--plots', is_flag=True,
+              help='Looks for films with similar stories.')
+@click.option('--plots-index-path', default=PLOTS_INDEX_PATH,
+              help='Path to plots index built by "index_plots".')
+@click.pass_context
+def recommend(ctx: click.Context,
+              film: str,
+              count: int,
+              plots: bool,
+              plots_index_path: str):
+    """Shows films similar to one with given IMDb ID or title."""
+    if plots:
+        features = PlotsIndex.load(plots_index_path)
+    else:
+        db_uri = make_url(ctx.obj['db_uri'])
+        loop = get_event_loop()
+        features = loop.run_until_complete(load_films_features(
+            weights=RECOMMENDATION_WEIGHTS,
+            years_bucket_size=YEARS_BUCKET_SIZE,
+            db_uri=db_uri,
+            loop=loop))
+    position = find_film(features, film)
+    if position is None:
+        raise click.BadParameter(f'Film "{film}" is not found.',
+                                 param_hint='film')
+    start = time.perf_counter()
+    if plots:
+        recommendations = features.find_similar(position,
+                                                count=count)
+    else:
+        recommendations = find_similar_films(features, position,
+                                             count=count)
+    logging.info(f'Found {len(recommendations)} similar films '
+                 f'in {(time.perf_counter() - start) * 1000:.2f} ms.')
+    for recommendation in recommendations:
+        click.echo(f'{recommendation.similarity:.3f}\t'
+                   f'tt{recommendation.imdb_id:07}\t'
+                   f'{recommendation.title}')
+
+
+@main.command(name='index_plots')
+@click.option('--index-path', default=PLOTS_INDEX_PATH,
+              help='Path to plots index file.')
+@click.option('--rebuild', is_flag=True,
+              help='Indexes all plots from scratch.')
+@click.pass_context
+def index_plots(ctx: click.Context,
+                index_path: str,
+                rebuild: bool):
+    """Adds plots of new and updated films to similarity index."""
+    db_uri = make_url(ctx.obj['db_uri'])
+    loop = get_event_loop()
+    if rebuild or not os.path.exists(index_path):
+        index = PlotsIndex(features_count=PLOTS_INDEX_FEATURES_COUNT,
+                           tables_count=PLOTS_INDEX_TABLES_COUNT,
+                           bits_count=PLOTS_INDEX_BITS_COUNT)
+    else:
+        index = PlotsIndex.load(index_path)
+    updated_count = loop.run_until_complete(update_plots_index(
+        index,
+        batch_size=PLOTS_INDEX_BATCH_SIZE,
+        db_uri=db_uri,
+        loop=loop))
+    index.save(index_path)
+    logging.info(f'Updated plots of {updated_count} films, '
+                 f'index has {len(index)} plots.')
+
+
+@main.command(name='export_features')
+@click.option('--path', default=FEATURES_EXPORT_PATH,
+              help='Path to directory with exported features.')
+@click.option('--rebuild', is_flag=True,
+              help='Exports all films from scratch.')
+@click.pass_context
+def export_features_command(ctx: click.Context,
+                            path: str,
+                            rebuild: bool):
+    """Exports films features changed since previous export."""
+    db_uri = make_url(ctx.obj['db_uri'])
+    loop = get_event_loop()
+    films_count = loop.run_until_complete(export_features(
+        path,
+        rebuild=rebuild,
+        db_uri=db_uri,
+        loop=loop))
+    logging.info(f'Exported {films_count} films to "{path}".')
+
+
+@main.command(name='serve')
+@click.option('--host', default=API_HOST,
+              help='Host to serve API on.')
+@click.option('--port', default=API_PORT,
+              help='Port to serve API on.')
+@click.option('--max-connections', default=20,
+              help='Maximum number of database connections.')
+@click.option('--cache-max-size', default=API_CACHE_MAX_SIZE,
+              help='Maximum number of cached films.')
+@click.option('--cache-ttl', default=API_CACHE_TTL_IN_SECONDS,
+              help='Seconds to keep cached films for.')
+@click.option('--plots-index-path', default=PLOTS_INDEX_PATH,
+              help='Path to plots index built by "index_plots".')
+@click.pass_context
+def serve(ctx: click.Context,
+          host: str,
+          port: int,
+          max_connections: int,
+          cache_max_size: int,
+          cache_ttl: int,
+          plots_index_path: str):
+    """Serves films and recommendations over HTTP."""
+    db_uri = make_url(ctx.obj['db_uri'])
+    loop = get_event_loop()
+    serving = ensure_future(serve_api(
+        host=host,
+        port=port,
+        max_connections=max_connections,
+        cache_max_size=cache_max_size,
+        cache_ttl=cache_ttl,
+        max_ids_count=API_MAX_IDS_COUNT,
+        recommendations_count=RECOMMENDATIONS_COUNT,
+        max_recommendations_count=API_MAX_RECOMMENDATIONS_COUNT,
+        weights=RECOMMENDATION_WEIGHTS,
+        years_bucket_size=YEARS_BUCKET_SIZE,
+        plots_index_path=plots_index_path,
+        db_uri=db_uri,
+        loop=loop),
+        loop=loop)
+    try:
+        loop.run_until_complete(serving)
+    except KeyboardInterrupt:
+        serving.cancel()
+        loop.run_until_complete(gather(serving,
+                                       return_exceptions=True))
 
 
 @main.command(name='clean_db')
@@ -92,5 +757,19 @@ def init_db(ctx: click.Context):
         Base.metadata.create_all(bind=engine)
 
 
+@main.command(name='create_indexes')
+@click.option('--max-connections', default=10,
+              help='Maximum number of indexes built at once.')
+@click.pass_context
+def create_indexes_command(ctx: click.Context,
+                           max_connections: int):
+    """Creates missing keys, indexes and foreign keys of Postgres database."""
+    db_uri = make_url(ctx.obj['db_uri'])
+    loop = get_event_loop()
+    loop.run_until_complete(create_indexes(max_connections=max_connections,
+                                           db_uri=db_uri,
+                                           loop=loop))
+
+
 if __name__ == '__main__':
     main()
@@ -6,9 +6,12 @@ setup(name=PACKAGE,
       version='0.1.0',
       packages=find_packages(),
       install_requires=[
-          'wikipedia==1.4.0',
           'psycopg2>=2.6.2',
-          'aiohttp>=1.3.3',
+          'aiohttp>=3.3.0',
+          'ijson>=3.0',
+          'numpy>=1.15.0',
+          'scipy>=1.0.0',
           'cetus>=0.3.3',
+          'asyncio_extras>=1.3.0',
           'SQLAlchemy>=1.0.12',
       ])
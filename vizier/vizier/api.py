@@ -0,0 +1,370 @@
+import logging
+import os
+import time
+from asyncio import (AbstractEventLoop,
+                     Event,
+                     Future,
+                     get_event_loop,
+                     shield)
+from collections import OrderedDict
+from typing import (Any,
+                    Iterable,
+                    Optional,
+                    Dict, List)
+
+from aiohttp import web
+from cetus.data_access import (get_connection_pool,
+                               is_db_uri_mysql)
+from cetus.data_access.reading import fetch_columns
+from cetus.types import (ConnectionPoolType,
+                         ConnectionType)
+from sqlalchemy import Table
+from sqlalchemy.engine.url import URL
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from vizier.models import (Genre, Director,
+                           Writer, Actor,
+                           Country, Language,
+                           Film, Plot)
+from vizier.recommend import (FilmsFeatures,
+                              PlotsIndex,
+                              Recommendation,
+                              load_films_features,
+                              find_similar_films)
+from vizier.recommend.features import RELATIONS_TABLES
+from vizier.utils import join_str
+
+logger = logging.getLogger(__name__)
+
+RELATED_MODELS = dict(genres=Genre,
+                      directors=Director,
+                      writers=Writer,
+                      actors=Actor,
+                      countries=Country,
+                      languages=Language)
+FILMS_COLUMNS_NAMES = [Film.id.name, Film.imdb_id.name, Film.title.name,
+                       Film.type.name, Film.duration.name,
+                       Film.release_date.name, Film.content_rating.name,
+                       Film.imdb_rating.name, Film.poster_url.name]
+PLOTS_COLUMNS_NAMES = [Plot.imdb_content.name,
+                       Plot.wikipedia_content.name]
+FEATURES_SIMILARITY = 'features'
+PLOTS_SIMILARITY = 'plots'
+
+FilmType = Dict[str, Any]
+
+
+class FilmsCache:
+    # least recently used films are evicted first,
+    # absent films are cached too, so they do not hit database
+    def __init__(self, *, max_size: int,
+                 ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.films = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.films)
+
+    def get(self, imdb_id: int) -> Optional[FilmType]:
+        expires_at, film = self.films[imdb_id]
+        if expires_at < time.monotonic():
+            del self.films[imdb_id]
+            raise KeyError(imdb_id)
+        self.films.move_to_end(imdb_id)
+        return film
+
+    def set(self, imdb_id: int, film: Optional[FilmType]) -> None:
+        self.films[imdb_id] = time.monotonic() + self.ttl, film
+        self.films.move_to_end(imdb_id)
+        while len(self.films) > self.max_size:
+            self.films.popitem(last=False)
+
+
+class FilmsLoader:
+    # concurrent lookups of the same films wait for single query
+    def __init__(self, *, cache: FilmsCache,
+                 is_mysql: bool,
+                 connection_pool: ConnectionPoolType):
+        self.cache = cache
+        self.is_mysql = is_mysql
+        self.connection_pool = connection_pool
+        self.pending = {}
+
+    async def load(self, imdb_ids: Iterable[int]
+                   ) -> Dict[int, Optional[FilmType]]:
+        res = {}
+        missing_imdb_ids = []
+        pending = {}
+        for imdb_id in dict.fromkeys(imdb_ids):
+            try:
+                res[imdb_id] = self.cache.get(imdb_id)
+                continue
+            except KeyError:
+                pass
+            try:
+                pending[imdb_id] = self.pending[imdb_id]
+            except KeyError:
+                missing_imdb_ids.append(imdb_id)
+        if missing_imdb_ids:
+            # registered before any suspension point,
+            # so concurrent lookups find them pending
+            loop = get_event_loop()
+            futures = {imdb_id: loop.create_future()
+                       for imdb_id in missing_imdb_ids}
+            self.pending.update(futures)
+            # shielded, so cancelled request does not fail others
+            # waiting for the same films
+            res.update(await shield(self.fetch(futures)))
+        for imdb_id, future in pending.items():
+            res[imdb_id] = await shield(future)
+        return res
+
+    async def fetch(self, futures: Dict[int, Future]
+                    ) -> Dict[int, Optional[FilmType]]:
+        imdb_ids = list(futures)
+        try:
+            async with self.connection_pool.acquire() as connection:
+                films = await fetch_films(imdb_ids,
+                                          is_mysql=self.is_mysql,
+                                          connection=connection)
+        except Exception as error:
+            for future in futures.values():
+                fail_future(future, error)
+            raise
+        finally:
+            for imdb_id in imdb_ids:
+                del self.pending[imdb_id]
+        res = {}
+        for imdb_id, future in futures.items():
+            film = res[imdb_id] = films.get(imdb_id)
+            self.cache.set(imdb_id, film)
+            future.set_result(film)
+        return res
+
+
+def fail_future(future: Future, error: Exception) -> None:
+    future.set_exception(error)
+    # marking exception as retrieved if nobody waits for it
+    future.exception()
+
+
+async def fetch_films(imdb_ids: List[int], *,
+                      is_mysql: bool,
+                      connection: ConnectionType
+                      ) -> Dict[int, FilmType]:
+    # related objects are loaded by single query per relation
+    # for all requested films instead of query per film
+    columns = join_str(f'films.{column_name}'
+                       for column_name in FILMS_COLUMNS_NAMES)
+    plots_columns = join_str(f'plots.{column_name}'
+                             for column_name in PLOTS_COLUMNS_NAMES)
+    query = (f'SELECT {columns}, {plots_columns} '
+             f'FROM {Film.__tablename__} AS films '
+             f'LEFT JOIN {Plot.__tablename__} AS plots '
+             f'ON plots.{Plot.id.name} = films.{Film.plot_id.name} '
+             f'WHERE films.{Film.imdb_id.name} '
+             f'IN ({join_str(imdb_ids)})')
+    records = await fetch_columns(query,
+                                  columns_names=(FILMS_COLUMNS_NAMES
+                                                 + PLOTS_COLUMNS_NAMES),
+                                  is_mysql=is_mysql,
+                                  connection=connection)
+    films_by_ids = {}
+    for record in records:
+        record = tuple(record)
+        film = dict(zip(FILMS_COLUMNS_NAMES, record))
+        imdb_content, wikipedia_content = record[len(FILMS_COLUMNS_NAMES):]
+        film.update(duration=(None if film['duration'] is None
+                              else film['duration'].total_seconds() / 60),
+                    release_date=(None if film['release_date'] is None
+                                  else film['release_date'].isoformat()),
+                    plot=dict(imdb=imdb_content,
+                              wikipedia=wikipedia_content))
+        films_by_ids[film.pop(Film.id.name)] = film
+    for name in RELATIONS_TABLES:
+        for film in films_by_ids.values():
+            film[name] = []
+    if films_by_ids:
+        for name, table in RELATIONS_TABLES.items():
+            names_by_films_ids = await fetch_related_names(
+                films_by_ids,
+                table=table,
+                cls=RELATED_MODELS[name],
+                is_mysql=is_mysql,
+                connection=connection)
+            for film_id, related_names in names_by_films_ids.items():
+                films_by_ids[film_id][name] = related_names
+    return {film['imdb_id']: film
+            for film in films_by_ids.values()}
+
+
+async def fetch_related_names(films_ids: Iterable[int], *,
+                              table: Table,
+                              cls: DeclarativeMeta,
+                              is_mysql: bool,
+                              connection: ConnectionType
+                              ) -> Dict[int, List[str]]:
+    film_column, related_column = table.columns
+    query = (f'SELECT relation.{film_column.name}, '
+             f'related.{cls.name.name} '
+             f'FROM {table.name} AS relation '
+             f'JOIN {cls.__tablename__} AS related '
+             f'ON related.{cls.id.name} = relation.{related_column.name} '
+             f'WHERE relation.{film_column.name} '
+             f'IN ({join_str(films_ids)}) '
+             f'ORDER BY related.{cls.name.name}')
+    records = await fetch_columns(query,
+                                  columns_names=['film_id', 'name'],
+                                  is_mysql=is_mysql,
+                                  connection=connection)
+    res = {}
+    for film_id, name in records:
+        res.setdefault(film_id, []).append(name)
+    return res
+
+
+def parse_imdb_id(value: str) -> int:
+    # both "tt0111161" and "111161" forms are accepted
+    try:
+        return int(value[2:] if value.startswith('tt') else value)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f'Invalid IMDb ID: "{value}".')
+
+
+def to_recommendation_json(recommendation: Recommendation
+                           ) -> Dict[str, Any]:
+    return dict(imdb_id=recommendation.imdb_id,
+                title=recommendation.title,
+                similarity=recommendation.similarity)
+
+
+async def handle_film(request: web.Request) -> web.Response:
+    imdb_id = parse_imdb_id(request.match_info['imdb_id'])
+    films = await request.app['loader'].load([imdb_id])
+    film = films[imdb_id]
+    if film is None:
+        raise web.HTTPNotFound(text=f'Film "{imdb_id}" is not found.')
+    return web.json_response(film)
+
+
+async def handle_films(request: web.Request) -> web.Response:
+    imdb_ids = [parse_imdb_id(value)
+                for value in request.query.get('imdb_ids', '').split(',')
+                if value]
+    max_ids_count = request.app['max_ids_count']
+    if len(imdb_ids) > max_ids_count:
+        raise web.HTTPBadRequest(text=f'At most {max_ids_count} IMDb IDs '
+                                      f'can be requested at once.')
+    films = await request.app['loader'].load(imdb_ids)
+    return web.json_response([film
+                              for film in films.values()
+                              if film is not None])
+
+
+async def handle_similar_films(request: web.Request) -> web.Response:
+    imdb_id = parse_imdb_id(request.match_info['imdb_id'])
+    similarity = request.query.get('by', FEATURES_SIMILARITY)
+    try:
+        count = int(request.query.get('count',
+                                      request.app['recommendations_count']))
+    except ValueError:
+        raise web.HTTPBadRequest(text='Invalid count of films.')
+    if count < 1:
+        raise web.HTTPBadRequest(text='Count of films should be positive.')
+    count = min(count, request.app['max_recommendations_count'])
+    if similarity == PLOTS_SIMILARITY:
+        index = request.app['plots_index']
+        if index is None:
+            raise web.HTTPNotFound(text='Plots index is not loaded.')
+    elif similarity == FEATURES_SIMILARITY:
+        index = request.app['features']
+    else:
+        raise web.HTTPBadRequest(text=f'Invalid similarity: '
+                                      f'"{similarity}".')
+    position = request.app['positions'][similarity].get(imdb_id)
+    if position is None:
+        raise web.HTTPNotFound(text=f'Film "{imdb_id}" is not found.')
+    if similarity == PLOTS_SIMILARITY:
+        recommendations = index.find_similar(position,
+                                             count=count)
+    else:
+        recommendations = find_similar_films(index, position,
+                                             count=count)
+    return web.json_response([to_recommendation_json(recommendation)
+                              for recommendation in recommendations])
+
+
+def create_app(*, loader: FilmsLoader,
+               features: FilmsFeatures,
+               plots_index: Optional[PlotsIndex],
+               max_ids_count: int,
+               recommendations_count: int,
+               max_recommendations_count: int) -> web.Application:
+    app = web.Application()
+    app['loader'] = loader
+    app['features'] = features
+    app['plots_index'] = plots_index
+    app['positions'] = {
+        FEATURES_SIMILARITY: to_positions(features.imdb_ids),
+        PLOTS_SIMILARITY: ({} if plots_index is None
+                           else to_positions(plots_index.imdb_ids))}
+    app['max_ids_count'] = max_ids_count
+    app['recommendations_count'] = recommendations_count
+    app['max_recommendations_count'] = max_recommendations_count
+    app.router.add_get('/films', handle_films)
+    app.router.add_get('/films/{imdb_id}', handle_film)
+    app.router.add_get('/films/{imdb_id}/similar', handle_similar_films)
+    return app
+
+
+def to_positions(imdb_ids: Iterable[int]) -> Dict[int, int]:
+    return {int(imdb_id): position
+            for position, imdb_id in enumerate(imdb_ids)}
+
+
+async def serve_api(*, host: str,
+                    port: int,
+                    max_connections: int,
+                    cache_max_size: int,
+                    cache_ttl: float,
+                    max_ids_count: int,
+                    recommendations_count: int,
+                    max_recommendations_count: int,
+                    weights: Dict[str, float],
+                    years_bucket_size: int,
+                    plots_index_path: str,
+                    db_uri: URL,
+                    loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    features = await load_films_features(weights=weights,
+                                         years_bucket_size=years_bucket_size,
+                                         db_uri=db_uri,
+                                         loop=loop)
+    plots_index = (PlotsIndex.load(plots_index_path)
+                   if os.path.exists(plots_index_path)
+                   else None)
+    async with get_connection_pool(db_uri=db_uri,
+                                   is_mysql=db_is_mysql,
+                                   max_size=max_connections,
+                                   loop=loop) as connection_pool:
+        loader = FilmsLoader(cache=FilmsCache(max_size=cache_max_size,
+                                              ttl=cache_ttl),
+                             is_mysql=db_is_mysql,
+                             connection_pool=connection_pool)
+        app = create_app(loader=loader,
+                         features=features,
+                         plots_index=plots_index,
+                         max_ids_count=max_ids_count,
+                         recommendations_count=recommendations_count,
+                         max_recommendations_count=max_recommendations_count)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logger.info(f'Serving API on http://{host}:{port}.')
+        try:
+            # until cancellation
+            await Event().wait()
+        finally:
+            await runner.cleanup()
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from asyncio import (create_subprocess_exec,
+                     sleep)
+from typing import (Any,
+                    Awaitable,
+                    Callable,
+                    Dict,
+                    NamedTuple, Tuple)
+
+from aiohttp import web
+
+from vizier.metrics import format_labels
+from vizier.models import Film
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_HOST = 'localhost'
+HandlerType = Callable[[web.Request], Awaitable[web.Response]]
+# URLs with servers by names of environment variables
+UpstreamsServersType = Dict[str, Tuple[str, web.AppRunner]]
+
+
+class Upstreams(NamedTuple):
+    films_per_year: int
+    # mean response delay in seconds
+    latency: float
+    # fraction of requests answered with "A Timeout Occurred" status
+    error_rate: float
+
+
+def to_title(year: int, index: int) -> str:
+    return f'Benchmark film {index} ({year} film)'
+
+
+def to_wikidata_item_id(year: int, index: int) -> str:
+    return f'Q{year}{index:06}'
+
+
+def to_imdb_id(wikidata_item_id: str) -> str:
+    return f'tt{wikidata_item_id[1:]}'
+
+
+def parse_title(title: str) -> Dict[str, int]:
+    # titles have "Benchmark film {index} ({year} film)" form
+    _, _, index, year, _ = title.split()
+    return dict(year=int(year.lstrip('(')),
+                index=int(index))
+
+
+def serve_petscan(request: web.Request, *,
+                  upstreams: Upstreams) -> Dict[str, Any]:
+    # categories have "{year}_films" form
+    year = int(request.query['categories'].split('_')[0])
+    articles_dicts = [dict(title=to_title(year, index))
+                      for index in range(upstreams.films_per_year)]
+    return {'*': [{'a': {'*': articles_dicts}}]}
+
+
+def serve_wikipedia(request: web.Request, *,
+                    upstreams: Upstreams) -> Dict[str, Any]:
+    pages = []
+    for title in request.query['titles'].split('|'):
+        page = dict(title=title)
+        if request.query['prop'] == 'pageprops':
+            wikidata_item_id = to_wikidata_item_id(**parse_title(title))
+            page['pageprops'] = dict(wikibase_item=wikidata_item_id)
+        else:
+            content = (f"'''{title}''' is a film.\n"
+                       '== Plot ==\n'
+                       + '[[Hero]] meets [[Villain|villain]]. ' * 20)
+            page['revisions'] = [dict(slots=dict(main=dict(content=content)))]
+        pages.append(page)
+    return dict(query=dict(pages=pages))
+
+
+def serve_wikidata(request: web.Request, *,
+                   upstreams: Upstreams) -> Dict[str, Any]:
+    entities = {}
+    for wikidata_item_id in request.query['ids'].split('|'):
+        imdb_id = to_imdb_id(wikidata_item_id)
+        claim = dict(mainsnak=dict(datavalue=dict(value=imdb_id)))
+        entities[wikidata_item_id] = dict(claims=dict(P345=[claim]))
+    return dict(entities=entities)
+
+
+def serve_imdb(request: web.Request, *,
+               upstreams: Upstreams) -> Dict[str, Any]:
+    imdb_id = request.query['i']
+    year = request.query['y']
+    return dict(Title=f'Benchmark film {imdb_id}',
+                Year=year,
+                Rated='PG-13',
+                Released=f'01 Jan {year}',
+                Runtime='1 h 42 min',
+                Genre='Action, Drama, Sci-Fi',
+                Director=f'Director {imdb_id}',
+                Writer=f'Writer {imdb_id}, Writer {random.randrange(1000)}',
+                Actors=', '.join(f'Actor {random.randrange(10000)}'
+                                 for _ in range(4)),
+                Plot='Hero meets villain. ' * 20,
+                Language='English',
+                Country='USA',
+                Poster='N/A',
+                imdbRating='7.1',
+                imdbID=imdb_id,
+                Type='movie',
+                Response='True')
+
+
+def to_handler(serve: Callable[..., Dict[str, Any]], *,
+               upstreams: Upstreams) -> HandlerType:
+    async def handle(request: web.Request) -> web.Response:
+        await sleep(random.expovariate(1. / upstreams.latency)
+                    if upstreams.latency else 0)
+        if random.random() < upstreams.error_rate:
+            # Cloudflare's "A Timeout Occurred"
+            return web.Response(status=524)
+        return web.json_response(serve(request,
+                                       upstreams=upstreams))
+
+    return handle
+
+
+async def start_upstreams(upstreams: Upstreams, *,
+                          port: int) -> UpstreamsServersType:
+    servers = dict(VIZIER_PETSCAN_API_URL=serve_petscan,
+                   VIZIER_WIKIPEDIA_API_URL=serve_wikipedia,
+                   VIZIER_WIKIDATA_API_URL=serve_wikidata,
+                   VIZIER_IMDB_API_URL=serve_imdb)
+    res = {}
+    # separate ports make every upstream a separate host for limiters
+    for offset, (url_variable_name, serve) in enumerate(servers.items()):
+        app = web.Application()
+        app.router.add_get('/', to_handler(serve,
+                                           upstreams=upstreams))
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, BENCHMARK_HOST, port + offset)
+        await site.start()
+        url = f'http://{BENCHMARK_HOST}:{port + offset}/'
+        res[url_variable_name] = url, runner
+    return res
+
+
+async def run_benchmark(*, start_year: int,
+                        stop_year: int,
+                        upstreams: Upstreams,
+                        port: int,
+                        write_backend: str,
+                        db_uri: str) -> Dict[str, Any]:
+    servers = await start_upstreams(upstreams,
+                                    port=port)
+    environment = dict(os.environ,
+                       DB_URI=db_uri)
+    for url_variable_name, (url, _) in servers.items():
+        environment[url_variable_name] = url
+    metrics_file_descriptor, metrics_path = tempfile.mkstemp(suffix='.json')
+    os.close(metrics_file_descriptor)
+    try:
+        start = time.monotonic()
+        process = await create_subprocess_exec(
+            sys.executable, os.path.abspath(sys.argv[0]),
+            'run', '--clean', '--init', '--no-cache', '--no-archive',
+            '--start-year', str(start_year),
+            '--stop-year', str(stop_year),
+            '--write-backend', write_backend,
+            '--metrics-path', metrics_path,
+            env=environment)
+        return_code = await process.wait()
+        elapsed = time.monotonic() - start
+        if return_code:
+            raise RuntimeError(f'Benchmarked run failed '
+                               f'with exit code {return_code}.')
+        with open(metrics_path) as file:
+            metrics = json.load(file)
+    finally:
+        os.remove(metrics_path)
+        for _, runner in servers.values():
+            await runner.cleanup()
+    films_label = format_labels((('table', Film.__tablename__),))
+    films_count = metrics['vizier_db_rows_written_total'].get(films_label, 0)
+    stages_durations = metrics['vizier_stage_duration_seconds']
+    return dict(commit=get_commit(),
+                time=time.time(),
+                parameters=dict(start_year=start_year,
+                                stop_year=stop_year,
+                                write_backend=write_backend,
+                                **upstreams._asdict()),
+                elapsed=elapsed,
+                films_count=films_count,
+                films_per_second=films_count / elapsed,
+                stages_latencies={stage: dict(p50=durations['p50'],
+                                              p99=durations['p99'])
+                                  for stage, durations
+                                  in stages_durations.items()},
+                # kilobytes on Linux
+                peak_rss=resource.getrusage(
+                    resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_result(result: Dict[str, Any], *,
+                path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory,
+                    exist_ok=True)
+    # one result per line makes runs of different commits comparable
+    with open(path, 'a') as file:
+        file.write(json.dumps(result) + '\n')
@@ -1,3 +1,5 @@
+import os
+
 PACKAGE = 'vizier'
 CONFIG_DIR_NAME = 'configurations'
 LOGGING_CONF_FILE_NAME = 'logging.conf'
@@ -6,7 +8,146 @@ RELEASE_DATE_FORMAT = '%d %b %Y'
 NOT_AVAILABLE_VALUE_ALIAS = 'N/A'
 FIRST_FILM_YEAR = 1887
 
-WIKIPEDIA_API_URL = 'https://en.wikipedia.org/w/api.php'
-IMDB_API_URL = 'https://www.omdbapi.com'
-PETSCAN_API_URL = 'https://petscan.wmflabs.org'
-RETRY_INTERVAL_IN_SECONDS = 1
+# upstreams can be replaced, e.g. with benchmark stand-ins
+WIKIPEDIA_API_URL = os.environ.get('VIZIER_WIKIPEDIA_API_URL',
+                                   'https://en.wikipedia.org/w/api.php')
+WIKIDATA_API_URL = os.environ.get('VIZIER_WIKIDATA_API_URL',
+                                  'https://www.wikidata.org/w/api.php')
+IMDB_API_URL = os.environ.get('VIZIER_IMDB_API_URL',
+                              'https://www.omdbapi.com')
+PETSCAN_API_URL = os.environ.get('VIZIER_PETSCAN_API_URL',
+                                 'https://petscan.wmflabs.org')
+# retries of failed requests
+MAX_ATTEMPTS_COUNT = 10
+BACKOFF_BASE_IN_SECONDS = 0.5
+BACKOFF_CAP_IN_SECONDS = 60
+# per-host requests limits adjusted
+# with additive increase/multiplicative decrease
+DEFAULT_HOST_LIMITS = dict(rate=10.,
+                           min_rate=0.5,
+                           max_rate=100.,
+                           max_concurrency=20,
+                           rate_increase=1.,
+                           decrease_factor=0.5,
+                           # each successful request earns
+                           # a fraction of retry
+                           retry_budget_ratio=0.2,
+                           min_retry_budget=10.,
+                           max_retry_budget=100.,
+                           # larger responses are dropped, no cap if "None"
+                           max_response_size=None)
+HOSTS_LIMITS = {
+    IMDB_API_URL: dict(rate=20.,
+                       max_concurrency=50,
+                       max_response_size=1024 ** 2),
+    PETSCAN_API_URL: dict(rate=1.,
+                          max_rate=5.,
+                          max_concurrency=5),
+    WIKIPEDIA_API_URL: dict(max_concurrency=10,
+                            max_response_size=50 * 1024 ** 2),
+    WIKIDATA_API_URL: dict(max_concurrency=10,
+                           max_response_size=50 * 1024 ** 2),
+}
+# single HTTP session is shared by all upstreams
+CONNECTIONS_LIMIT = 100
+CONNECTIONS_PER_HOST_LIMIT = max(limits.get('max_concurrency',
+                                            DEFAULT_HOST_LIMITS[
+                                                'max_concurrency'])
+                                 for limits in HOSTS_LIMITS.values())
+KEEPALIVE_TIMEOUT_IN_SECONDS = 30
+DNS_CACHE_TTL_IN_SECONDS = 10 * 60
+CONNECT_TIMEOUT_IN_SECONDS = 10
+READ_TIMEOUT_IN_SECONDS = 60
+# maximum number of titles (or entities ids) per MediaWiki API query
+WIKIPEDIA_API_TITLES_LIMIT = 50
+# number of streamed articles titles saved at once
+ARTICLES_BATCH_SIZE = 1_000
+
+INSERT_WRITE_BACKEND = 'insert'
+COPY_WRITE_BACKEND = 'copy'
+WRITE_BACKENDS = (INSERT_WRITE_BACKEND, COPY_WRITE_BACKEND)
+
+# maximum number of names ids kept in memory per personalities table
+NAMES_IDS_CACHE_SIZE = 100_000
+# films pipeline stages are connected by bounded queues
+PIPELINE_QUEUE_SIZE = 10
+RESOLVERS_COUNT = 5
+PLOTS_FETCHERS_COUNT = 5
+FETCHERS_COUNT = 20
+DESERIALIZERS_COUNT = 1
+WRITERS_COUNT = 5
+
+CACHE_FILE_PATH = 'cache/responses.sqlite3'
+CACHE_MAX_SIZE_IN_BYTES = 10 * 1024 ** 3
+DAY_IN_SECONDS = 24 * 60 * 60
+# films data rarely changes,
+# while categories get new articles every day
+CACHE_TTLS_IN_SECONDS = {
+    IMDB_API_URL: 30 * DAY_IN_SECONDS,
+    PETSCAN_API_URL: DAY_IN_SECONDS,
+    WIKIPEDIA_API_URL: 7 * DAY_IN_SECONDS,
+    WIKIDATA_API_URL: 7 * DAY_IN_SECONDS,
+}
+DEFAULT_CACHE_TTL_IN_SECONDS = DAY_IN_SECONDS
+
+# crawl workers lease years and ranges of articles ids
+LEASE_DURATION_IN_SECONDS = 10 * 60
+LEASES_POLLING_INTERVAL_IN_SECONDS = 10
+FILMS_LEASE_UNIT_SIZE = 10_000
+MAX_LEASE_ATTEMPTS_COUNT = 3
+
+# raw OMDb responses partitioned by year
+ARCHIVE_PATH = 'archive'
+
+# refresh looks for new articles only among recent years
+REFRESH_YEARS_COUNT = 2
+FILMS_MAX_AGE_IN_DAYS = 30
+
+METRICS_DUMP_INTERVAL_IN_SECONDS = 10
+
+BENCHMARK_START_YEAR = 2000
+BENCHMARK_YEARS_COUNT = 5
+BENCHMARK_FILMS_PER_YEAR = 500
+BENCHMARK_LATENCY_IN_SECONDS = 0.05
+BENCHMARK_ERROR_RATE = 0.01
+BENCHMARK_PORT = 18080
+BENCHMARK_RESULTS_PATH = 'benchmarks/results.jsonl'
+
+# relative importance of films features groups in similarity
+RECOMMENDATION_WEIGHTS = dict(genres=1.,
+                              directors=2.,
+                              writers=1.5,
+                              actors=1.5,
+                              countries=0.5,
+                              languages=0.5,
+                              years=0.5)
+# films released within the same bucket of years are similar
+YEARS_BUCKET_SIZE = 5
+RECOMMENDATIONS_COUNT = 10
+
+# films updated this long before snapshot of their table
+# are processed again, should exceed duration of writing transactions
+FILMS_WATERMARK_MARGIN_IN_SECONDS = 10 * 60
+
+PLOTS_INDEX_PATH = os.path.join('indexes', 'plots.npz')
+# terms are hashed into fixed number of features
+PLOTS_INDEX_FEATURES_COUNT = 2 ** 18
+# more tables find more similar plots, more bits make buckets smaller
+PLOTS_INDEX_TABLES_COUNT = 16
+PLOTS_INDEX_BITS_COUNT = 12
+PLOTS_INDEX_BATCH_SIZE = 10_000
+
+# memory-mapped films features for models training
+FEATURES_EXPORT_PATH = 'features'
+
+API_HOST = '0.0.0.0'
+API_PORT = 10000
+API_CACHE_MAX_SIZE = 100_000
+API_CACHE_TTL_IN_SECONDS = 10 * 60
+# maximum number of films requested by single bulk lookup
+API_MAX_IDS_COUNT = 1_000
+# maximum number of similar films returned at once
+API_MAX_RECOMMENDATIONS_COUNT = 100
+
+# memory for every index built after bulk load
+INDEX_BUILD_MEMORY = '256MB'
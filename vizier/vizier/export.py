@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import shutil
+from asyncio import AbstractEventLoop
+from datetime import (datetime,
+                      timedelta)
+from typing import (Any,
+                    AsyncIterator,
+                    Optional,
+                    Dict, List,
+                    NamedTuple, Tuple)
+
+import numpy as np
+from cetus.data_access import (get_connection,
+                               is_db_uri_mysql)
+from cetus.types import (ConnectionType,
+                         RecordType)
+from scipy import sparse
+from sqlalchemy import Column
+from sqlalchemy.engine.url import URL
+
+from vizier.config import FILMS_WATERMARK_MARGIN_IN_SECONDS
+from vizier.models import (Article,
+                           Film)
+from vizier.recommend.features import RELATIONS_TABLES
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = 'manifest.json'
+ARRAY_FILE_NAME_SUFFIX = '.npy'
+CURSOR_PREFETCH = 10_000
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class FeaturesSegment(NamedTuple):
+    ids: np.ndarray
+    imdb_ids: np.ndarray
+    # "-1" for films without plots
+    plot_ids: np.ndarray
+    imdb_ratings: np.ndarray
+    # in minutes
+    durations: np.ndarray
+    years: np.ndarray
+    # multi-hot matrices with related objects ids as columns
+    relations: Dict[str, sparse.csr_matrix]
+    # names of related objects referenced by segment
+    # along with their ids in ascending order
+    names_ids: Dict[str, np.ndarray]
+    names: Dict[str, np.ndarray]
+
+
+def check_export_support(*, is_mysql: bool) -> None:
+    if is_mysql:
+        err_msg = ('Invalid database: '
+                   'features export is supported only by PostgreSQL.')
+        raise ValueError(err_msg)
+
+
+async def export_features(path: str, *,
+                          rebuild: bool = False,
+                          db_uri: URL,
+                          loop: AbstractEventLoop) -> int:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_export_support(is_mysql=db_is_mysql)
+    if rebuild and os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path, exist_ok=True)
+    manifest = read_manifest(path)
+    exported_until = manifest['exported_until']
+    async with get_connection(db_uri=db_uri,
+                              is_mysql=db_is_mysql,
+                              loop=loop) as connection:
+        arrays, snapshot_time = await fetch_segment_arrays(
+            updated_after=(None if exported_until is None
+                           else datetime.strptime(exported_until,
+                                                  TIMESTAMP_FORMAT)),
+            connection=connection)
+    films_count = arrays['ids'].size
+    if not films_count:
+        return 0
+    # films changed since previous export are appended as new segment,
+    # so already exported files are never rewritten
+    segment_name = f'{len(manifest["segments"]):06}'
+    write_arrays(os.path.join(path, segment_name),
+                 arrays=arrays)
+    manifest['segments'].append(dict(name=segment_name,
+                                     films_count=films_count))
+    # films are saved with time of their transactions start,
+    # so ones committed after snapshot could have earlier times;
+    # they are exported again and supersede previous copies
+    exported_until = snapshot_time - timedelta(
+        seconds=FILMS_WATERMARK_MARGIN_IN_SECONDS)
+    manifest['exported_until'] = exported_until.strftime(TIMESTAMP_FORMAT)
+    for name in RELATIONS_TABLES:
+        manifest['columns_counts'][name] = max(
+            manifest['columns_counts'].get(name, 0),
+            int(arrays[f'{name}_indices'].max(initial=-1)) + 1)
+    write_manifest(path,
+                   manifest=manifest)
+    return films_count
+
+
+async def fetch_segment_arrays(*, updated_after: Optional[datetime],
+                               connection: ConnectionType
+                               ) -> Tuple[Dict[str, np.ndarray],
+                                          datetime]:
+    films_filter = ('' if updated_after is None
+                    else f'WHERE films.{Film.updated_at.name} > $1 ')
+    args = () if updated_after is None else (updated_after,)
+    # films years are taken from their Wikipedia categories
+    films_query = (f'SELECT films.{Film.id.name}, '
+                   f'films.{Film.imdb_id.name}, '
+                   f'films.{Film.plot_id.name}, '
+                   f'films.{Film.imdb_rating.name}, '
+                   f'EXTRACT(EPOCH FROM films.{Film.duration.name}) / 60, '
+                   f'articles.{Article.year.name} '
+                   f'FROM {Film.__tablename__} AS films '
+                   f'LEFT JOIN {Article.__tablename__} AS articles '
+                   f'ON articles.{Article.id.name} = '
+                   f'films.{Film.article_id.name} '
+                   f'{films_filter}'
+                   f'ORDER BY films.{Film.id.name}')
+    columns = [[] for _ in range(6)]
+    # single snapshot keeps films consistent with their relations
+    async with connection.transaction(isolation='repeatable_read',
+                                      readonly=True):
+        snapshot_time = await connection.fetchval('SELECT LOCALTIMESTAMP')
+        async for records in stream_records(films_query, *args,
+                                            connection=connection):
+            for record in records:
+                for column, value in zip(columns, record):
+                    column.append(value)
+        ids, imdb_ids, plot_ids, imdb_ratings, durations, years = columns
+        arrays = dict(ids=np.array(ids, dtype=np.int64),
+                      imdb_ids=np.array(imdb_ids, dtype=np.int64),
+                      plot_ids=np.array([-1 if plot_id is None else plot_id
+                                         for plot_id in plot_ids],
+                                        dtype=np.int64),
+                      imdb_ratings=to_dense_array(imdb_ratings),
+                      durations=to_dense_array(durations),
+                      years=to_dense_array(years))
+        for name, table in RELATIONS_TABLES.items():
+            film_column, related_column = table.columns
+            relation_query = (f'SELECT DISTINCT '
+                              f'relation.{film_column.name}, '
+                              f'relation.{related_column.name} '
+                              f'FROM {table.name} AS relation '
+                              f'JOIN {Film.__tablename__} AS films '
+                              f'ON films.{Film.id.name} = '
+                              f'relation.{film_column.name} '
+                              f'{films_filter}'
+                              f'ORDER BY relation.{film_column.name}, '
+                              f'relation.{related_column.name}')
+            films_ids_chunks = []
+            related_ids_chunks = []
+            async for records in stream_records(relation_query, *args,
+                                                connection=connection):
+                films_ids, related_ids = zip(*records)
+                films_ids_chunks.append(np.array(films_ids,
+                                                 dtype=np.int64))
+                related_ids_chunks.append(np.array(related_ids,
+                                                   dtype=np.int32))
+            arrays.update(to_csr_arrays(
+                name,
+                films_ids=np.concatenate([np.empty(0, dtype=np.int64),
+                                          *films_ids_chunks]),
+                related_ids=np.concatenate([np.empty(0, dtype=np.int32),
+                                            *related_ids_chunks]),
+                ids=arrays['ids']))
+            arrays.update(await fetch_names_arrays(
+                name,
+                related_column=related_column,
+                related_ids=np.unique(arrays[f'{name}_indices']),
+                connection=connection))
+    return arrays, snapshot_time
+
+
+async def fetch_names_arrays(name: str, *,
+                             related_column: Column,
+                             related_ids: np.ndarray,
+                             connection: ConnectionType
+                             ) -> Dict[str, np.ndarray]:
+    foreign_key, = related_column.foreign_keys
+    related_table = foreign_key.column.table
+    names_query = (f'SELECT id, name '
+                   f'FROM {related_table.name} '
+                   f'WHERE id = ANY($1) '
+                   f'ORDER BY id')
+    records = await connection.fetch(names_query, related_ids.tolist())
+    # fixed-width strings can be memory-mapped unlike objects
+    return {f'{name}_names_ids': np.array([id_ for id_, _ in records],
+                                          dtype=np.int32),
+            f'{name}_names': np.array([name_ or ''
+                                       for _, name_ in records],
+                                      dtype=np.str_)}
+
+
+async def stream_records(query: str, *args: Any,
+                         connection: ConnectionType
+                         ) -> AsyncIterator[List[RecordType]]:
+    # server-side cursor does not load whole result in memory
+    cursor = await connection.cursor(query, *args,
+                                     prefetch=CURSOR_PREFETCH)
+    while True:
+        records = await cursor.fetch(CURSOR_PREFETCH)
+        if not records:
+            return
+        yield records
+
+
+def to_dense_array(values: List[Optional[float]]) -> np.ndarray:
+    return np.array([np.nan if value is None else float(value)
+                     for value in values],
+                    dtype=np.float32)
+
+
+def to_csr_arrays(name: str, *,
+                  films_ids: np.ndarray,
+                  related_ids: np.ndarray,
+                  ids: np.ndarray) -> Dict[str, np.ndarray]:
+    # relations are ordered by films ids like films themselves
+    rows = np.searchsorted(ids, films_ids)
+    rows_sizes = np.bincount(rows, minlength=ids.size)
+    indptr = np.concatenate([[0], np.cumsum(rows_sizes)]).astype(np.int64)
+    return {f'{name}_data': np.ones(related_ids.size, dtype=np.float32),
+            f'{name}_indices': related_ids,
+            f'{name}_indptr': indptr}
+
+
+def write_arrays(path: str, *,
+                 arrays: Dict[str, np.ndarray]) -> None:
+    # written aside, so interrupted export leaves no partial segment
+    temporary_path = path + '.tmp'
+    # segment not listed in manifest is left by interrupted export
+    for leftover_path in (temporary_path, path):
+        if os.path.exists(leftover_path):
+            shutil.rmtree(leftover_path)
+    os.makedirs(temporary_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary_path,
+                             name + ARRAY_FILE_NAME_SUFFIX),
+                array)
+    os.replace(temporary_path, path)
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE_NAME)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return dict(segments=[],
+                    exported_until=None,
+                    columns_counts={})
+
+
+def write_manifest(path: str, *,
+                   manifest: Dict[str, Any]) -> None:
+    manifest_path = os.path.join(path, MANIFEST_FILE_NAME)
+    temporary_path = manifest_path + '.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(manifest, file,
+                  indent=2)
+    os.replace(temporary_path, manifest_path)
+
+
+def open_features(path: str) -> List[FeaturesSegment]:
+    # arrays are memory-mapped, so nothing is read until accessed;
+    # films from later segments supersede ones with the same ids
+    manifest = read_manifest(path)
+    res = []
+    for segment in manifest['segments']:
+        segment_path = os.path.join(path, segment['name'])
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(segment_path,
+                                        name + ARRAY_FILE_NAME_SUFFIX),
+                           mmap_mode='r')
+
+        films_count = segment['films_count']
+        relations = {
+            name: sparse.csr_matrix(
+                (load(f'{name}_data'),
+                 load(f'{name}_indices'),
+                 load(f'{name}_indptr')),
+                shape=(films_count,
+                       manifest['columns_counts'].get(name, 0)),
+                copy=False)
+            for name in RELATIONS_TABLES}
+        res.append(FeaturesSegment(ids=load('ids'),
+                                   imdb_ids=load('imdb_ids'),
+                                   plot_ids=load('plot_ids'),
+                                   imdb_ratings=load('imdb_ratings'),
+                                   durations=load('durations'),
+                                   years=load('years'),
+                                   relations=relations,
+                                   names_ids={
+                                       name: load(f'{name}_names_ids')
+                                       for name in RELATIONS_TABLES},
+                                   names={
+                                       name: load(f'{name}_names')
+                                       for name in RELATIONS_TABLES}))
+    return res
@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import time
+from asyncio import sleep
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import (Any,
+                    Dict, List,
+                    Tuple)
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LabelsType = Tuple[Tuple[str, str], ...]
+
+# upper bounds in seconds
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5,
+                   1., 2.5, 5., 10., 30., 60.)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        METRICS.append(self)
+
+    def samples(self) -> List[Tuple[str, LabelsType, float]]:
+        return [(self.name, labels, value)
+                for labels, value in self.values.items()]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {format_labels(labels): value
+                for labels, value in self.values.items()}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, value: float = 1., **labels: str) -> None:
+        key = to_labels(labels)
+        self.values[key] = self.values.get(key, 0.) + value
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[to_labels(labels)] = value
+
+    def inc(self, value: float = 1., **labels: str) -> None:
+        key = to_labels(labels)
+        self.values[key] = self.values.get(key, 0.) + value
+
+    def dec(self, value: float = 1., **labels: str) -> None:
+        self.inc(-value, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, *,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = to_labels(labels)
+        try:
+            buckets_counts, total = self.values[key]
+        except KeyError:
+            # last bucket is "+Inf"
+            buckets_counts, total = [0] * (len(self.buckets) + 1), 0.
+        buckets_counts[bisect_left(self.buckets, value)] += 1
+        self.values[key] = buckets_counts, total + value
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelsType, float]]:
+        res = []
+        for labels, (buckets_counts, total) in self.values.items():
+            cumulative_count = 0
+            bounds = [*map(str, self.buckets), '+Inf']
+            for bound, bucket_count in zip(bounds, buckets_counts):
+                cumulative_count += bucket_count
+                res.append((f'{self.name}_bucket',
+                            labels + (('le', bound),),
+                            cumulative_count))
+            res.append((f'{self.name}_sum', labels, total))
+            res.append((f'{self.name}_count', labels, cumulative_count))
+        return res
+
+    def snapshot(self) -> Dict[str, Any]:
+        res = {}
+        for labels, (buckets_counts, total) in self.values.items():
+            count = sum(buckets_counts)
+            res[format_labels(labels)] = dict(
+                count=count,
+                sum=total,
+                mean=total / count,
+                p50=self.estimate_quantile(buckets_counts, .5),
+                p99=self.estimate_quantile(buckets_counts, .99))
+        return res
+
+    def estimate_quantile(self, buckets_counts: List[int],
+                          quantile: float) -> float:
+        rank = quantile * sum(buckets_counts)
+        cumulative_count = 0
+        lower_bound = 0.
+        for upper_bound, bucket_count in zip(self.buckets, buckets_counts):
+            if bucket_count and cumulative_count + bucket_count >= rank:
+                # assuming uniform distribution inside of bucket
+                fraction = (rank - cumulative_count) / bucket_count
+                return lower_bound + (upper_bound - lower_bound) * fraction
+            cumulative_count += bucket_count
+            lower_bound = upper_bound
+        # values from "+Inf" bucket are not bounded
+        return lower_bound
+
+
+METRICS = []
+
+HTTP_REQUESTS = Counter('vizier_http_requests_total',
+                        'HTTP requests by upstream host and status.')
+HTTP_REQUEST_DURATION = Histogram('vizier_http_request_duration_seconds',
+                                  'HTTP requests latency by upstream host.')
+HTTP_RETRIES = Counter('vizier_http_retries_total',
+                       'Retried HTTP requests by upstream host and reason.')
+QUEUE_SIZE = Gauge('vizier_queue_size',
+                   'Items waiting in pipeline stage source queue.')
+STAGE_IN_FLIGHT = Gauge('vizier_stage_in_flight',
+                        'Items being handled by pipeline stage.')
+STAGE_DURATION = Histogram('vizier_stage_duration_seconds',
+                           'Pipeline stage handling time per item.')
+DB_WRITE_DURATION = Histogram('vizier_db_write_duration_seconds',
+                              'Database writes latency by table.')
+DB_ROWS_WRITTEN = Counter('vizier_db_rows_written_total',
+                          'Rows written to database by table.')
+
+
+@contextmanager
+def measure_write(*, table_name: str,
+                  rows_count: int):
+    with DB_WRITE_DURATION.time(table=table_name):
+        yield
+    DB_ROWS_WRITTEN.inc(rows_count, table=table_name)
+
+
+def to_labels(labels: Dict[str, str]) -> LabelsType:
+    return tuple(sorted((name, str(value))
+                        for name, value in labels.items()))
+
+
+def format_labels(labels: LabelsType) -> str:
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            if labels:
+                name += f'{{{format_labels(labels)}}}'
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot_metrics() -> Dict[str, Dict[str, Any]]:
+    return {metric.name: metric.snapshot()
+            for metric in METRICS}
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(),
+                        content_type='text/plain')
+
+
+async def start_metrics_server(*, host: str = 'localhost',
+                               port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f'Serving metrics on http://{host}:{port}/metrics.')
+    return runner
+
+
+async def dump_metrics(path: str, *,
+                       interval: float) -> None:
+    previous_rows_counts = {}
+    previous_time = time.monotonic()
+    while True:
+        try:
+            await sleep(interval)
+        finally:
+            # last dump is made on cancellation
+            current_time = time.monotonic()
+            rows_counts = DB_ROWS_WRITTEN.snapshot()
+            elapsed = current_time - previous_time
+            rows_per_second = {
+                labels: ((count - previous_rows_counts.get(labels, 0.))
+                         / elapsed)
+                for labels, count in rows_counts.items()}
+            previous_rows_counts, previous_time = rows_counts, current_time
+            write_metrics(path,
+                          rows_per_second=rows_per_second)
+
+
+def write_metrics(path: str, *,
+                  rows_per_second: Dict[str, float]) -> None:
+    metrics = dict(time=time.time(),
+                   rows_per_second=rows_per_second,
+                   **snapshot_metrics())
+    # replacing keeps file consistent for readers
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(metrics, file,
+                  indent=2)
+    os.replace(temporary_path, path)
@@ -1,5 +1,9 @@
 from .article import Article
+from .checkpoint import Checkpoint
+from .country import Country
 from .film import Film
 from .genre import Genre
+from .language import Language
+from .lease import Lease
 from .personalities import Director, Actor, Writer
 from .plot import Plot
@@ -1,9 +1,11 @@
 from sqlalchemy import (Column,
                         BigInteger,
+                        Index,
                         String)
 from sqlalchemy import Integer
 
-from .base import (Base, 
+from .base import (KEPT_ON_BULK_LOAD_INFO_KEY,
+                   Base,
                    ModelMixin)
 
 
@@ -13,9 +15,15 @@ class Article(ModelMixin, Base):
     id = Column('id', BigInteger,
                 primary_key=True,
                 autoincrement=True)
-    title = Column('title', String, nullable=False)
+    title = Column('title', String,
+                   nullable=False,
+                   unique=True)
     year = Column('year', Integer, nullable=False)
 
+    # for keyset pagination over articles by years
+    __table_args__ = (Index('articles_year_id_index', 'year', 'id',
+                            info={KEPT_ON_BULK_LOAD_INFO_KEY: True}),)
+
     def __init__(self, title: str, year: int):
         self.title = title
         self.year = year
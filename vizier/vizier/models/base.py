@@ -2,10 +2,22 @@ from typing import (Any,
                     Iterator)
 
 from cetus.types import ColumnValueType
+from sqlalchemy import MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 
-Base = declarative_base()
+# PostgreSQL default names, so constraints of databases
+# created before are found by the same names
+NAMING_CONVENTION = {'pk': '%(table_name)s_pkey',
+                     'uq': '%(table_name)s_%(column_0_name)s_key',
+                     'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# marks indexes which loads read through,
+# so they are not dropped before bulk loads
+KEPT_ON_BULK_LOAD_INFO_KEY = 'kept_on_bulk_load'
+
+Base = declarative_base(metadata=MetaData(
+    naming_convention=NAMING_CONVENTION))
 
 
 class ModelMixin:
@@ -0,0 +1,23 @@
+from sqlalchemy import (Column,
+                        BigInteger,
+                        String)
+
+from .base import (Base,
+                   ModelMixin)
+
+ARTICLES_STAGE = 'articles'
+FILMS_STAGE = 'films'
+
+
+class Checkpoint(ModelMixin, Base):
+    __tablename__ = 'checkpoints'
+
+    stage = Column('stage', String(32),
+                   primary_key=True)
+    # year for articles stage, article id for films stage
+    item = Column('item', BigInteger,
+                  primary_key=True)
+
+    def __init__(self, stage: str, item: int):
+        self.stage = stage
+        self.item = item
@@ -0,0 +1,23 @@
+from sqlalchemy import (Column,
+                        Integer,
+                        String)
+
+from .base import (Base,
+                   ModelMixin)
+
+
+class Country(ModelMixin, Base):
+    __tablename__ = 'countries'
+
+    id = Column('id', Integer,
+                primary_key=True,
+                autoincrement=True)
+    name = Column('name', String,
+                  nullable=False,
+                  unique=True)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __hash__(self):
+        return hash(self.name)
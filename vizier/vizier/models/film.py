@@ -1,24 +1,31 @@
 from datetime import (timedelta,
-                      date)
-from typing import (Optional,
+                      date,
+                      datetime)
+from typing import (Any,
+                    Optional,
                     Dict)
 
 from sqlalchemy import (Table,
                         Column,
                         ForeignKey,
+                        Index,
                         BigInteger,
                         Integer,
                         Float,
                         String,
                         Date,
-                        Interval)
+                        DateTime,
+                        Interval,
+                        func)
 from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.orm import relationship
 
 from .article import Article
 from .base import (Base,
                    ModelMixin)
+from .country import Country
 from .genre import Genre
+from .language import Language
 from .personalities import (Director,
                             Writer,
                             Actor)
@@ -29,6 +36,7 @@ from .utils import (parse_year,
                     parse_rating,
                     parse_date,
                     parse_duration,
+                    parse_names_list,
                     normalize_value)
 
 # SQLAlchemy uses "PascalCase" for column type names
@@ -36,37 +44,65 @@ from .utils import (parse_year,
 FILM_TYPES = ('movie', 'episode')
 FilmType = ENUM(*FILM_TYPES, name='film_type')
 
+# composite primary keys serve lookups by films,
+# lookups by related objects need their own indexes
 films_genres_table = Table('films_genres', Base.metadata,
                            Column('film_id', Integer,
                                   ForeignKey('films.id'),
-                                  nullable=False),
+                                  primary_key=True),
                            Column('genre_id', Integer,
                                   ForeignKey('genres.id'),
-                                  nullable=False))
+                                  primary_key=True),
+                           Index('films_genres_genre_id_index', 'genre_id'))
 
 films_directors_table = Table('films_directors', Base.metadata,
                               Column('film_id', Integer,
                                      ForeignKey('films.id'),
-                                     nullable=False),
+                                     primary_key=True),
                               Column('director_id', Integer,
                                      ForeignKey('directors.id'),
-                                     nullable=False))
+                                     primary_key=True),
+                              Index('films_directors_director_id_index',
+                                    'director_id'))
 
 films_writers_table = Table('films_writers', Base.metadata,
                             Column('film_id', Integer,
                                    ForeignKey('films.id'),
-                                   nullable=False),
+                                   primary_key=True),
                             Column('writer_id', Integer,
                                    ForeignKey('writers.id'),
-                                   nullable=False))
+                                   primary_key=True),
+                            Index('films_writers_writer_id_index',
+                                  'writer_id'))
 
 films_actors_table = Table('films_actors', Base.metadata,
                            Column('film_id', Integer,
                                   ForeignKey('films.id'),
-                                  nullable=False),
+                                  primary_key=True),
                            Column('actor_id', Integer,
                                   ForeignKey('actors.id'),
-                                  nullable=False))
+                                  primary_key=True),
+                           Index('films_actors_actor_id_index', 'actor_id'))
+
+films_countries_table = Table('films_countries', Base.metadata,
+                              Column('film_id', Integer,
+                                     ForeignKey('films.id'),
+                                     primary_key=True),
+                              Column('country_id', Integer,
+                                     ForeignKey('countries.id'),
+                                     primary_key=True),
+                              Index('films_countries_country_id_index',
+                                    'country_id'))
+
+films_languages_table = Table('films_languages', Base.metadata,
+                              Column('film_id', Integer,
+                                     ForeignKey('films.id'),
+                                     primary_key=True),
+                              Column('language_id', Integer,
+                                     ForeignKey('languages.id'),
+                                     primary_key=True),
+                              Index('films_languages_language_id_index',
+                                    'language_id'))
 
 
 class Film(ModelMixin, Base):
@@ -79,8 +115,6 @@ class Film(ModelMixin, Base):
                   nullable=False)
     title = Column('title', String,
                    nullable=False)
-    countries = Column('countries', String)
-    languages = Column('languages', String)
     duration = Column('duration', Interval)
     release_date = Column('release_date', Date)
     content_rating = Column('content_rating', String(32))
@@ -93,6 +127,10 @@ class Film(ModelMixin, Base):
                      ForeignKey('plots.id'))
     article_id = Column('article_id', BigInteger,
                         ForeignKey('articles.id'))
+    # when OMDb data was fetched
+    updated_at = Column('updated_at', DateTime,
+                        nullable=False,
+                        server_default=func.now())
 
     genres = relationship(Genre,
                           secondary=films_genres_table)
@@ -102,15 +140,21 @@ class Film(ModelMixin, Base):
                           secondary=films_actors_table)
     writers = relationship(Writer,
                            secondary=films_writers_table)
+    countries = relationship(Country,
+                             secondary=films_countries_table)
+    languages = relationship(Language,
+                             secondary=films_languages_table)
     plot = relationship(Plot,
                         uselist=False)
     article = relationship(Article,
                            uselist=False)
 
+    # for films of refreshed articles
+    __table_args__ = (Index('films_article_id_updated_at_index',
+                            'article_id', 'updated_at'),)
+
     def __init__(self, title: str,
                  type: str,
-                 languages: str,
-                 countries: str,
                  content_rating: str,
                  year: int,
                  release_date: Optional[date],
@@ -118,11 +162,10 @@ class Film(ModelMixin, Base):
                  imdb_id: Optional[int],
                  imdb_rating: Optional[float],
                  poster_url: Optional[str],
-                 article_id: int):
+                 article_id: int,
+                 updated_at: datetime):
         self.type = type
         self.title = title
-        self.countries = countries
-        self.languages = languages
         self.duration = duration
         self.year = year
         self.release_date = release_date
@@ -131,16 +174,18 @@ class Film(ModelMixin, Base):
         self.imdb_rating = imdb_rating
         self.poster_url = poster_url
         self.article_id = article_id
+        self.updated_at = updated_at
 
     @staticmethod
-    def deserialize(raw_film: Dict[str, str]) -> 'Film':
+    def parse_fields(raw_film: Dict[str, str]) -> Dict[str, Any]:
         raw_film = dict(zip(raw_film.keys(),
                             map(normalize_value,
                                 raw_film.values())))
         title = raw_film['Title']
         type = raw_film['Type']
-        languages = raw_film['Language']
-        countries = raw_film['Country']
+        # names are saved in lookup tables with films relations
+        languages = parse_names_list(raw_film['Language'])
+        countries = parse_names_list(raw_film['Country'])
         content_rating = parse_content_rating(raw_film['Rated'])
         year = parse_year(raw_film['Year'])
         imdb_id = parse_imdb_id(raw_film['imdbID'])
@@ -150,7 +195,7 @@ class Film(ModelMixin, Base):
         release_date = parse_date(release_date_str)
         poster_url = raw_film['Poster']
         article_id = raw_film['article_id']
-        return Film(title=title,
+        return dict(title=title,
                     type=type,
                     languages=languages,
                     countries=countries,
@@ -161,4 +206,6 @@ class Film(ModelMixin, Base):
                     imdb_id=imdb_id,
                     imdb_rating=imdb_rating,
                     poster_url=poster_url,
-                    article_id=article_id)
+                    article_id=article_id,
+                    # replaced with database time on saving
+                    updated_at=datetime.now())
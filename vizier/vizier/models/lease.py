@@ -0,0 +1,34 @@
+from sqlalchemy import (Column,
+                        BigInteger,
+                        Boolean,
+                        DateTime,
+                        Integer,
+                        String,
+                        false)
+
+from .base import (Base,
+                   ModelMixin)
+
+
+class Lease(ModelMixin, Base):
+    __tablename__ = 'leases'
+
+    # stages are named like checkpoints' ones
+    stage = Column('stage', String(32),
+                   primary_key=True)
+    # year for articles stage, articles ids range number for films stage
+    unit = Column('unit', BigInteger,
+                  primary_key=True)
+    worker = Column('worker', String)
+    leased_until = Column('leased_until', DateTime)
+    completed = Column('completed', Boolean,
+                       nullable=False,
+                       server_default=false())
+    # units failing every time are given up after several attempts
+    attempts = Column('attempts', Integer,
+                      nullable=False,
+                      server_default='0')
+
+    def __init__(self, stage: str, unit: int):
+        self.stage = stage
+        self.unit = unit
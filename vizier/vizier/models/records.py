@@ -0,0 +1,40 @@
+from collections import namedtuple
+from functools import lru_cache
+from typing import (Any,
+                    List,
+                    NamedTuple)
+
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+
+class ModelMetadata(NamedTuple):
+    table_name: str
+    primary_key: str
+    # without primary key which is generated by database
+    columns_names: List[str]
+    unique_columns_names: List[str]
+    # plain tuple type without SQLAlchemy instrumentation
+    record_type: type
+
+    def to_record(self, **values: Any) -> tuple:
+        return self.record_type(*map(values.get, self.columns_names))
+
+
+@lru_cache(maxsize=None)
+def get_model_metadata(cls: DeclarativeMeta) -> ModelMetadata:
+    table = cls.__table__
+    primary_key = next(column.name
+                       for column in table.columns
+                       if column.primary_key)
+    columns_names = [column.name
+                     for column in table.columns
+                     if column.name != primary_key]
+    unique_columns_names = [column.name
+                            for column in table.columns
+                            if column.unique]
+    record_type = namedtuple(f'{cls.__name__}Record', columns_names)
+    return ModelMetadata(table_name=table.name,
+                         primary_key=primary_key,
+                         columns_names=columns_names,
+                         unique_columns_names=unique_columns_names,
+                         record_type=record_type)
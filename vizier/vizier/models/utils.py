@@ -2,12 +2,15 @@ import re
 from datetime import (datetime,
                       date,
                       timedelta)
-from typing import Optional
+from typing import (Optional,
+                    List)
 
 from vizier.config import NOT_AVAILABLE_VALUE_ALIAS
 from vizier.utils import IMDB_ID_RE
 
 RELEASE_DATE_FORMAT = '%d %b %Y'
+# OMDb joins multiple countries and languages with commas
+NAMES_SEPARATOR = ','
 UNRATED_CONTENT_RATINGS = {'NOT RATED', 'UNRATED'}
 DURATION_RE = re.compile('^(\d+ h\s*)?((\d+)(?= min$))?')
 
@@ -68,5 +71,14 @@ def parse_duration(duration_str: Optional[str]
                      minutes=minutes_count)
 
 
+def parse_names_list(names_str: Optional[str]) -> List[str]:
+    if names_str is None:
+        return []
+    names = (name.strip()
+             for name in names_str.split(NAMES_SEPARATOR))
+    # order is kept, since the first name is the main one
+    return list(dict.fromkeys(filter(None, names)))
+
+
 def normalize_value(value: str) -> Optional[str]:
     return None if value == NOT_AVAILABLE_VALUE_ALIAS else value
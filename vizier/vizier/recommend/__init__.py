@@ -0,0 +1,7 @@
+from .features import (FilmsFeatures,
+                       load_films_features)
+from .similarity import (Recommendation,
+                         find_film,
+                         find_similar_films)
+from .plots import (PlotsIndex,
+                    update_plots_index)
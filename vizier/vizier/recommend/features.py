@@ -0,0 +1,144 @@
+import math
+from asyncio import AbstractEventLoop
+from typing import (Any,
+                    Mapping,
+                    List, Tuple,
+                    NamedTuple)
+
+import numpy as np
+from cetus.data_access import (get_connection,
+                               is_db_uri_mysql)
+from cetus.data_access.reading import fetch_columns
+from cetus.types import ConnectionType
+from scipy import sparse
+from sqlalchemy import Table
+from sqlalchemy.engine.url import URL
+
+from vizier.models import (Article,
+                           Film)
+from vizier.models.film import (films_genres_table,
+                                films_directors_table,
+                                films_writers_table,
+                                films_actors_table,
+                                films_countries_table,
+                                films_languages_table)
+
+RELATIONS_TABLES = dict(genres=films_genres_table,
+                        directors=films_directors_table,
+                        writers=films_writers_table,
+                        actors=films_actors_table,
+                        countries=films_countries_table,
+                        languages=films_languages_table)
+
+# pairs of film id and its feature
+FeaturesPairsType = List[Tuple[int, Any]]
+
+
+class FilmsFeatures(NamedTuple):
+    # films are ordered by ids
+    ids: np.ndarray
+    imdb_ids: np.ndarray
+    titles: List[str]
+    # rows are normalized, so their dot products are cosine similarities
+    matrix: sparse.csr_matrix
+
+
+async def load_films_features(*, weights: Mapping[str, float],
+                              years_bucket_size: int,
+                              db_uri: URL,
+                              loop: AbstractEventLoop) -> FilmsFeatures:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    async with get_connection(db_uri=db_uri,
+                              is_mysql=db_is_mysql,
+                              loop=loop) as connection:
+        return await fetch_films_features(
+            weights=weights,
+            years_bucket_size=years_bucket_size,
+            is_mysql=db_is_mysql,
+            connection=connection)
+
+
+async def fetch_films_features(*, weights: Mapping[str, float],
+                               years_bucket_size: int,
+                               is_mysql: bool,
+                               connection: ConnectionType
+                               ) -> FilmsFeatures:
+    columns_names = ['id', 'imdb_id', 'title', 'year']
+    # films years are taken from their Wikipedia categories
+    query = (f'SELECT films.{Film.id.name}, films.{Film.imdb_id.name}, '
+             f'films.{Film.title.name}, articles.{Article.year.name} '
+             f'FROM {Film.__tablename__} AS films '
+             f'LEFT JOIN {Article.__tablename__} AS articles '
+             f'ON articles.{Article.id.name} = '
+             f'films.{Film.article_id.name} '
+             f'ORDER BY films.{Film.id.name}')
+    films_records = await fetch_columns(query,
+                                        columns_names=columns_names,
+                                        is_mysql=is_mysql,
+                                        connection=connection)
+    ids = np.array([record[0] for record in films_records],
+                   dtype=np.int64)
+    features_pairs = dict(
+        years=[(film_id, year // years_bucket_size)
+               for film_id, _, _, year in films_records
+               if year is not None])
+    for name, table in RELATIONS_TABLES.items():
+        features_pairs[name] = await fetch_relation_pairs(
+            table,
+            is_mysql=is_mysql,
+            connection=connection)
+    blocks = [to_features_block(features_pairs[name],
+                                ids=ids,
+                                weight=weight)
+              for name, weight in weights.items()]
+    matrix = normalize_rows(sparse.hstack(blocks, format='csr'))
+    return FilmsFeatures(ids=ids,
+                         imdb_ids=np.array([record[1]
+                                            for record in films_records],
+                                           dtype=np.int64),
+                         titles=[record[2] for record in films_records],
+                         matrix=matrix)
+
+
+async def fetch_relation_pairs(table: Table, *,
+                               is_mysql: bool,
+                               connection: ConnectionType
+                               ) -> FeaturesPairsType:
+    columns_names = [column.name for column in table.columns]
+    query = (f'SELECT {", ".join(columns_names)} '
+             f'FROM {table.name}')
+    records = await fetch_columns(query,
+                                  columns_names=columns_names,
+                                  is_mysql=is_mysql,
+                                  connection=connection)
+    return [tuple(record) for record in records]
+
+
+def to_features_block(pairs: FeaturesPairsType, *,
+                      ids: np.ndarray,
+                      weight: float) -> sparse.csr_matrix:
+    if not pairs:
+        return sparse.csr_matrix((len(ids), 0))
+    films_ids, features = zip(*pairs)
+    rows = np.searchsorted(ids, films_ids)
+    _, columns = np.unique(features, return_inverse=True)
+    block = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                              shape=(len(ids), columns.max() + 1))
+    # duplicated relations are summed up on construction
+    block.data[:] = 1
+    # rare features like shared director say more than common genres
+    documents_frequencies = np.diff(block.tocsc().indptr)
+    inverse_frequencies = (np.log((1 + len(ids))
+                                  / (1 + documents_frequencies))
+                           + 1)
+    block = block @ sparse.diags(inverse_frequencies)
+    # every group contributes proportionally to its weight
+    return normalize_rows(block) * math.sqrt(weight)
+
+
+def normalize_rows(matrix: sparse.spmatrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))
+                    .ravel())
+    # films without features stay zero rows
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
@@ -0,0 +1,344 @@
+import logging
+import os
+import re
+import zlib
+from asyncio import AbstractEventLoop
+from datetime import (datetime,
+                      timedelta)
+from typing import (Iterable,
+                    AsyncIterator,
+                    Optional,
+                    List)
+
+import numpy as np
+from cetus.data_access import (get_connection,
+                               is_db_uri_mysql)
+from cetus.data_access.reading import fetch_columns
+from cetus.queries.saving import (aiomysql_label_template,
+                                  asyncpg_label_template)
+from cetus.types import (ConnectionType,
+                         RecordType)
+from scipy import sparse
+from sqlalchemy.engine.url import URL
+
+from vizier.config import FILMS_WATERMARK_MARGIN_IN_SECONDS
+from vizier.models import (Film,
+                           Plot)
+from vizier.services.defterdar.utils import fetch_current_time
+from .similarity import Recommendation
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z]{2,}')
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class PlotsIndex:
+    # plots are stored as hashed term frequencies,
+    # so new ones are added without refitting vocabulary;
+    # every table buckets plots by signs of random projections
+    # of their TF-IDF vectors, similar plots collide in some table
+    def __init__(self, *,
+                 features_count: int,
+                 tables_count: int,
+                 bits_count: int,
+                 seed: int = 0):
+        if bits_count > 63:
+            raise ValueError('Signatures should fit in 63 bits, '
+                             f'but {bits_count} bits are requested.')
+        self.features_count = features_count
+        self.tables_count = tables_count
+        self.bits_count = bits_count
+        self.ids = np.empty(0, dtype=np.int64)
+        self.imdb_ids = np.empty(0, dtype=np.int64)
+        self.titles = []
+        self.frequencies = sparse.csr_matrix((0, features_count))
+        self.documents_frequencies = np.zeros(features_count,
+                                              dtype=np.int64)
+        self.signatures = np.empty((0, tables_count), dtype=np.int64)
+        self.orders = np.empty((0, tables_count), dtype=np.int64)
+        self.sorted_signatures = self.signatures
+        # films updated after this moment are not indexed yet
+        self.indexed_until = None
+        self.projection = to_projection(
+            features_count=features_count,
+            planes_count=tables_count * bits_count,
+            seed=seed)
+
+    def __len__(self) -> int:
+        return self.ids.size
+
+    def add(self, records: List[RecordType]) -> None:
+        # updated films replace their previous plots,
+        # ones left without plots are only removed
+        self.remove([film_id for film_id, *_ in records])
+        records = [record for record in records if record[-1]]
+        if not records:
+            return
+        ids, imdb_ids, titles, plots = zip(*records)
+        frequencies = vectorize_plots(plots,
+                                      features_count=self.features_count)
+        self.documents_frequencies += np.diff(frequencies.tocsc().indptr)
+        # signatures of previously added plots are kept
+        # although inverse frequencies drift slightly as index grows
+        signatures = self.to_signatures(self.to_vectors(frequencies))
+        self.ids = np.concatenate([self.ids,
+                                   np.array(ids, dtype=np.int64)])
+        self.imdb_ids = np.concatenate([self.imdb_ids,
+                                        np.array(imdb_ids,
+                                                 dtype=np.int64)])
+        self.titles.extend(titles)
+        self.frequencies = sparse.vstack([self.frequencies, frequencies],
+                                         format='csr')
+        self.signatures = np.concatenate([self.signatures, signatures])
+        self.sort_signatures()
+
+    def remove(self, ids: List[int]) -> None:
+        kept = ~np.isin(self.ids, np.array(ids, dtype=np.int64))
+        if kept.all():
+            return
+        self.documents_frequencies -= np.diff(
+            self.frequencies[~kept].tocsc().indptr)
+        self.ids = self.ids[kept]
+        self.imdb_ids = self.imdb_ids[kept]
+        self.titles = [title
+                       for title, is_kept in zip(self.titles, kept)
+                       if is_kept]
+        self.frequencies = self.frequencies[kept]
+        self.signatures = self.signatures[kept]
+        self.sort_signatures()
+
+    def sort_signatures(self) -> None:
+        self.orders = np.argsort(self.signatures,
+                                 axis=0,
+                                 kind='stable')
+        self.sorted_signatures = np.take_along_axis(self.signatures,
+                                                    self.orders,
+                                                    axis=0)
+
+    def find_similar(self, position: int, *,
+                     count: int) -> List[Recommendation]:
+        signatures = self.signatures[position]
+        candidates = set()
+        # buckets are found by binary search over sorted signatures
+        for table_index, signature in enumerate(signatures):
+            start, stop = np.searchsorted(
+                self.sorted_signatures[:, table_index],
+                [signature, signature + 1])
+            candidates.update(self.orders[start:stop, table_index]
+                              .tolist())
+        candidates.discard(position)
+        if not candidates:
+            return []
+        candidates = np.fromiter(candidates,
+                                 dtype=np.int64,
+                                 count=len(candidates))
+        # only colliding plots are compared exactly
+        vectors = self.to_vectors(self.frequencies[candidates])
+        vector = self.to_vectors(self.frequencies[position])
+        similarities = (vectors @ vector.T).toarray().ravel()
+        best = np.argsort(-similarities, kind='stable')[:count]
+        return [Recommendation(id=int(self.ids[candidate]),
+                               imdb_id=int(self.imdb_ids[candidate]),
+                               title=self.titles[candidate],
+                               similarity=float(similarity))
+                for candidate, similarity in zip(candidates[best],
+                                                 similarities[best])
+                if similarity > 0]
+
+    def to_vectors(self, frequencies: sparse.csr_matrix
+                   ) -> sparse.csr_matrix:
+        inverse_frequencies = (np.log((1 + len(self))
+                                      / (1 + self.documents_frequencies))
+                               + 1)
+        # scaling stored values directly is much cheaper
+        # than multiplying by diagonal matrices of features count size
+        vectors = frequencies.copy()
+        vectors.data = vectors.data * inverse_frequencies[vectors.indices]
+        rows = np.repeat(np.arange(vectors.shape[0]),
+                         np.diff(vectors.indptr))
+        norms = np.sqrt(np.bincount(rows,
+                                    weights=vectors.data ** 2,
+                                    minlength=vectors.shape[0]))
+        norms[norms == 0] = 1
+        vectors.data /= norms[rows]
+        return vectors
+
+    def to_signatures(self, vectors: sparse.csr_matrix) -> np.ndarray:
+        # only hyperplanes coordinates of present features are unpacked
+        features = np.unique(vectors.indices)
+        planes_count = self.tables_count * self.bits_count
+        signs = (np.unpackbits(self.projection[features],
+                               axis=1,
+                               count=planes_count)
+                 .astype(np.float32) * 2 - 1)
+        projections = vectors[:, features] @ signs
+        bits = (projections > 0).reshape(-1, self.tables_count,
+                                         self.bits_count)
+        powers = 1 << np.arange(self.bits_count, dtype=np.int64)
+        return bits.astype(np.int64) @ powers
+
+    def save(self, path: str) -> None:
+        directory_path = os.path.dirname(path)
+        if directory_path:
+            os.makedirs(directory_path, exist_ok=True)
+        # written aside, so interrupted saving keeps previous index
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.savez(file,
+                     parameters=np.array([self.features_count,
+                                          self.tables_count,
+                                          self.bits_count]),
+                     ids=self.ids,
+                     imdb_ids=self.imdb_ids,
+                     titles=np.array(self.titles, dtype=str),
+                     frequencies_data=self.frequencies.data,
+                     frequencies_indices=self.frequencies.indices,
+                     frequencies_indptr=self.frequencies.indptr,
+                     documents_frequencies=self.documents_frequencies,
+                     signatures=self.signatures,
+                     orders=self.orders,
+                     indexed_until=np.array(
+                         '' if self.indexed_until is None
+                         else self.indexed_until.strftime(
+                             TIMESTAMP_FORMAT)),
+                     projection=self.projection)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'PlotsIndex':
+        with np.load(path) as arrays:
+            features_count, tables_count, bits_count = (
+                arrays['parameters'].tolist())
+            index = cls.__new__(cls)
+            index.features_count = features_count
+            index.tables_count = tables_count
+            index.bits_count = bits_count
+            index.ids = arrays['ids']
+            index.imdb_ids = arrays['imdb_ids']
+            index.titles = arrays['titles'].tolist()
+            index.frequencies = sparse.csr_matrix(
+                (arrays['frequencies_data'],
+                 arrays['frequencies_indices'],
+                 arrays['frequencies_indptr']),
+                shape=(index.ids.size, features_count))
+            index.documents_frequencies = arrays['documents_frequencies']
+            index.signatures = arrays['signatures']
+            index.orders = arrays['orders']
+            index.sorted_signatures = np.take_along_axis(index.signatures,
+                                                         index.orders,
+                                                         axis=0)
+            # indexes saved before watermarks are updated from scratch
+            indexed_until = (str(arrays['indexed_until'])
+                             if 'indexed_until' in arrays.files
+                             else '')
+            index.indexed_until = (
+                datetime.strptime(indexed_until, TIMESTAMP_FORMAT)
+                if indexed_until
+                else None)
+            index.projection = arrays['projection']
+        return index
+
+
+def to_projection(*, features_count: int,
+                  planes_count: int,
+                  seed: int) -> np.ndarray:
+    # random hyperplanes with coordinates of "-1" and "1"
+    # are packed in bits, so they take megabytes instead of gigabytes
+    random_state = np.random.RandomState(seed)
+    return random_state.randint(0, 256,
+                                size=(features_count,
+                                      -(-planes_count // 8)),
+                                dtype=np.uint8)
+
+
+def vectorize_plots(plots: Iterable[str], *,
+                    features_count: int) -> sparse.csr_matrix:
+    data = []
+    indices = []
+    indptr = [0]
+    for plot in plots:
+        counts = {}
+        for token in TOKEN_RE.findall(plot.lower()):
+            feature = zlib.crc32(token.encode()) % features_count
+            counts[feature] = counts.get(feature, 0) + 1
+        indices.extend(counts.keys())
+        # long plots should not dominate because of repetitions
+        data.extend(1 + np.log(list(counts.values())))
+        indptr.append(len(indices))
+    res = sparse.csr_matrix((np.array(data, dtype=np.float64),
+                             np.array(indices, dtype=np.int64),
+                             np.array(indptr, dtype=np.int64)),
+                            shape=(len(indptr) - 1, features_count))
+    res.sort_indices()
+    return res
+
+
+async def update_plots_index(index: PlotsIndex, *,
+                             batch_size: int,
+                             db_uri: URL,
+                             loop: AbstractEventLoop) -> int:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    updated_count = 0
+    async with get_connection(db_uri=db_uri,
+                              is_mysql=db_is_mysql,
+                              loop=loop) as connection:
+        snapshot_time = await fetch_current_time(connection=connection,
+                                                 is_mysql=db_is_mysql)
+        # films are saved with time of their transactions start,
+        # so ones committed after previous update could have earlier times
+        async for records in fetch_plots_batches(
+                updated_after=index.indexed_until,
+                batch_size=batch_size,
+                is_mysql=db_is_mysql,
+                connection=connection):
+            index.add(records)
+            updated_count += len(records)
+            logger.info(f'Indexed {len(index)} plots.')
+    index.indexed_until = snapshot_time - timedelta(
+        seconds=FILMS_WATERMARK_MARGIN_IN_SECONDS)
+    return updated_count
+
+
+async def fetch_plots_batches(*, updated_after: Optional[datetime],
+                              batch_size: int,
+                              is_mysql: bool,
+                              connection: ConnectionType
+                              ) -> AsyncIterator[List[RecordType]]:
+    label_template = (aiomysql_label_template if is_mysql
+                      else asyncpg_label_template)
+    columns_names = ['id', 'imdb_id', 'title',
+                     'imdb_content', 'wikipedia_content']
+    films_filter = ('' if updated_after is None
+                    else f'AND films.{Film.updated_at.name} '
+                         f'> {label_template(2)} ')
+    args = () if updated_after is None else (updated_after,)
+    query = (f'SELECT films.{Film.id.name}, films.{Film.imdb_id.name}, '
+             f'films.{Film.title.name}, plots.{Plot.imdb_content.name}, '
+             f'plots.{Plot.wikipedia_content.name} '
+             f'FROM {Film.__tablename__} AS films '
+             f'LEFT JOIN {Plot.__tablename__} AS plots '
+             f'ON plots.{Plot.id.name} = films.{Film.plot_id.name} '
+             f'WHERE films.{Film.id.name} > {label_template(1)} '
+             f'{films_filter}'
+             f'ORDER BY films.{Film.id.name} '
+             f'LIMIT {label_template(len(args) + 2)}')
+    after_film_id = 0
+    while True:
+        records = await fetch_columns(query, after_film_id, *args,
+                                      batch_size,
+                                      columns_names=columns_names,
+                                      is_mysql=is_mysql,
+                                      connection=connection)
+        if not records:
+            return
+        after_film_id = records[-1][0]
+        yield [(film_id, imdb_id, title,
+                join_plots(imdb_content, wikipedia_content))
+               for (film_id, imdb_id, title,
+                    imdb_content, wikipedia_content) in records]
+
+
+def join_plots(*plots: Optional[str]) -> str:
+    return ' '.join(plot for plot in plots if plot)
+
@@ -0,0 +1,48 @@
+from typing import (Optional,
+                    List,
+                    NamedTuple)
+
+import numpy as np
+
+from vizier.models.utils import parse_imdb_id
+from vizier.utils import IMDB_ID_RE
+from .features import FilmsFeatures
+
+
+class Recommendation(NamedTuple):
+    id: int
+    imdb_id: int
+    title: str
+    similarity: float
+
+
+def find_film(features: FilmsFeatures, film: str) -> Optional[int]:
+    # films are looked up by IMDb ids (like "tt0111161") or exact titles
+    if IMDB_ID_RE.search(film):
+        positions = np.flatnonzero(features.imdb_ids
+                                   == parse_imdb_id(film))
+        return int(positions[0]) if positions.size else None
+    try:
+        return features.titles.index(film)
+    except ValueError:
+        return None
+
+
+def find_similar_films(features: FilmsFeatures, position: int, *,
+                       count: int) -> List[Recommendation]:
+    # single sparse product scores film against all others
+    similarities = (features.matrix @ features.matrix[position].T
+                    ).toarray().ravel()
+    similarities[position] = -np.inf
+    count = min(count, similarities.size - 1)
+    if count <= 0:
+        return []
+    candidates = np.argpartition(-similarities, count - 1)[:count]
+    candidates = candidates[np.argsort(-similarities[candidates],
+                                       kind='stable')]
+    return [Recommendation(id=int(features.ids[candidate]),
+                           imdb_id=int(features.imdb_ids[candidate]),
+                           title=features.titles[candidate],
+                           similarity=float(similarities[candidate]))
+            for candidate in candidates
+            if similarities[candidate] > 0]
@@ -0,0 +1,108 @@
+import gzip
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import (Any,
+                    Optional,
+                    Dict,
+                    Iterator,
+                    List,
+                    Tuple)
+
+logger = logging.getLogger(__name__)
+
+SHARD_FILE_NAME_SUFFIX = '.jsonl.gz'
+COMPRESSION_LEVEL = 6
+
+
+class RawFilmsArchive:
+    # every run (and worker) writes its own shard per year,
+    # so damage of interrupted run does not spread to others
+    def __init__(self, path: str, *,
+                 run_name: Optional[str] = None):
+        self.path = path
+        self.run_name = run_name or to_run_name()
+        self.shards = {}
+        os.makedirs(path, exist_ok=True)
+
+    def __enter__(self) -> 'RawFilmsArchive':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            shard.close()
+        self.shards.clear()
+
+    def flush(self) -> None:
+        # makes written entries recoverable if run gets killed
+        for shard in self.shards.values():
+            shard.flush()
+
+    def write(self, entry: Dict[str, Any], *,
+              year: int) -> None:
+        try:
+            shard = self.shards[year]
+        except KeyError:
+            year_path = os.path.join(self.path, str(year))
+            os.makedirs(year_path, exist_ok=True)
+            shard = self.shards[year] = gzip.open(
+                to_shard_path(year_path, name=self.run_name), 'at',
+                encoding='utf-8',
+                compresslevel=COMPRESSION_LEVEL)
+        shard.write(json.dumps(entry) + '\n')
+
+
+def read_archive(path: str, *,
+                 start_year: Optional[int] = None,
+                 stop_year: Optional[int] = None
+                 ) -> Iterator[Dict[str, Any]]:
+    for year, shard_path in list_shards(path):
+        if start_year is not None and year < start_year:
+            continue
+        if stop_year is not None and year >= stop_year:
+            continue
+        yield from read_shard(shard_path)
+
+
+def read_shard(path: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(path, 'rt',
+                   encoding='utf-8') as shard:
+        try:
+            for line in shard:
+                yield json.loads(line)
+        except (EOFError, OSError, json.JSONDecodeError):
+            # last entries of interrupted run can be truncated
+            logger.warning(f'Skipping damaged tail '
+                           f'of "{path}" shard.')
+
+
+def list_shards(path: str) -> List[Tuple[int, str]]:
+    res = []
+    for name in os.listdir(path):
+        entry_path = os.path.join(path, name)
+        if name.isdigit() and os.path.isdir(entry_path):
+            res.extend((int(name), os.path.join(entry_path, file_name))
+                       for file_name in os.listdir(entry_path)
+                       if file_name.endswith(SHARD_FILE_NAME_SUFFIX))
+        elif name.endswith(SHARD_FILE_NAME_SUFFIX):
+            # single shard per year written by previous versions
+            res.append((int(name[:-len(SHARD_FILE_NAME_SUFFIX)]),
+                        entry_path))
+    # runs names start with time, so later runs are read last
+    return sorted(res)
+
+
+def to_run_name() -> str:
+    return (f'{datetime.utcnow():%Y%m%dT%H%M%S}'
+            f'-{socket.gethostname()}'
+            f'-{os.getpid()}')
+
+
+def to_shard_path(path: str, *,
+                  name: str) -> str:
+    return os.path.join(path, f'{name}{SHARD_FILE_NAME_SUFFIX}')
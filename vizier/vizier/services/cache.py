@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from typing import (Any,
+                    Dict,
+                    Mapping)
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_QUERY = ('CREATE TABLE IF NOT EXISTS responses ('
+                      'key TEXT PRIMARY KEY, '
+                      'url TEXT NOT NULL, '
+                      'content BLOB NOT NULL, '
+                      'size INTEGER NOT NULL, '
+                      'stored_at REAL NOT NULL, '
+                      'accessed_at REAL NOT NULL)')
+CREATE_INDEX_QUERY = ('CREATE INDEX IF NOT EXISTS responses_accessed_at '
+                      'ON responses (accessed_at)')
+# share of maximum size left after eviction
+# so eviction does not happen on every insertion
+EVICTION_TARGET_RATIO = 0.9
+
+
+class ResponsesCache:
+    def __init__(self, path: str, *,
+                 max_size: int,
+                 ttls: Mapping[str, float],
+                 default_ttl: float,
+                 offline: bool = False,
+                 cache_streamed: bool = False):
+        self.path = path
+        self.max_size = max_size
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.offline = offline
+        # streamed responses are cached as a whole,
+        # so peak memory grows with their size
+        self.cache_streamed = cache_streamed
+
+        directory_path = os.path.dirname(path)
+        if directory_path:
+            os.makedirs(directory_path, exist_ok=True)
+        self.connection = sqlite3.connect(path,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(CREATE_TABLE_QUERY)
+        self.connection.execute(CREATE_INDEX_QUERY)
+        size, = self.connection.execute('SELECT COALESCE(SUM(size), 0) '
+                                        'FROM responses').fetchone()
+        self.size = size
+
+    def __enter__(self) -> 'ResponsesCache':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get(self, url: str, *,
+            params: Dict[str, Any]) -> Any:
+        key = to_key(url, params=params)
+        row = self.connection.execute('SELECT content, stored_at '
+                                      'FROM responses '
+                                      'WHERE key = ?',
+                                      (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        content, stored_at = row
+        now = time.time()
+        # in offline mode stale responses are better than nothing
+        if (not self.offline
+                and now - stored_at > self.ttls.get(url, self.default_ttl)):
+            raise KeyError(key)
+        self.connection.execute('UPDATE responses '
+                                'SET accessed_at = ? '
+                                'WHERE key = ?',
+                                (now, key))
+        return json.loads(zlib.decompress(content).decode('utf-8'))
+
+    def set(self, url: str, value: Any, *,
+            params: Dict[str, Any]) -> None:
+        key = to_key(url, params=params)
+        content = zlib.compress(json.dumps(value).encode('utf-8'))
+        size = len(content)
+        now = time.time()
+        with self.connection:
+            row = self.connection.execute('SELECT size '
+                                          'FROM responses '
+                                          'WHERE key = ?',
+                                          (key,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO responses '
+                                    '(key, url, content, size, '
+                                    'stored_at, accessed_at) '
+                                    'VALUES (?, ?, ?, ?, ?, ?)',
+                                    (key, url, content, size, now, now))
+        if row is not None:
+            self.size -= row[0]
+        self.size += size
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        target_size = self.max_size * EVICTION_TARGET_RATIO
+        evicted_keys = []
+        evicted_size = 0
+        rows = self.connection.execute('SELECT key, size '
+                                       'FROM responses '
+                                       'ORDER BY accessed_at')
+        for key, size in rows:
+            if self.size - evicted_size <= target_size:
+                break
+            evicted_keys.append((key,))
+            evicted_size += size
+        with self.connection:
+            self.connection.executemany('DELETE FROM responses '
+                                        'WHERE key = ?',
+                                        evicted_keys)
+        self.size -= evicted_size
+        logger.debug(f'Evicted {len(evicted_keys)} responses '
+                     f'({evicted_size} bytes) from cache "{self.path}".')
+
+
+def to_key(url: str, *,
+           params: Dict[str, Any]) -> str:
+    query = urlencode(sorted(params.items()))
+    return hashlib.sha1(f'{url}?{query}'.encode('utf-8')).hexdigest()
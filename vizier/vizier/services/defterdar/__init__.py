@@ -1,2 +1,8 @@
 from .articles import parse_films_articles
+from .crawl import crawl_films
 from .films import parse_films
+from .indexes import (create_indexes,
+                      drop_secondary_indexes)
+from .refresh import refresh_films
+from .replay import replay_films
+from .worker import run_crawl_worker
@@ -1,18 +1,35 @@
 import logging
 from asyncio import (AbstractEventLoop,
                      gather, ensure_future)
-from typing import List
+from typing import (Optional,
+                    List, Set,
+                    Tuple)
 
 from aiohttp import ClientSession
-from cetus.types import ConnectionPoolType
+from cetus.types import (ConnectionPoolType,
+                         ConnectionType,
+                         RecordType)
 from cetus.data_access import (is_db_uri_mysql,
                                get_connection_pool,
                                insert)
+from cetus.data_access.execution import execute_many
+from cetus.utils import join_str
 from sqlalchemy import Column
 from sqlalchemy.engine.url import URL
 
+from vizier.config import ARTICLES_BATCH_SIZE
+from vizier.metrics import measure_write
 from vizier.models import Article
+from vizier.models.checkpoint import ARTICLES_STAGE
+from vizier.services.cache import ResponsesCache
+from vizier.services.utils import StreamingError
 from vizier.services.wikipedia import get_articles_titles
+from vizier.utils import async_chunks
+from .checkpoints import (fetch_checkpoints,
+                          save_checkpoints)
+from .copying import copy_insert_missing
+from .utils import (check_copy_support,
+                    transaction)
 
 logger = logging.getLogger(__name__)
 
@@ -21,26 +38,32 @@ async def parse_films_articles(*, start_year: int,
                                stop_year: int,
                                max_connections: int = 50,
                                db_uri: URL,
+                               use_copy: bool = False,
+                               resume: bool = False,
+                               session: ClientSession,
+                               cache: Optional[ResponsesCache] = None,
                                loop: AbstractEventLoop
                                ) -> None:
     db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_copy_support(use_copy=use_copy,
+                       is_mysql=db_is_mysql)
 
     table_name = Article.__tablename__
-    table = Article.__table__
-    columns_names = [Article.title.name,
-                     Article.year.name]
-
-    def is_column_unique(column: Column) -> bool:
-        return column.unique or column.primary_key
-
-    unique_columns = filter(is_column_unique, table.columns)
-    unique_columns_names = [column.name
-                            for column in unique_columns]
+    columns_names, unique_columns_names = get_articles_columns_names()
     async with get_connection_pool(db_uri=db_uri,
                                    is_mysql=db_is_mysql,
                                    max_size=max_connections,
-                                   loop=loop) as connection_pool, \
-            ClientSession() as session:
+                                   loop=loop) as connection_pool:
+        if resume:
+            async with connection_pool.acquire() as connection:
+                completed_years = await fetch_checkpoints(
+                    stage=ARTICLES_STAGE,
+                    connection=connection,
+                    is_mysql=db_is_mysql)
+            logger.info(f'Skipping {len(completed_years)} '
+                        'already processed years.')
+        else:
+            completed_years = set()
         for step_start_year in range(start_year, stop_year, max_connections):
             step_stop_year = min(step_start_year + max_connections, stop_year)
             await parse_films_article_step(start_year=step_start_year,
@@ -49,8 +72,24 @@ async def parse_films_articles(*, start_year: int,
                                            columns_names=columns_names,
                                            unique_columns_names=unique_columns_names,
                                            is_mysql=db_is_mysql,
+                                           use_copy=use_copy,
+                                           completed_years=completed_years,
                                            connection_pool=connection_pool,
-                                           session=session)
+                                           session=session,
+                                           cache=cache)
+
+
+def get_articles_columns_names() -> Tuple[List[str], List[str]]:
+    columns_names = [Article.title.name,
+                     Article.year.name]
+
+    def is_column_unique(column: Column) -> bool:
+        return column.unique
+
+    unique_columns = filter(is_column_unique, Article.__table__.columns)
+    unique_columns_names = [column.name
+                            for column in unique_columns]
+    return columns_names, unique_columns_names
 
 
 async def parse_films_article_step(
@@ -60,8 +99,11 @@ async def parse_films_article_step(
         columns_names: List[str],
         unique_columns_names: List[str],
         is_mysql: bool,
+        use_copy: bool,
+        completed_years: Set[int],
         connection_pool: ConnectionPoolType,
-        session: ClientSession) -> None:
+        session: ClientSession,
+        cache: Optional[ResponsesCache]) -> None:
     logger.info(f'Processing films articles '
                 f'from {start_year} year '
                 f'to {stop_year - 1} year.')
@@ -71,9 +113,12 @@ async def parse_films_article_step(
                                   columns_names=columns_names,
                                   unique_columns_names=unique_columns_names,
                                   session=session,
+                                  cache=cache,
                                   is_mysql=is_mysql,
+                                  use_copy=use_copy,
                                   connection_pool=connection_pool))
-             for year in range(start_year, stop_year)]
+             for year in range(start_year, stop_year)
+             if year not in completed_years]
     await gather(*tasks)
     logger.info(f'Successfully finished '
                 f'processing film articles '
@@ -88,16 +133,76 @@ async def parse_films_article_batch(
         columns_names: List[str],
         unique_columns_names: List[str],
         session: ClientSession,
+        cache: Optional[ResponsesCache],
         is_mysql: bool,
-        connection_pool: ConnectionPoolType) -> None:
-    articles_titles = await get_articles_titles(year=year,
-                                                session=session)
-    records = [(title, year) for title in articles_titles]
-    async with connection_pool.acquire() as connection:
-        await insert(table_name=table_name,
-                     columns_names=columns_names,
-                     unique_columns_names=unique_columns_names,
-                     records=records,
-                     merge=True,
-                     connection=connection,
-                     is_mysql=is_mysql)
+        use_copy: bool,
+        connection_pool: ConnectionPoolType) -> bool:
+    articles_titles = get_articles_titles(year=year,
+                                          session=session,
+                                          cache=cache)
+    try:
+        async with connection_pool.acquire() as connection, \
+                transaction(connection,
+                            is_mysql=is_mysql):
+            # articles are saved while titles are still downloaded,
+            # interrupted download rolls back saved ones
+            async for titles in async_chunks(articles_titles,
+                                             ARTICLES_BATCH_SIZE):
+                records = [(title, year) for title in titles]
+                await save_articles(
+                    records,
+                    table_name=table_name,
+                    columns_names=columns_names,
+                    unique_columns_names=unique_columns_names,
+                    is_mysql=is_mysql,
+                    use_copy=use_copy,
+                    connection=connection)
+            # year is completed only along with its saved articles
+            await save_checkpoints([year],
+                                   stage=ARTICLES_STAGE,
+                                   connection=connection,
+                                   is_mysql=is_mysql)
+    except StreamingError as error:
+        logger.warning(f'Failed to fetch films articles of {year} year, '
+                       f'year is left unprocessed: {error}')
+        return False
+    return True
+
+
+async def save_articles(records: List[RecordType], *,
+                        table_name: str,
+                        columns_names: List[str],
+                        unique_columns_names: List[str],
+                        is_mysql: bool,
+                        use_copy: bool,
+                        connection: ConnectionType) -> None:
+    with measure_write(table_name=table_name,
+                       rows_count=len(records)):
+        if use_copy:
+            # "COPY" cannot skip conflicting rows,
+            # so already saved articles are skipped explicitly
+            await copy_insert_missing(records,
+                                      table_name=table_name,
+                                      columns_names=columns_names,
+                                      key_columns_names=unique_columns_names,
+                                      connection=connection)
+        elif is_mysql:
+            # articles listed in several years categories
+            # keep the first one,
+            # while "ON DUPLICATE KEY UPDATE" would overwrite it
+            labels = join_str(['%s'] * len(columns_names))
+            await execute_many(f'INSERT IGNORE INTO {table_name} '
+                               f'({join_str(columns_names)}) '
+                               f'VALUES ({labels})',
+                               args=records,
+                               is_mysql=is_mysql,
+                               connection=connection)
+        else:
+            # articles listed in several years categories
+            # keep the first one
+            await insert(table_name=table_name,
+                         columns_names=columns_names,
+                         unique_columns_names=unique_columns_names,
+                         records=records,
+                         connection=connection,
+                         is_mysql=is_mysql)
@@ -0,0 +1,39 @@
+from typing import (Iterable,
+                    Set)
+
+from cetus.data_access import (fetch,
+                               insert)
+from cetus.types import ConnectionType
+
+from vizier.metrics import measure_write
+from vizier.models import Checkpoint
+
+
+async def save_checkpoints(items: Iterable[int], *,
+                           stage: str,
+                           connection: ConnectionType,
+                           is_mysql: bool) -> None:
+    records = [(stage, item) for item in items]
+    if not records:
+        return
+    columns_names = [Checkpoint.stage.name,
+                     Checkpoint.item.name]
+    with measure_write(table_name=Checkpoint.__tablename__,
+                       rows_count=len(records)):
+        await insert(table_name=Checkpoint.__tablename__,
+                     columns_names=columns_names,
+                     unique_columns_names=columns_names,
+                     records=records,
+                     connection=connection,
+                     is_mysql=is_mysql)
+
+
+async def fetch_checkpoints(*, stage: str,
+                            connection: ConnectionType,
+                            is_mysql: bool) -> Set[int]:
+    records = await fetch(table_name=Checkpoint.__tablename__,
+                          columns_names=[Checkpoint.item.name],
+                          filters=('=', (Checkpoint.stage.name, stage)),
+                          is_mysql=is_mysql,
+                          connection=connection)
+    return {item for item, in records}
@@ -0,0 +1,90 @@
+from typing import (Iterable,
+                    List)
+
+from cetus.types import (ConnectionType,
+                         RecordType)
+from cetus.utils import join_str
+
+STAGING_TABLE_NAME_SUFFIX = '_staging'
+
+
+async def copy_to_staging(records: Iterable[RecordType], *,
+                          table_name: str,
+                          columns_names: List[str],
+                          connection: ConnectionType) -> str:
+    staging_table_name = table_name + STAGING_TABLE_NAME_SUFFIX
+    columns = join_str(columns_names)
+    # temporary tables are never WAL-logged,
+    # belong to connection, so concurrent writers do not interfere,
+    # and are emptied on transaction's commit
+    await connection.execute(f'CREATE TEMPORARY TABLE '
+                             f'IF NOT EXISTS {staging_table_name} '
+                             'ON COMMIT DELETE ROWS '
+                             f'AS SELECT {columns} FROM {table_name} '
+                             'WITH NO DATA')
+    # rows are kept till the end of enclosing transaction
+    await connection.execute(f'TRUNCATE {staging_table_name}')
+    await connection.copy_records_to_table(staging_table_name,
+                                           records=list(records),
+                                           columns=columns_names)
+    return staging_table_name
+
+
+async def copy_upsert(records: Iterable[RecordType], *,
+                      table_name: str,
+                      columns_names: List[str],
+                      unique_columns_names: List[str],
+                      returning_columns_names: List[str],
+                      connection: ConnectionType) -> List[RecordType]:
+    columns = join_str(columns_names)
+    unique_columns = join_str(unique_columns_names)
+    updated_columns_names = ([column_name
+                              for column_name in columns_names
+                              if column_name not in unique_columns_names]
+                             # updating is needed to return existing rows
+                             or unique_columns_names)
+    updates = join_str(f'{column_name} = EXCLUDED.{column_name}'
+                       for column_name in updated_columns_names)
+    returning_columns = join_str(returning_columns_names)
+    async with connection.transaction():
+        staging_table_name = await copy_to_staging(
+            records,
+            table_name=table_name,
+            columns_names=columns_names,
+            connection=connection)
+        # duplicates cannot be updated twice by the same statement
+        resp = await connection.fetch(
+            f'INSERT INTO {table_name} ({columns}) '
+            f'SELECT DISTINCT ON ({unique_columns}) {columns} '
+            f'FROM {staging_table_name} '
+            f'ORDER BY {unique_columns} '
+            f'ON CONFLICT ({unique_columns}) '
+            f'DO UPDATE SET {updates} '
+            f'RETURNING {returning_columns}')
+    return [tuple(row[column_name]
+                  for column_name in returning_columns_names)
+            for row in resp]
+
+
+async def copy_insert_missing(records: Iterable[RecordType], *,
+                              table_name: str,
+                              columns_names: List[str],
+                              key_columns_names: List[str],
+                              connection: ConnectionType) -> None:
+    columns = join_str(columns_names)
+    keys_matches = ' AND '.join(f'{table_name}.{column_name} '
+                                f'= staging.{column_name}'
+                                for column_name in key_columns_names)
+    async with connection.transaction():
+        staging_table_name = await copy_to_staging(
+            records,
+            table_name=table_name,
+            columns_names=columns_names,
+            connection=connection)
+        await connection.execute(
+            f'INSERT INTO {table_name} ({columns}) '
+            f'SELECT DISTINCT {columns} '
+            f'FROM {staging_table_name} AS staging '
+            'WHERE NOT EXISTS ('
+            f'SELECT 1 FROM {table_name} '
+            f'WHERE {keys_matches})')
@@ -0,0 +1,185 @@
+import logging
+from asyncio import (AbstractEventLoop,
+                     Queue,
+                     ensure_future)
+from functools import partial
+from typing import (AsyncIterator,
+                    Optional,
+                    Iterable,
+                    List, Set)
+
+from aiohttp import ClientSession
+from cetus.data_access import (get_connection_pool,
+                               is_db_uri_mysql)
+from cetus.types import (ConnectionPoolType,
+                         RecordType)
+from sqlalchemy.engine.url import URL
+
+from vizier.config import (WIKIPEDIA_API_TITLES_LIMIT,
+                           NAMES_IDS_CACHE_SIZE)
+from vizier.models import Article
+from vizier.models.checkpoint import ARTICLES_STAGE
+from vizier.services.archive import RawFilmsArchive
+from vizier.services.cache import ResponsesCache
+from .articles import (get_articles_columns_names,
+                       parse_films_article_batch)
+from .checkpoints import fetch_checkpoints
+from .films import process_films
+from .pipeline import (STOP,
+                       HandlerType,
+                       run_stage)
+from .reading import fetch_articles_batches
+from .utils import check_copy_support
+
+logger = logging.getLogger(__name__)
+
+
+async def crawl_films(*,
+                      start_year: int,
+                      stop_year: int,
+                      max_connections: int = 50,
+                      batch_size: int = WIKIPEDIA_API_TITLES_LIMIT,
+                      queue_size: int = 10,
+                      discoverers_count: int = 5,
+                      resolvers_count: int = 5,
+                      plots_fetchers_count: int = 5,
+                      fetchers_count: int = 20,
+                      deserializers_count: int = 1,
+                      writers_count: int = 5,
+                      names_ids_cache_size: int = NAMES_IDS_CACHE_SIZE,
+                      db_uri: URL,
+                      use_copy: bool = False,
+                      resume: bool = False,
+                      session: ClientSession,
+                      cache: Optional[ResponsesCache] = None,
+                      archive: Optional[RawFilmsArchive] = None,
+                      loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_copy_support(use_copy=use_copy,
+                       is_mysql=db_is_mysql)
+    async with get_connection_pool(db_uri=db_uri,
+                                   is_mysql=db_is_mysql,
+                                   max_size=max_connections,
+                                   loop=loop) as connection_pool:
+        if resume:
+            async with connection_pool.acquire() as connection:
+                completed_years = await fetch_checkpoints(
+                    stage=ARTICLES_STAGE,
+                    connection=connection,
+                    is_mysql=db_is_mysql)
+        else:
+            completed_years = set()
+        # films of every year are parsed as soon as its articles are saved,
+        # so PetScan and OMDb are queried at the same time
+        articles_batches = discover_articles_batches(
+            range(start_year, stop_year),
+            discoverers_count=discoverers_count,
+            batch_size=batch_size,
+            completed_years=completed_years,
+            skip_completed=resume,
+            is_mysql=db_is_mysql,
+            use_copy=use_copy,
+            connection_pool=connection_pool,
+            session=session,
+            cache=cache)
+        await process_films(articles_batches,
+                            queue_size=queue_size,
+                            resolvers_count=resolvers_count,
+                            plots_fetchers_count=plots_fetchers_count,
+                            fetchers_count=fetchers_count,
+                            deserializers_count=deserializers_count,
+                            writers_count=writers_count,
+                            names_ids_cache_size=names_ids_cache_size,
+                            skip_saved=resume,
+                            is_mysql=db_is_mysql,
+                            use_copy=use_copy,
+                            connection_pool=connection_pool,
+                            session=session,
+                            cache=cache,
+                            archive=archive)
+
+
+async def discover_articles_batches(years: Iterable[int], *,
+                                    discoverers_count: int,
+                                    batch_size: int,
+                                    completed_years: Set[int],
+                                    skip_completed: bool,
+                                    is_mysql: bool,
+                                    use_copy: bool,
+                                    connection_pool: ConnectionPoolType,
+                                    session: ClientSession,
+                                    cache: Optional[ResponsesCache]
+                                    ) -> AsyncIterator[List[RecordType]]:
+    years_queue = Queue()
+    for year in years:
+        years_queue.put_nowait(year)
+    years_queue.put_nowait(STOP)
+    discovered_years_queue = Queue()
+    discovering = ensure_future(
+        discover_years(partial(discover_year,
+                               completed_years=completed_years,
+                               is_mysql=is_mysql,
+                               use_copy=use_copy,
+                               connection_pool=connection_pool,
+                               session=session,
+                               cache=cache),
+                       source=years_queue,
+                       target=discovered_years_queue,
+                       workers_count=discoverers_count))
+    try:
+        while True:
+            year = await discovered_years_queue.get()
+            if year is STOP:
+                break
+            # years range is inclusive
+            async for records in fetch_articles_batches(
+                    start_year=year,
+                    stop_year=year,
+                    batch_size=batch_size,
+                    skip_completed=skip_completed,
+                    is_mysql=is_mysql,
+                    connection_pool=connection_pool):
+                yield records
+        # re-raising discovery errors
+        await discovering
+    finally:
+        discovering.cancel()
+
+
+async def discover_years(handler: HandlerType, *,
+                         source: Queue,
+                         target: Queue,
+                         workers_count: int) -> None:
+    try:
+        await run_stage(handler,
+                        source=source,
+                        target=target,
+                        workers_count=workers_count)
+    except Exception:
+        # consumer waits for end of stream otherwise
+        await target.put(STOP)
+        raise
+
+
+async def discover_year(year: int, *,
+                        completed_years: Set[int],
+                        is_mysql: bool,
+                        use_copy: bool,
+                        connection_pool: ConnectionPoolType,
+                        session: ClientSession,
+                        cache: Optional[ResponsesCache]) -> Optional[int]:
+    if year in completed_years:
+        return year
+    columns_names, unique_columns_names = get_articles_columns_names()
+    processed = await parse_films_article_batch(
+        year=year,
+        table_name=Article.__tablename__,
+        columns_names=columns_names,
+        unique_columns_names=unique_columns_names,
+        session=session,
+        cache=cache,
+        is_mysql=is_mysql,
+        use_copy=use_copy,
+        connection_pool=connection_pool)
+    # films of unprocessed years are parsed by following runs
+    return year if processed else None
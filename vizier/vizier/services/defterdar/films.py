@@ -1,330 +1,611 @@
-import math
+import logging
 from asyncio import (AbstractEventLoop,
+                     Queue,
                      gather, ensure_future)
+from functools import partial
 from typing import (Any,
+                    AsyncIterator,
+                    Optional,
                     Iterable,
-                    Dict, List)
+                    Dict, List,
+                    NamedTuple, Tuple,
+                    Set)
 
-import logging
 from aiohttp import ClientSession
 from cetus.data_access import (get_connection_pool,
                                is_db_uri_mysql,
                                fetch,
-                               fetch_records_count,
-                               insert,
                                insert_returning)
-from cetus.queries import ORDERS_ALIASES
 from cetus.types import (ConnectionPoolType,
                          ConnectionType,
-                         FiltersType,
-                         OrderingType,
                          RecordType)
-from sqlalchemy import Table
 from sqlalchemy.engine.url import URL
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
-from vizier.config import NOT_AVAILABLE_VALUE_ALIAS
-from vizier.models import (Article,
-                           Genre, Plot,
+from vizier.config import (NOT_AVAILABLE_VALUE_ALIAS,
+                           WIKIPEDIA_API_TITLES_LIMIT,
+                           NAMES_IDS_CACHE_SIZE)
+from vizier.models import (Genre, Plot,
                            Writer, Director,
-                           Actor, Film)
-from vizier.models.base import Base
+                           Actor, Film,
+                           Country, Language)
+from vizier.models.checkpoint import FILMS_STAGE
+from vizier.models.genre import GENRES_NAMES
 from vizier.models.film import (films_genres_table,
                                 films_directors_table,
                                 films_writers_table,
-                                films_actors_table)
+                                films_actors_table,
+                                films_countries_table,
+                                films_languages_table)
+from vizier.metrics import measure_write
+from vizier.models.records import (ModelMetadata,
+                                   get_model_metadata)
 from vizier.models.utils import parse_imdb_id
+from vizier.services.archive import RawFilmsArchive
+from vizier.services.cache import ResponsesCache
 from vizier.services.imdb import get_raw_film
+from vizier.services.wikipedia import (get_imdb_ids,
+                                      get_plots_contents)
+from .checkpoints import save_checkpoints
+from .copying import copy_upsert
+from .names import (NamesIds,
+                    save_names)
+from .pipeline import (STOP,
+                       run_pipeline,
+                       run_stage)
+from .reading import fetch_articles_batches
+from .relations import save_relation
+from .utils import (check_copy_support,
+                    fetch_current_time,
+                    transaction)
 
 logger = logging.getLogger(__name__)
 
+ArticlesRecordsType = List[RecordType]
+IdentifiedArticlesType = Tuple[ArticlesRecordsType, Dict[str, int]]
+# plots contents are keyed by articles ids
+ArticlesWithPlotsType = Tuple[ArticlesRecordsType,
+                              Dict[str, int],
+                              Dict[int, str]]
+RawFilmsType = Tuple[ArticlesRecordsType,
+                     List[Dict[str, Any]],
+                     Dict[int, str]]
+
+
+class FilmsBatch(NamedTuple):
+    # all processed articles, including ones without films
+    articles_ids: List[int]
+    films: List[RecordType]
+    plots: List[RecordType]
+    # related objects are represented by names
+    genres: List[List[str]]
+    directors: List[List[str]]
+    writers: List[List[str]]
+    actors: List[List[str]]
+    countries: List[List[str]]
+    languages: List[List[str]]
+
+
 async def parse_films(*,
                       start_year: int,
                       stop_year: int,
                       max_connections: int = 50,
-                      step: int = 10_000,
+                      batch_size: int = WIKIPEDIA_API_TITLES_LIMIT,
+                      queue_size: int = 10,
+                      resolvers_count: int = 5,
+                      plots_fetchers_count: int = 5,
+                      fetchers_count: int = 20,
+                      deserializers_count: int = 1,
+                      writers_count: int = 5,
+                      names_ids_cache_size: int = NAMES_IDS_CACHE_SIZE,
                       db_uri: URL,
+                      use_copy: bool = False,
+                      resume: bool = False,
+                      session: ClientSession,
+                      cache: Optional[ResponsesCache] = None,
+                      archive: Optional[RawFilmsArchive] = None,
                       loop: AbstractEventLoop) -> None:
     db_is_mysql = await is_db_uri_mysql(db_uri)
-    table_name = Article.__tablename__
-    columns_names = [column.name for column in Article.__table__.columns]
-    filters = 'BETWEEN', (Article.year.name, (start_year, stop_year))
-    orderings = [(Article.year.name, ORDERS_ALIASES['ascending'])]
+    check_copy_support(use_copy=use_copy,
+                       is_mysql=db_is_mysql)
     async with get_connection_pool(db_uri=db_uri,
                                    is_mysql=db_is_mysql,
                                    max_size=max_connections,
-                                   loop=loop) as connection_pool, \
-            ClientSession() as session:
-        async with connection_pool.acquire() as connection:
-            records_count = await fetch_records_count(table_name=table_name,
-                                                      filters=filters,
-                                                      is_mysql=db_is_mysql,
-                                                      connection=connection)
-        logger.info(f'Found {records_count} '
-                    f'films articles records.')
-        for offset in range(0, records_count, step):
-            limit = min(records_count - offset, step)
-            await parse_films_step(table_name=table_name,
-                                   columns_names=columns_names,
-                                   filters=filters,
-                                   orderings=orderings,
-                                   limit=limit,
-                                   offset=offset,
-                                   max_connections=max_connections,
-                                   is_mysql=db_is_mysql,
-                                   connection_pool=connection_pool,
-                                   session=session)
-        logger.info(f'Successfully processed parsing '
-                    f'films by articles, '
-                    f'records handled.')
-
-
-async def parse_films_step(*,
-                           table_name: str,
-                           columns_names: List[str],
-                           filters: FiltersType,
-                           orderings: List[OrderingType],
-                           limit: int,
-                           offset: int,
-                           max_connections: int,
+                                   loop=loop) as connection_pool:
+        articles_batches = fetch_articles_batches(
+            start_year=start_year,
+            stop_year=stop_year,
+            batch_size=batch_size,
+            skip_completed=resume,
+            is_mysql=db_is_mysql,
+            connection_pool=connection_pool)
+        await process_films(articles_batches,
+                            queue_size=queue_size,
+                            resolvers_count=resolvers_count,
+                            plots_fetchers_count=plots_fetchers_count,
+                            fetchers_count=fetchers_count,
+                            deserializers_count=deserializers_count,
+                            writers_count=writers_count,
+                            names_ids_cache_size=names_ids_cache_size,
+                            skip_saved=resume,
+                            is_mysql=db_is_mysql,
+                            use_copy=use_copy,
+                            connection_pool=connection_pool,
+                            session=session,
+                            cache=cache,
+                            archive=archive)
+
+
+async def process_films(articles_batches: AsyncIterator[ArticlesRecordsType],
+                        *,
+                        queue_size: int,
+                        resolvers_count: int,
+                        plots_fetchers_count: int,
+                        fetchers_count: int,
+                        deserializers_count: int,
+                        writers_count: int,
+                        names_ids_cache_size: int,
+                        skip_saved: bool,
+                        is_mysql: bool,
+                        use_copy: bool,
+                        connection_pool: ConnectionPoolType,
+                        session: ClientSession,
+                        cache: Optional[ResponsesCache],
+                        archive: Optional[RawFilmsArchive]) -> None:
+    articles_queue = Queue(queue_size)
+    identified_articles_queue = Queue(queue_size)
+    articles_with_plots_queue = Queue(queue_size)
+    raw_films_queue = Queue(queue_size)
+    films_batches_queue = Queue(queue_size)
+    # shared by writers and kept between batches
+    names_ids = {cls: NamesIds(names_ids_cache_size)
+                 for cls in [Genre, Director, Writer, Actor,
+                             Country, Language]}
+    await run_pipeline(
+        read_articles(articles_batches,
+                      target=articles_queue),
+        run_stage(partial(resolve_imdb_ids,
+                          skip_saved=skip_saved,
+                          is_mysql=is_mysql,
+                          connection_pool=connection_pool,
+                          session=session,
+                          cache=cache),
+                  source=articles_queue,
+                  target=identified_articles_queue,
+                  workers_count=resolvers_count),
+        run_stage(partial(fetch_plots,
+                          session=session,
+                          cache=cache),
+                  source=identified_articles_queue,
+                  target=articles_with_plots_queue,
+                  workers_count=plots_fetchers_count),
+        run_stage(partial(fetch_raw_films,
+                          session=session,
+                          cache=cache,
+                          archive=archive),
+                  source=articles_with_plots_queue,
+                  target=raw_films_queue,
+                  workers_count=fetchers_count),
+        run_stage(deserialize_films,
+                  source=raw_films_queue,
+                  target=films_batches_queue,
+                  workers_count=deserializers_count),
+        run_stage(partial(save_films,
+                          names_ids=names_ids,
+                          is_mysql=is_mysql,
+                          use_copy=use_copy,
+                          connection_pool=connection_pool),
+                  source=films_batches_queue,
+                  workers_count=writers_count))
+    logger.info(f'Successfully processed parsing '
+                f'films by articles, '
+                f'records handled.')
+
+
+async def read_articles(articles_batches: AsyncIterator[ArticlesRecordsType],
+                        *,
+                        target: Queue) -> None:
+    records_count = 0
+    async for articles_records in articles_batches:
+        logger.info('Processing '
+                    'films articles '
+                    f'from {records_count + 1} '
+                    f'to {records_count + len(articles_records)}.')
+        records_count += len(articles_records)
+        # waits if following stages are busy
+        await target.put(articles_records)
+    logger.info(f'Found {records_count} '
+                f'films articles records.')
+    await target.put(STOP)
+
+
+async def resolve_imdb_ids(articles_records: ArticlesRecordsType, *,
+                           skip_saved: bool,
                            is_mysql: bool,
                            connection_pool: ConnectionPoolType,
-                           session: ClientSession) -> None:
-    batch_size = max(math.ceil(limit / max_connections), 1)
-    stop = offset + limit
-    for batch_offset in range(offset, stop, batch_size):
-        batch_limit = min(stop - offset, batch_size)
-        await parse_films_batch(table_name=table_name,
-                                columns_names=columns_names,
-                                filters=filters,
-                                orderings=orderings,
-                                limit=batch_limit,
-                                offset=batch_offset,
-                                is_mysql=is_mysql,
-                                connection_pool=connection_pool,
-                                session=session)
-
-
-async def parse_films_batch(*,
-                            table_name: str,
-                            columns_names: List[str],
-                            filters: FiltersType,
-                            orderings: List[OrderingType],
-                            limit: int,
-                            offset: int,
-                            is_mysql: bool,
-                            connection_pool: ConnectionPoolType,
-                            session: ClientSession) -> None:
-    logger.info('Processing '
-                'films articles '
-                f'from {offset + 1} '
-                f'to {offset + limit}.')
-    async with connection_pool.acquire() as connection:
-        articles_records = await fetch(table_name=table_name,
-                                       columns_names=columns_names,
-                                       filters=filters,
-                                       orderings=orderings,
-                                       limit=limit,
-                                       offset=offset,
-                                       is_mysql=is_mysql,
-                                       connection=connection)
+                           session: ClientSession,
+                           cache: Optional[ResponsesCache]
+                           ) -> IdentifiedArticlesType:
+    articles_titles = [article_title
+                       for _, article_title, _ in articles_records]
+    imdb_ids = await get_imdb_ids(articles_titles,
+                                  session=session,
+                                  cache=cache)
+    if skip_saved and imdb_ids:
+        async with connection_pool.acquire() as connection:
+            saved_imdb_ids = await fetch_saved_imdb_ids(
+                imdb_ids.values(),
+                is_mysql=is_mysql,
+                connection=connection)
+        imdb_ids = {article_title: imdb_id
+                    for article_title, imdb_id in imdb_ids.items()
+                    if imdb_id not in saved_imdb_ids}
+    return articles_records, imdb_ids
+
+
+async def fetch_plots(identified_articles: IdentifiedArticlesType, *,
+                      session: ClientSession,
+                      cache: Optional[ResponsesCache]
+                      ) -> ArticlesWithPlotsType:
+    articles_records, imdb_ids = identified_articles
+    # there is no need in plots of articles without films
+    articles_ids = {article_title: article_id
+                    for article_id, article_title, _ in articles_records
+                    if article_title in imdb_ids}
+    if not articles_ids:
+        return articles_records, imdb_ids, {}
+    plots_contents = await get_plots_contents(articles_ids.keys(),
+                                              session=session,
+                                              cache=cache)
+    plots_contents = {articles_ids[article_title]: plot_content
+                      for article_title, plot_content
+                      in plots_contents.items()}
+    return articles_records, imdb_ids, plots_contents
+
+
+async def fetch_raw_films(articles_with_plots: ArticlesWithPlotsType, *,
+                          session: ClientSession,
+                          cache: Optional[ResponsesCache],
+                          archive: Optional[RawFilmsArchive]
+                          ) -> RawFilmsType:
+    articles_records, imdb_ids, plots_contents = articles_with_plots
     tasks = [ensure_future(get_raw_film(article_id=article_id,
                                         article_title=article_title,
                                         year=year,
-                                        session=session))
+                                        imdb_ids=imdb_ids,
+                                        session=session,
+                                        cache=cache))
              for article_id, article_title, year in articles_records]
     results = await gather(*tasks)
     raw_films = list(filter(None, results))
-    logger.info(f'Parsed {len(raw_films)} films data.')
-    films = list(map(Film.deserialize, raw_films))
-    films_genres = map(parse_genres, raw_films)
-    films_directors = map(parse_directors, raw_films)
-    films_writers = map(parse_writers, raw_films)
-    films_actors = map(parse_actors, raw_films)
-    films_plots = map(parse_plot, raw_films)
-
-    async with connection_pool.acquire() as connection:
-        films_plots_ids = await save_instances(
-            films_plots,
-            cls=Plot,
-            connection=connection,
-            is_mysql=is_mysql)
+    if archive is not None:
+        archive_raw_films(articles_records, raw_films, plots_contents,
+                          archive=archive)
+    return articles_records, raw_films, plots_contents
+
+
+def archive_raw_films(articles_records: ArticlesRecordsType,
+                      raw_films: List[Dict[str, Any]],
+                      plots_contents: Dict[int, str], *,
+                      archive: RawFilmsArchive) -> None:
+    articles_by_ids = {article_id: (article_title, year)
+                       for article_id, article_title, year
+                       in articles_records}
+    for raw_film in raw_films:
+        article_id = raw_film['article_id']
+        article_title, year = articles_by_ids[article_id]
+        # everything needed to save film without network
+        entry = dict(article=dict(id=article_id,
+                                  title=article_title,
+                                  year=year),
+                     film=raw_film,
+                     wikipedia_plot=plots_contents.get(article_id))
+        archive.write(entry,
+                      year=year)
+    archive.flush()
+
+
+async def deserialize_films(raw_films_with_plots: RawFilmsType
+                            ) -> FilmsBatch:
+    articles_records, raw_films, plots_contents = raw_films_with_plots
+    films_fields = [Film.parse_fields(raw_film)
+                    for raw_film in raw_films]
+    return FilmsBatch(
+        articles_ids=[article_id for article_id, _, _ in articles_records],
+        films=list(map(to_film_record, films_fields)),
+        plots=[parse_plot(raw_film,
+                          wikipedia_content=plots_contents.get(
+                              raw_film['article_id']))
+               for raw_film in raw_films],
+        genres=list(map(parse_genres, raw_films)),
+        directors=list(map(parse_directors, raw_films)),
+        writers=list(map(parse_writers, raw_films)),
+        actors=list(map(parse_actors, raw_films)),
+        countries=[film_fields['countries']
+                   for film_fields in films_fields],
+        languages=[film_fields['languages']
+                   for film_fields in films_fields])
+
+
+async def save_films(films_batch: FilmsBatch, *,
+                     names_ids: Dict[DeclarativeMeta, NamesIds],
+                     is_mysql: bool,
+                     use_copy: bool,
+                     connection_pool: ConnectionPoolType) -> None:
+    films = films_batch.films
+    uncommitted_names_ids = {cls: {} for cls in names_ids}
+    async with connection_pool.acquire() as connection, \
+            transaction(connection,
+                        is_mysql=is_mysql):
+        if films:
+            await save_films_data(films_batch,
+                                  names_ids=names_ids,
+                                  uncommitted_names_ids=uncommitted_names_ids,
+                                  connection=connection,
+                                  is_mysql=is_mysql,
+                                  use_copy=use_copy)
+        # marked as completed only along with saved films
+        await save_checkpoints(films_batch.articles_ids,
+                               stage=FILMS_STAGE,
+                               connection=connection,
+                               is_mysql=is_mysql)
+    # ids of rolled back rows never get into shared cache
+    for cls, cls_names_ids in uncommitted_names_ids.items():
+        names_ids[cls].update(cls_names_ids)
+    logger.info(f'Successfully saved {len(films)} films.')
+
+
+async def save_films_data(films_batch: FilmsBatch, *,
+                          names_ids: Dict[DeclarativeMeta, NamesIds],
+                          uncommitted_names_ids: Dict[DeclarativeMeta,
+                                                      Dict[str, int]],
+                          connection: ConnectionType,
+                          is_mysql: bool,
+                          use_copy: bool) -> None:
+    films = films_batch.films
+    films_plots_ids = await save_instances(
+        films_batch.plots,
+        cls=Plot,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+
+    updated_at = await fetch_current_time(connection=connection,
+                                          is_mysql=is_mysql)
+    films = [film._replace(plot_id=film_plot_id,
+                           updated_at=updated_at)
+             for film, film_plot_id in zip(films, films_plots_ids)]
+    films_ids = await save_instances(
+        films,
+        cls=Film,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
 
-        for film, film_plot_id in zip(films, films_plots_ids):
-            film.plot_id = film_plot_id
-        films_ids = await save_instances(
-            films,
-            cls=Film,
-            connection=connection,
-            is_mysql=is_mysql)
+    films_genres_ids = await save_films_names(
+        films_batch.genres,
+        cls=Genre,
+        names_ids=names_ids[Genre],
+        uncommitted_names_ids=uncommitted_names_ids[Genre],
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    films_directors_ids = await save_films_names(
+        films_batch.directors,
+        cls=Director,
+        names_ids=names_ids[Director],
+        uncommitted_names_ids=uncommitted_names_ids[Director],
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    films_writers_ids = await save_films_names(
+        films_batch.writers,
+        cls=Writer,
+        names_ids=names_ids[Writer],
+        uncommitted_names_ids=uncommitted_names_ids[Writer],
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    films_actors_ids = await save_films_names(
+        films_batch.actors,
+        cls=Actor,
+        names_ids=names_ids[Actor],
+        uncommitted_names_ids=uncommitted_names_ids[Actor],
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    films_countries_ids = await save_films_names(
+        films_batch.countries,
+        cls=Country,
+        names_ids=names_ids[Country],
+        uncommitted_names_ids=uncommitted_names_ids[Country],
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    films_languages_ids = await save_films_names(
+        films_batch.languages,
+        cls=Language,
+        names_ids=names_ids[Language],
+        uncommitted_names_ids=uncommitted_names_ids[Language],
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
 
-        films_genres_ids = [
-            await save_instances(
-                film_genres,
-                cls=Genre,
-                connection=connection,
-                is_mysql=is_mysql)
-            for film_genres in films_genres]
-        films_directors_ids = [
-            await save_instances(
-                film_directors,
-                cls=Director,
-                connection=connection,
-                is_mysql=is_mysql)
-            for film_directors in films_directors]
-        films_writers_ids = [
-            await save_instances(
-                film_writers,
-                cls=Writer,
-                connection=connection,
-                is_mysql=is_mysql)
-            for film_writers in films_writers]
-        films_actors_ids = [
-            await save_instances(
-                film_actors,
-                cls=Actor,
-                connection=connection,
-                is_mysql=is_mysql)
-            for film_actors in films_actors]
-
-        await save_relation(
-            films_ids=films_ids,
-            films_related_objects_ids=films_genres_ids,
-            relation_table=films_genres_table,
-            connection=connection,
-            is_mysql=is_mysql)
-        await save_relation(
-            films_ids=films_ids,
-            films_related_objects_ids=films_directors_ids,
-            relation_table=films_directors_table,
-            connection=connection,
-            is_mysql=is_mysql)
-        await save_relation(
-            films_ids=films_ids,
-            films_related_objects_ids=films_writers_ids,
-            relation_table=films_writers_table,
-            connection=connection,
-            is_mysql=is_mysql)
-        await save_relation(
-            films_ids=films_ids,
-            films_related_objects_ids=films_actors_ids,
-            relation_table=films_actors_table,
+    await save_relation(
+        films_ids=films_ids,
+        films_related_objects_ids=films_genres_ids,
+        relation_table=films_genres_table,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    await save_relation(
+        films_ids=films_ids,
+        films_related_objects_ids=films_directors_ids,
+        relation_table=films_directors_table,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    await save_relation(
+        films_ids=films_ids,
+        films_related_objects_ids=films_writers_ids,
+        relation_table=films_writers_table,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    await save_relation(
+        films_ids=films_ids,
+        films_related_objects_ids=films_actors_ids,
+        relation_table=films_actors_table,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    await save_relation(
+        films_ids=films_ids,
+        films_related_objects_ids=films_countries_ids,
+        relation_table=films_countries_table,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    await save_relation(
+        films_ids=films_ids,
+        films_related_objects_ids=films_languages_ids,
+        relation_table=films_languages_table,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+
+
+async def fetch_saved_imdb_ids(imdb_ids: Iterable[int], *,
+                               is_mysql: bool,
+                               connection: ConnectionType) -> Set[int]:
+    records = await fetch(table_name=Film.__tablename__,
+                          columns_names=[Film.imdb_id.name],
+                          filters=('IN', (Film.imdb_id.name,
+                                          list(imdb_ids))),
+                          is_mysql=is_mysql,
+                          connection=connection)
+    return {imdb_id for imdb_id, in records}
+
+
+async def save_films_names(films_names: List[List[str]], *,
+                           cls: DeclarativeMeta,
+                           names_ids: NamesIds,
+                           uncommitted_names_ids: Dict[str, int],
+                           connection: ConnectionType,
+                           is_mysql: bool,
+                           use_copy: bool) -> List[List[int]]:
+    batch_names_ids = await save_names(
+        (name
+         for film_names in films_names
+         for name in film_names),
+        cls=cls,
+        names_ids=names_ids,
+        uncommitted_names_ids=uncommitted_names_ids,
+        connection=connection,
+        is_mysql=is_mysql,
+        use_copy=use_copy)
+    return [[batch_names_ids[name]
+             for name in film_names]
+            for film_names in films_names]
+
+
+async def save_instances(
+        records: List[RecordType], *,
+        cls: DeclarativeMeta,
+        connection: ConnectionType,
+        is_mysql: bool,
+        use_copy: bool = False) -> List[int]:
+    model_metadata = get_model_metadata(cls)
+    columns_names = model_metadata.columns_names
+    unique_columns_names = model_metadata.unique_columns_names
+    returning_columns_names = [model_metadata.primary_key]
+    with measure_write(table_name=model_metadata.table_name,
+                       rows_count=len(records)):
+        if use_copy:
+            return await copy_upsert_instances(
+                records,
+                model_metadata=model_metadata,
+                connection=connection)
+        resp = await insert_returning(
+            table_name=model_metadata.table_name,
+            columns_names=columns_names,
+            unique_columns_names=unique_columns_names,
+            returning_columns_names=returning_columns_names,
+            records=records,
+            merge=True,
             connection=connection,
             is_mysql=is_mysql)
-    logger.info('Successfully processed '
-                'films articles '
-                f'from {offset + 1} '
-                f'to {offset + limit}.')
+    return [row[0] for row in resp]
 
 
-async def save_relation(
-        *, films_ids: Iterable[int],
-        films_related_objects_ids: Iterable[List[int]],
-        relation_table: Table,
-        connection: ConnectionType,
-        is_mysql: bool) -> None:
-    table_name = relation_table.name
-    columns_names = [column.name
-                     for column in relation_table.columns]
-    for film_id, film_related_objects_ids in zip(films_ids,
-                                                 films_related_objects_ids):
-        records_count = len(film_related_objects_ids)
-        records = list(zip([film_id] * records_count,
-                           film_related_objects_ids))
-        await insert(table_name=table_name,
-                     columns_names=columns_names,
-                     records=records,
-                     connection=connection,
-                     is_mysql=is_mysql)
-
-
-async def get_primary_key(table: Table
-                          ) -> str:
-    return next(column.name
-                for column in table.columns
-                if column.primary_key)
-
-
-async def get_unique_columns_names(
-        table: Table) -> List[str]:
-    return [column.name
-            for column in table.columns
-            if column.unique]
+async def copy_upsert_instances(records: List[RecordType], *,
+                                model_metadata: ModelMetadata,
+                                connection: ConnectionType) -> List[int]:
+    columns_names = model_metadata.columns_names
+    unique_columns_names = model_metadata.unique_columns_names
+    key_columns_indices = [columns_names.index(column_name)
+                           for column_name in unique_columns_names]
 
+    def to_key(record: RecordType) -> RecordType:
+        return tuple(record[index] for index in key_columns_indices)
 
-async def save_instances(
-        instances: Iterable[DeclarativeMeta], *,
-        cls: DeclarativeMeta,
-        connection: ConnectionType,
-        is_mysql: bool) -> List[int]:
-    columns_names = list(cls.columns_fields_names())
-    primary_key = await get_primary_key(table=cls.__table__)
-    primary_key_column_index = columns_names.index(primary_key)
-    columns_names.pop(primary_key_column_index)
-    unique_columns_names = await get_unique_columns_names(cls.__table__)
-    returning_columns_names = [primary_key]
-
-    def record_without_id(instance: DeclarativeMeta
-                          ) -> RecordType:
-        res = list(instance.record)
-        res.pop(primary_key_column_index)
-        return tuple(res)
-
-    records = map(record_without_id, instances)
-    resp = await insert_returning(
-        table_name=cls.__tablename__,
+    resp = await copy_upsert(
+        records,
+        table_name=model_metadata.table_name,
         columns_names=columns_names,
         unique_columns_names=unique_columns_names,
-        returning_columns_names=returning_columns_names,
-        records=records,
-        merge=True,
-        connection=connection,
-        is_mysql=is_mysql)
-    return [row[0] for row in resp]
+        returning_columns_names=([model_metadata.primary_key]
+                                 + unique_columns_names),
+        connection=connection)
+    # rows are returned in arbitrary order
+    ids_by_keys = {tuple(row[1:]): row[0] for row in resp}
+    return [ids_by_keys[to_key(record)] for record in records]
+
+
+def to_film_record(film_fields: Dict[str, Any]) -> RecordType:
+    film_metadata = get_model_metadata(Film)
+    return film_metadata.to_record(**film_fields)
 
 
 def parse_actors(raw_film: Dict[str, Any]
-                 ) -> List[Actor]:
-    return parse_related_instances(
-        cls=Actor,
-        names_str=raw_film['Actors'])
+                 ) -> List[str]:
+    return parse_related_names(raw_film['Actors'])
 
 
 def parse_writers(raw_film: Dict[str, Any]
-                  ) -> List[Writer]:
-    return parse_related_instances(
-        cls=Writer,
-        names_str=raw_film['Writer'])
+                  ) -> List[str]:
+    return parse_related_names(raw_film['Writer'])
 
 
 def parse_directors(raw_film: Dict[str, Any]
-                    ) -> List[Director]:
-    return parse_related_instances(
-        cls=Director,
-        names_str=raw_film['Director'])
+                    ) -> List[str]:
+    return parse_related_names(raw_film['Director'])
 
 
 def parse_genres(raw_film: Dict[str, str]
-                 ) -> List[Genre]:
-    return parse_related_instances(
-        cls=Genre,
-        names_str=raw_film['Genre'])
-
-
-def parse_plot(raw_film: Dict[str, str]
-               ) -> Plot:
+                 ) -> List[str]:
+    genres_names = parse_related_names(raw_film['Genre'])
+    # unknown genres do not fit into enumeration
+    # and fail the whole batch upsert
+    return [genre_name
+            for genre_name in genres_names
+            if genre_name in GENRES_NAMES]
+
+
+def parse_plot(raw_film: Dict[str, str], *,
+               wikipedia_content: Optional[str] = None
+               ) -> RecordType:
     imdb_content = raw_film['Plot'] or None
     imdb_id = parse_imdb_id(raw_film['imdbID'])
-    return Plot(imdb_id=imdb_id,
-                imdb_content=imdb_content)
+    plot_metadata = get_model_metadata(Plot)
+    return plot_metadata.to_record(imdb_id=imdb_id,
+                                   imdb_content=imdb_content,
+                                   wikipedia_content=wikipedia_content)
 
 
-def parse_related_instances(*,
-                            cls: Base,
-                            names_str: str
-                            ) -> List[Base]:
+def parse_related_names(names_str: str) -> List[str]:
     names = parse_names(names_str)
-    return [cls(name=name)
+    return [name
             for name in names
             if name != NOT_AVAILABLE_VALUE_ALIAS]
 
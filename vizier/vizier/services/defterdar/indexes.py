@@ -0,0 +1,256 @@
+import logging
+from asyncio import (AbstractEventLoop,
+                     gather)
+from itertools import groupby
+from typing import (Iterable,
+                    List, Set,
+                    Union)
+
+from cetus.data_access import (get_connection,
+                               get_connection_pool,
+                               is_db_uri_mysql)
+from cetus.data_access.execution import execute
+from cetus.data_access.reading import fetch_columns
+from cetus.types import (ConnectionPoolType,
+                         ConnectionType)
+from cetus.utils import join_str
+from sqlalchemy import (ForeignKeyConstraint,
+                        Index,
+                        PrimaryKeyConstraint,
+                        UniqueConstraint)
+from sqlalchemy.engine.url import URL
+
+from vizier.config import INDEX_BUILD_MEMORY
+from vizier.models.base import (KEPT_ON_BULK_LOAD_INFO_KEY,
+                               Base)
+
+logger = logging.getLogger(__name__)
+
+KeyType = Union[PrimaryKeyConstraint, UniqueConstraint]
+
+
+def check_indexes_support(*, is_mysql: bool) -> None:
+    if is_mysql:
+        err_msg = ('Invalid database: '
+                   'indexes management is supported only by PostgreSQL.')
+        raise ValueError(err_msg)
+
+
+def get_keys() -> List[KeyType]:
+    return [constraint
+            for table in Base.metadata.sorted_tables
+            for constraint in sorted(table.constraints,
+                                     key=to_name)
+            if isinstance(constraint, (PrimaryKeyConstraint,
+                                       UniqueConstraint))]
+
+
+def get_secondary_indexes() -> List[Index]:
+    return [index
+            for table in Base.metadata.sorted_tables
+            for index in sorted(table.indexes,
+                                key=to_name)
+            if not index.unique]
+
+
+def get_foreign_keys() -> List[ForeignKeyConstraint]:
+    return [constraint
+            for table in Base.metadata.sorted_tables
+            for constraint in sorted(table.foreign_key_constraints,
+                                     key=to_name)]
+
+
+def to_name(constraint: Union[Index, KeyType, ForeignKeyConstraint]
+            ) -> str:
+    return str(constraint.name)
+
+
+async def drop_secondary_indexes(*, db_uri: URL,
+                                 loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_indexes_support(is_mysql=db_is_mysql)
+    # keys are kept, since upserts rely on them
+    async with get_connection(db_uri=db_uri,
+                              is_mysql=db_is_mysql,
+                              loop=loop) as connection, \
+            connection.transaction():
+        for foreign_key in get_foreign_keys():
+            await execute(f'ALTER TABLE {foreign_key.table.name} '
+                          f'DROP CONSTRAINT IF EXISTS {foreign_key.name}',
+                          is_mysql=False,
+                          connection=connection)
+        for index in get_secondary_indexes():
+            if index.info.get(KEPT_ON_BULK_LOAD_INFO_KEY):
+                continue
+            await execute(f'DROP INDEX IF EXISTS {index.name}',
+                          is_mysql=False,
+                          connection=connection)
+    logger.info('Dropped secondary indexes and foreign keys.')
+
+
+async def create_indexes(*, max_connections: int = 10,
+                         db_uri: URL,
+                         loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_indexes_support(is_mysql=db_is_mysql)
+    async with get_connection_pool(db_uri=db_uri,
+                                   is_mysql=db_is_mysql,
+                                   max_size=max_connections,
+                                   loop=loop) as connection_pool:
+        async with connection_pool.acquire() as connection:
+            constraints_names = await fetch_constraints_names(
+                connection=connection)
+            for key in get_keys():
+                if key.name in constraints_names:
+                    continue
+                logger.info(f'Creating "{key.name}" key.')
+                await add_key(key,
+                              connection=connection)
+        # builds do not block each other,
+        # so every index is built by separate connection
+        await gather(*[create_index(index,
+                                    connection_pool=connection_pool)
+                       for index in get_secondary_indexes()])
+        foreign_keys = [foreign_key
+                        for foreign_key in get_foreign_keys()
+                        if foreign_key.name not in constraints_names]
+        await add_foreign_keys(foreign_keys,
+                               connection_pool=connection_pool)
+    logger.info('Created indexes and constraints.')
+
+
+async def fetch_constraints_names(*, connection: ConnectionType
+                                  ) -> Set[str]:
+    query = ('SELECT conname FROM pg_constraint '
+             'WHERE connamespace = current_schema()::regnamespace')
+    records = await fetch_columns(query,
+                                  columns_names=['conname'],
+                                  is_mysql=False,
+                                  connection=connection)
+    return {name for name, in records}
+
+
+async def add_key(key: KeyType, *,
+                  connection: ConnectionType) -> None:
+    table_name = key.table.name
+    key_type = ('PRIMARY KEY' if isinstance(key, PrimaryKeyConstraint)
+                else 'UNIQUE')
+    columns = join_str(column.name for column in key.columns)
+    async with connection.transaction():
+        # rows saved before key existed could be duplicated
+        await remove_duplicates(key,
+                                connection=connection)
+        await execute(f'ALTER TABLE {table_name} '
+                      f'ADD CONSTRAINT {key.name} {key_type} ({columns})',
+                      is_mysql=False,
+                      connection=connection)
+
+
+async def remove_duplicates(key: KeyType, *,
+                            connection: ConnectionType) -> None:
+    table = key.table
+    columns_names = [column.name for column in key.columns]
+    matches = ' AND '.join(f'duplicates.{column_name} '
+                           f'= kept.{column_name}'
+                           for column_name in columns_names)
+    primary_key_columns = list(table.primary_key.columns)
+    if key is table.primary_key or len(primary_key_columns) != 1:
+        # rows without surrogate id cannot be referred
+        await execute(f'DELETE FROM {table.name} AS duplicates '
+                      f'USING {table.name} AS kept '
+                      f'WHERE {matches} '
+                      'AND kept.ctid < duplicates.ctid',
+                      is_mysql=False,
+                      connection=connection)
+        return
+    id_column_name = primary_key_columns[0].name
+    partition = join_str(columns_names)
+    # references to duplicates are moved to the earliest row
+    for foreign_key in get_referring_foreign_keys(table.name):
+        referring_column_name, = foreign_key.column_keys
+        await execute(f'UPDATE {foreign_key.table.name} AS referring '
+                      f'SET {referring_column_name} = ids.kept_id '
+                      f'FROM (SELECT {id_column_name}, '
+                      f'MIN({id_column_name}) '
+                      f'OVER (PARTITION BY {partition}) AS kept_id '
+                      f'FROM {table.name}) AS ids '
+                      f'WHERE referring.{referring_column_name} '
+                      f'= ids.{id_column_name} '
+                      f'AND ids.{id_column_name} <> ids.kept_id',
+                      is_mysql=False,
+                      connection=connection)
+    await execute(f'DELETE FROM {table.name} AS duplicates '
+                  f'USING {table.name} AS kept '
+                  f'WHERE {matches} '
+                  f'AND kept.{id_column_name} '
+                  f'< duplicates.{id_column_name}',
+                  is_mysql=False,
+                  connection=connection)
+
+
+def get_referring_foreign_keys(table_name: str
+                               ) -> List[ForeignKeyConstraint]:
+    return [foreign_key
+            for foreign_key in get_foreign_keys()
+            if foreign_key.referred_table.name == table_name]
+
+
+async def create_index(index: Index, *,
+                       connection_pool: ConnectionPoolType) -> None:
+    columns = join_str(column.name for column in index.columns)
+    method = index.dialect_options['postgresql']['using'] or 'btree'
+    async with connection_pool.acquire() as connection, \
+            connection.transaction():
+        await execute(f"SET LOCAL maintenance_work_mem "
+                      f"= '{INDEX_BUILD_MEMORY}'",
+                      is_mysql=False,
+                      connection=connection)
+        await execute(f'CREATE INDEX IF NOT EXISTS {index.name} '
+                      f'ON {index.table.name} USING {method} ({columns})',
+                      is_mysql=False,
+                      connection=connection)
+    logger.info(f'Built "{index.name}" index.')
+
+
+async def add_foreign_keys(foreign_keys: Iterable[ForeignKeyConstraint], *,
+                           connection_pool: ConnectionPoolType) -> None:
+    foreign_keys = list(foreign_keys)
+    # constraints added without checking existing rows
+    # take locks only for a moment
+    async with connection_pool.acquire() as connection:
+        for foreign_key in foreign_keys:
+            columns = join_str(foreign_key.column_keys)
+            referred_columns = join_str(element.column.name
+                                        for element in foreign_key.elements)
+            await execute(f'ALTER TABLE {foreign_key.table.name} '
+                          f'ADD CONSTRAINT {foreign_key.name} '
+                          f'FOREIGN KEY ({columns}) '
+                          f'REFERENCES {foreign_key.referred_table.name} '
+                          f'({referred_columns}) '
+                          'NOT VALID',
+                          is_mysql=False,
+                          connection=connection)
+
+    def to_table_name(foreign_key: ForeignKeyConstraint) -> str:
+        return foreign_key.table.name
+
+    # validations of the same table block each other,
+    # so only different tables are validated in parallel
+    await gather(*[validate_foreign_keys(list(table_foreign_keys),
+                                         connection_pool=connection_pool)
+                   for _, table_foreign_keys in groupby(
+                       sorted(foreign_keys,
+                              key=to_table_name),
+                       key=to_table_name)])
+
+
+async def validate_foreign_keys(
+        foreign_keys: Iterable[ForeignKeyConstraint], *,
+        connection_pool: ConnectionPoolType) -> None:
+    async with connection_pool.acquire() as connection:
+        for foreign_key in foreign_keys:
+            await execute(f'ALTER TABLE {foreign_key.table.name} '
+                          f'VALIDATE CONSTRAINT {foreign_key.name}',
+                          is_mysql=False,
+                          connection=connection)
+            logger.info(f'Validated "{foreign_key.name}" foreign key.')
@@ -0,0 +1,182 @@
+from datetime import timedelta
+from typing import (Iterable,
+                    Optional,
+                    List)
+
+from cetus.data_access import insert
+from cetus.data_access.execution import execute
+from cetus.data_access.reading import fetch_columns
+from cetus.types import ConnectionType
+
+from vizier.models import Lease
+
+TABLE_NAME = Lease.__tablename__
+STAGE_COLUMN_NAME = Lease.stage.name
+UNIT_COLUMN_NAME = Lease.unit.name
+WORKER_COLUMN_NAME = Lease.worker.name
+LEASED_UNTIL_COLUMN_NAME = Lease.leased_until.name
+COMPLETED_COLUMN_NAME = Lease.completed.name
+ATTEMPTS_COLUMN_NAME = Lease.attempts.name
+
+
+def check_leasing_support(*, is_mysql: bool) -> None:
+    if is_mysql:
+        err_msg = ('Invalid database: '
+                   'work leasing is supported only by PostgreSQL.')
+        raise ValueError(err_msg)
+
+
+async def create_leases(units: Iterable[int], *,
+                        stage: str,
+                        connection: ConnectionType) -> None:
+    records = [(stage, unit) for unit in units]
+    if not records:
+        return
+    columns_names = [STAGE_COLUMN_NAME,
+                     UNIT_COLUMN_NAME]
+    # every worker creates the same units, existing ones are kept
+    await insert(table_name=TABLE_NAME,
+                 columns_names=columns_names,
+                 unique_columns_names=columns_names,
+                 records=records,
+                 connection=connection,
+                 is_mysql=False)
+
+
+async def reset_leases(*, connection: ConnectionType) -> None:
+    # completed units of previous runs are processed again
+    await execute(f'DELETE FROM {TABLE_NAME}',
+                  is_mysql=False,
+                  connection=connection)
+
+
+async def reopen_lease(*, stage: str,
+                       unit: int,
+                       connection: ConnectionType) -> None:
+    await execute(f'UPDATE {TABLE_NAME} '
+                  f'SET {COMPLETED_COLUMN_NAME} = FALSE, '
+                  f'{ATTEMPTS_COLUMN_NAME} = 0 '
+                  f'WHERE {STAGE_COLUMN_NAME} = $1 '
+                  f'AND {UNIT_COLUMN_NAME} = $2 '
+                  f'AND {COMPLETED_COLUMN_NAME}',
+                  stage, unit,
+                  is_mysql=False,
+                  connection=connection)
+
+
+async def acquire_lease(*, stage: str,
+                        worker: str,
+                        duration: timedelta,
+                        max_attempts: int,
+                        connection: ConnectionType) -> Optional[int]:
+    # locked rows are skipped, so workers do not wait for each other,
+    # and expired leases of crashed workers are taken over;
+    # database clock is used so workers clocks skews do not matter
+    query = (f'UPDATE {TABLE_NAME} '
+             f'SET {WORKER_COLUMN_NAME} = $1, '
+             f'{LEASED_UNTIL_COLUMN_NAME} = now() + $2::interval, '
+             f'{ATTEMPTS_COLUMN_NAME} = {ATTEMPTS_COLUMN_NAME} + 1 '
+             f'WHERE ({STAGE_COLUMN_NAME}, {UNIT_COLUMN_NAME}) = ('
+             f'SELECT {STAGE_COLUMN_NAME}, {UNIT_COLUMN_NAME} '
+             f'FROM {TABLE_NAME} '
+             f'WHERE {STAGE_COLUMN_NAME} = $3 '
+             f'AND NOT {COMPLETED_COLUMN_NAME} '
+             f'AND {ATTEMPTS_COLUMN_NAME} < $4 '
+             f'AND ({LEASED_UNTIL_COLUMN_NAME} IS NULL '
+             f'OR {LEASED_UNTIL_COLUMN_NAME} < now()) '
+             f'ORDER BY {UNIT_COLUMN_NAME} '
+             'LIMIT 1 '
+             'FOR UPDATE SKIP LOCKED) '
+             f'RETURNING {UNIT_COLUMN_NAME}')
+    records = await fetch_columns(query, worker, duration, stage,
+                                  max_attempts,
+                                  columns_names=[UNIT_COLUMN_NAME],
+                                  is_mysql=False,
+                                  connection=connection)
+    if not records:
+        return None
+    unit, = records[0]
+    return unit
+
+
+async def renew_lease(*, stage: str,
+                      unit: int,
+                      worker: str,
+                      duration: timedelta,
+                      connection: ConnectionType) -> bool:
+    query = (f'UPDATE {TABLE_NAME} '
+             f'SET {LEASED_UNTIL_COLUMN_NAME} = now() + $1::interval '
+             f'WHERE {STAGE_COLUMN_NAME} = $2 '
+             f'AND {UNIT_COLUMN_NAME} = $3 '
+             f'AND {WORKER_COLUMN_NAME} = $4 '
+             f'RETURNING {UNIT_COLUMN_NAME}')
+    records = await fetch_columns(query, duration, stage, unit, worker,
+                                  columns_names=[UNIT_COLUMN_NAME],
+                                  is_mysql=False,
+                                  connection=connection)
+    return bool(records)
+
+
+async def complete_lease(*, stage: str,
+                         unit: int,
+                         worker: str,
+                         connection: ConnectionType) -> None:
+    # unit taken over by another worker is completed by it
+    await execute(f'UPDATE {TABLE_NAME} '
+                  f'SET {COMPLETED_COLUMN_NAME} = TRUE, '
+                  f'{LEASED_UNTIL_COLUMN_NAME} = NULL '
+                  f'WHERE {STAGE_COLUMN_NAME} = $1 '
+                  f'AND {UNIT_COLUMN_NAME} = $2 '
+                  f'AND {WORKER_COLUMN_NAME} = $3',
+                  stage, unit, worker,
+                  is_mysql=False,
+                  connection=connection)
+
+
+async def release_lease(*, stage: str,
+                        unit: int,
+                        worker: str,
+                        connection: ConnectionType) -> None:
+    # failed unit can be retried right away
+    await execute(f'UPDATE {TABLE_NAME} '
+                  f'SET {LEASED_UNTIL_COLUMN_NAME} = NULL '
+                  f'WHERE {STAGE_COLUMN_NAME} = $1 '
+                  f'AND {UNIT_COLUMN_NAME} = $2 '
+                  f'AND {WORKER_COLUMN_NAME} = $3',
+                  stage, unit, worker,
+                  is_mysql=False,
+                  connection=connection)
+
+
+async def count_uncompleted_leases(*, stage: str,
+                                   max_attempts: int,
+                                   connection: ConnectionType) -> int:
+    # units without attempts left are not waited for,
+    # unless their last attempt is still in progress
+    records = await fetch_columns(f'SELECT COUNT(*) FROM {TABLE_NAME} '
+                                  f'WHERE {STAGE_COLUMN_NAME} = $1 '
+                                  f'AND NOT {COMPLETED_COLUMN_NAME} '
+                                  f'AND ({ATTEMPTS_COLUMN_NAME} < $2 '
+                                  f'OR {LEASED_UNTIL_COLUMN_NAME} >= now())',
+                                  stage, max_attempts,
+                                  columns_names=['count'],
+                                  is_mysql=False,
+                                  connection=connection)
+    count, = records[0]
+    return count
+
+
+async def fetch_failed_units(*, stage: str,
+                             max_attempts: int,
+                             connection: ConnectionType) -> List[int]:
+    records = await fetch_columns(f'SELECT {UNIT_COLUMN_NAME} '
+                                  f'FROM {TABLE_NAME} '
+                                  f'WHERE {STAGE_COLUMN_NAME} = $1 '
+                                  f'AND NOT {COMPLETED_COLUMN_NAME} '
+                                  f'AND {ATTEMPTS_COLUMN_NAME} >= $2 '
+                                  f'ORDER BY {UNIT_COLUMN_NAME}',
+                                  stage, max_attempts,
+                                  columns_names=[UNIT_COLUMN_NAME],
+                                  is_mysql=False,
+                                  connection=connection)
+    return [unit for unit, in records]
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from typing import (Optional,
+                    Iterable,
+                    Dict)
+
+from cetus.data_access import insert
+from cetus.data_access.reading import fetch_columns
+from cetus.types import ConnectionType
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import DeclarativeMeta
+
+from vizier.metrics import measure_write
+from .copying import copy_upsert
+
+
+class NamesIds:
+    # least recently used names are evicted first
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, name: str) -> Optional[int]:
+        try:
+            self.ids.move_to_end(name)
+        except KeyError:
+            return None
+        return self.ids[name]
+
+    def update(self, names_ids: Dict[str, int]) -> None:
+        for name, id_ in names_ids.items():
+            self.ids[name] = id_
+            self.ids.move_to_end(name)
+        while len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+
+
+async def save_names(names: Iterable[str], *,
+                     cls: DeclarativeMeta,
+                     names_ids: NamesIds,
+                     uncommitted_names_ids: Dict[str, int],
+                     connection: ConnectionType,
+                     is_mysql: bool,
+                     use_copy: bool = False) -> Dict[str, int]:
+    res = {}
+    new_names = set()
+    for name in names:
+        id_ = names_ids.get(name)
+        if id_ is None:
+            new_names.add(name)
+        else:
+            res[name] = id_
+    if new_names:
+        # sorting prevents deadlocks between concurrent upserts
+        new_names = sorted(new_names)
+        with measure_write(table_name=cls.__tablename__,
+                           rows_count=len(new_names)):
+            if is_mysql:
+                saved_names_ids = await save_mysql_names(
+                    new_names,
+                    cls=cls,
+                    connection=connection)
+            elif use_copy:
+                saved_names_ids = await copy_names(
+                    new_names,
+                    cls=cls,
+                    connection=connection)
+            else:
+                saved_names_ids = await save_postgres_names(
+                    new_names,
+                    cls=cls,
+                    connection=connection)
+        # cached only after commit by caller,
+        # since other writers do not see these rows till then
+        uncommitted_names_ids.update(saved_names_ids)
+        res.update(saved_names_ids)
+    return res
+
+
+async def save_postgres_names(names: Iterable[str], *,
+                              cls: DeclarativeMeta,
+                              connection: ConnectionType
+                              ) -> Dict[str, int]:
+    table_name = cls.__tablename__
+    id_column_name = cls.id.name
+    name_column = cls.__table__.columns[cls.name.name]
+    name_type = name_column.type.compile(dialect=postgresql.dialect())
+    # updating on conflict makes existing rows returned
+    query = (f'INSERT INTO {table_name} ({name_column.name}) '
+             f'SELECT unnest($1::{name_type}[]) '
+             f'ON CONFLICT ({name_column.name}) '
+             f'DO UPDATE SET {name_column.name} '
+             f'= EXCLUDED.{name_column.name} '
+             f'RETURNING {id_column_name}, {name_column.name}')
+    resp = await fetch_columns(query, list(names),
+                               columns_names=[id_column_name,
+                                              name_column.name],
+                               is_mysql=False,
+                               connection=connection)
+    return {name: id_ for id_, name in resp}
+
+
+async def copy_names(names: Iterable[str], *,
+                     cls: DeclarativeMeta,
+                     connection: ConnectionType) -> Dict[str, int]:
+    id_column_name = cls.id.name
+    name_column_name = cls.name.name
+    resp = await copy_upsert([(name,) for name in names],
+                             table_name=cls.__tablename__,
+                             columns_names=[name_column_name],
+                             unique_columns_names=[name_column_name],
+                             returning_columns_names=[id_column_name,
+                                                      name_column_name],
+                             connection=connection)
+    return {name: id_ for id_, name in resp}
+
+
+async def save_mysql_names(names: Iterable[str], *,
+                           cls: DeclarativeMeta,
+                           connection: ConnectionType
+                           ) -> Dict[str, int]:
+    names = list(names)
+    table_name = cls.__tablename__
+    id_column_name = cls.id.name
+    name_column_name = cls.name.name
+    await insert(table_name=table_name,
+                 columns_names=[name_column_name],
+                 unique_columns_names=[name_column_name],
+                 records=[(name,) for name in names],
+                 merge=True,
+                 connection=connection,
+                 is_mysql=True)
+    labels = ', '.join(['%s'] * len(names))
+    resp = await fetch_columns(f'SELECT {id_column_name}, {name_column_name} '
+                               f'FROM {table_name} '
+                               f'WHERE {name_column_name} IN ({labels})',
+                               *names,
+                               columns_names=[id_column_name,
+                                              name_column_name],
+                               is_mysql=True,
+                               connection=connection)
+    return {name: id_ for id_, name in resp}
@@ -0,0 +1,71 @@
+import logging
+from asyncio import (Queue,
+                     ensure_future,
+                     gather)
+from typing import (Any,
+                    Awaitable,
+                    Callable,
+                    Optional)
+
+from vizier.metrics import (QUEUE_SIZE,
+                            STAGE_IN_FLIGHT,
+                            STAGE_DURATION)
+
+logger = logging.getLogger(__name__)
+
+# marks end of stream of items in queue
+STOP = object()
+
+HandlerType = Callable[[Any], Awaitable[Any]]
+
+
+async def run_pipeline(*stages: Awaitable[None]) -> None:
+    tasks = [ensure_future(stage) for stage in stages]
+    try:
+        await gather(*tasks)
+    except Exception:
+        # stages are blocked on queues of failed one otherwise
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def run_stage(handler: HandlerType, *,
+                    source: Queue,
+                    target: Optional[Queue] = None,
+                    workers_count: int = 1) -> None:
+    workers = [ensure_future(run_worker(handler,
+                                        source=source,
+                                        target=target))
+               for _ in range(workers_count)]
+    try:
+        await gather(*workers)
+    except Exception:
+        for worker in workers:
+            worker.cancel()
+        raise
+    if target is not None:
+        await target.put(STOP)
+
+
+async def run_worker(handler: HandlerType, *,
+                     source: Queue,
+                     target: Optional[Queue]) -> None:
+    # handlers are usually partially applied
+    stage = getattr(handler, 'func', handler).__name__
+    while True:
+        item = await source.get()
+        QUEUE_SIZE.set(source.qsize(),
+                       stage=stage)
+        if item is STOP:
+            # passing marker to sibling workers
+            await source.put(STOP)
+            return
+        STAGE_IN_FLIGHT.inc(stage=stage)
+        try:
+            with STAGE_DURATION.time(stage=stage):
+                res = await handler(item)
+        finally:
+            STAGE_IN_FLIGHT.dec(stage=stage)
+        if target is not None and res is not None:
+            await target.put(res)
@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import (Any,
+                    AsyncIterator,
+                    List, Tuple)
+
+from cetus.data_access.reading import fetch_columns
+from cetus.queries.saving import (aiomysql_label_template,
+                                  asyncpg_label_template)
+from cetus.types import (ConnectionPoolType,
+                         RecordType)
+from cetus.utils import join_str
+
+from vizier.models import (Article,
+                           Checkpoint,
+                           Film)
+from vizier.models.checkpoint import FILMS_STAGE
+
+
+async def fetch_articles_batches(*, start_year: int,
+                                 stop_year: int,
+                                 batch_size: int,
+                                 skip_completed: bool = False,
+                                 is_mysql: bool,
+                                 connection_pool: ConnectionPoolType
+                                 ) -> AsyncIterator[List[RecordType]]:
+    table_name = Article.__tablename__
+    columns_names = [column.name for column in Article.__table__.columns]
+    year_column_name = Article.year.name
+    id_column_name = Article.id.name
+    year_column_index = columns_names.index(year_column_name)
+    id_column_index = columns_names.index(id_column_name)
+    label_template = (aiomysql_label_template if is_mysql
+                      else asyncpg_label_template)
+    labels = [label_template(index + 1) for index in range(5)]
+    columns = join_str(columns_names)
+    key = f'{year_column_name}, {id_column_name}'
+    years_filter = (f'{year_column_name} '
+                    f'BETWEEN {labels[0]} AND {labels[1]} ')
+    if skip_completed:
+        years_filter += f'AND {to_unprocessed_filter()} '
+    # keyset pagination on unique "(year, id)" pairs
+    # uses index instead of scanning all previous rows like "OFFSET" does
+    first_batch_query = (f'SELECT {columns} FROM {table_name} '
+                         f'WHERE {years_filter}'
+                         f'ORDER BY {key} '
+                         f'LIMIT {labels[2]}')
+    next_batch_query = (f'SELECT {columns} FROM {table_name} '
+                        f'WHERE {years_filter}'
+                        f'AND ({key}) > ({labels[2]}, {labels[3]}) '
+                        f'ORDER BY {key} '
+                        f'LIMIT {labels[4]}')
+    async for records in fetch_batches(
+            first_batch_query=first_batch_query,
+            next_batch_query=next_batch_query,
+            args=(start_year, stop_year),
+            key_columns_indices=[year_column_index, id_column_index],
+            batch_size=batch_size,
+            columns_names=columns_names,
+            is_mysql=is_mysql,
+            connection_pool=connection_pool):
+        yield records
+
+
+async def fetch_refreshed_articles_batches(
+        *, updated_before: datetime,
+        batch_size: int,
+        is_mysql: bool,
+        connection_pool: ConnectionPoolType
+) -> AsyncIterator[List[RecordType]]:
+    table_name = Article.__tablename__
+    columns_names = [column.name for column in Article.__table__.columns]
+    id_column_name = Article.id.name
+    id_column_index = columns_names.index(id_column_name)
+    label_template = (aiomysql_label_template if is_mysql
+                      else asyncpg_label_template)
+    labels = [label_template(index + 1) for index in range(3)]
+    columns = join_str(columns_names)
+    films_table_name = Film.__tablename__
+    # articles never processed before
+    # or ones with films fetched before given moment
+    articles_filter = (
+        f'({to_unprocessed_filter()} '
+        'OR EXISTS ('
+        f'SELECT 1 FROM {films_table_name} '
+        f'WHERE {films_table_name}.{Film.article_id.name} '
+        f'= {table_name}.{id_column_name} '
+        f'AND {films_table_name}.{Film.updated_at.name} '
+        f'< {labels[0]})) ')
+    first_batch_query = (f'SELECT {columns} FROM {table_name} '
+                         f'WHERE {articles_filter}'
+                         f'ORDER BY {id_column_name} '
+                         f'LIMIT {labels[1]}')
+    next_batch_query = (f'SELECT {columns} FROM {table_name} '
+                        f'WHERE {articles_filter}'
+                        f'AND {id_column_name} > {labels[1]} '
+                        f'ORDER BY {id_column_name} '
+                        f'LIMIT {labels[2]}')
+    async for records in fetch_batches(
+            first_batch_query=first_batch_query,
+            next_batch_query=next_batch_query,
+            args=(updated_before,),
+            key_columns_indices=[id_column_index],
+            batch_size=batch_size,
+            columns_names=columns_names,
+            is_mysql=is_mysql,
+            connection_pool=connection_pool):
+        yield records
+
+
+async def fetch_articles_range_batches(
+        *, start_id: int,
+        stop_id: int,
+        batch_size: int,
+        skip_completed: bool = False,
+        is_mysql: bool,
+        connection_pool: ConnectionPoolType
+) -> AsyncIterator[List[RecordType]]:
+    table_name = Article.__tablename__
+    columns_names = [column.name for column in Article.__table__.columns]
+    id_column_name = Article.id.name
+    id_column_index = columns_names.index(id_column_name)
+    label_template = (aiomysql_label_template if is_mysql
+                      else asyncpg_label_template)
+    labels = [label_template(index + 1) for index in range(4)]
+    columns = join_str(columns_names)
+    ids_filter = (f'{id_column_name} >= {labels[0]} '
+                  f'AND {id_column_name} < {labels[1]} ')
+    if skip_completed:
+        ids_filter += f'AND {to_unprocessed_filter()} '
+    first_batch_query = (f'SELECT {columns} FROM {table_name} '
+                         f'WHERE {ids_filter}'
+                         f'ORDER BY {id_column_name} '
+                         f'LIMIT {labels[2]}')
+    next_batch_query = (f'SELECT {columns} FROM {table_name} '
+                        f'WHERE {ids_filter}'
+                        f'AND {id_column_name} > {labels[2]} '
+                        f'ORDER BY {id_column_name} '
+                        f'LIMIT {labels[3]}')
+    async for records in fetch_batches(
+            first_batch_query=first_batch_query,
+            next_batch_query=next_batch_query,
+            args=(start_id, stop_id),
+            key_columns_indices=[id_column_index],
+            batch_size=batch_size,
+            columns_names=columns_names,
+            is_mysql=is_mysql,
+            connection_pool=connection_pool):
+        yield records
+
+
+def to_unprocessed_filter() -> str:
+    table_name = Article.__tablename__
+    checkpoints_table_name = Checkpoint.__tablename__
+    return ('NOT EXISTS ('
+            f'SELECT 1 FROM {checkpoints_table_name} '
+            f'WHERE {checkpoints_table_name}.{Checkpoint.stage.name} '
+            f'= \'{FILMS_STAGE}\' '
+            f'AND {checkpoints_table_name}.{Checkpoint.item.name} '
+            f'= {table_name}.{Article.id.name})')
+
+
+async def fetch_batches(*, first_batch_query: str,
+                        next_batch_query: str,
+                        args: Tuple[Any, ...],
+                        key_columns_indices: List[int],
+                        batch_size: int,
+                        columns_names: List[str],
+                        is_mysql: bool,
+                        connection_pool: ConnectionPoolType
+                        ) -> AsyncIterator[List[RecordType]]:
+    query, query_args = first_batch_query, (*args, batch_size)
+    while True:
+        async with connection_pool.acquire() as connection:
+            records = await fetch_columns(query, *query_args,
+                                          columns_names=columns_names,
+                                          is_mysql=is_mysql,
+                                          connection=connection)
+        if not records:
+            return
+        yield records
+        if len(records) < batch_size:
+            return
+        last_record = records[-1]
+        last_key = tuple(last_record[index]
+                         for index in key_columns_indices)
+        query, query_args = next_batch_query, (*args, *last_key, batch_size)
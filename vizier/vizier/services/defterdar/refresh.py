@@ -0,0 +1,146 @@
+import logging
+from asyncio import (AbstractEventLoop,
+                     gather, ensure_future)
+from datetime import timedelta
+from typing import Optional
+
+from aiohttp import ClientSession
+from cetus.data_access import (is_db_uri_mysql,
+                               get_connection_pool,
+                               fetch)
+from cetus.types import ConnectionPoolType
+from sqlalchemy.engine.url import URL
+
+from vizier.config import (WIKIPEDIA_API_TITLES_LIMIT,
+                           ARTICLES_BATCH_SIZE,
+                           NAMES_IDS_CACHE_SIZE)
+from vizier.models import Article
+from vizier.services.archive import RawFilmsArchive
+from vizier.services.cache import ResponsesCache
+from vizier.services.utils import StreamingError
+from vizier.services.wikipedia import get_articles_titles
+from vizier.utils import async_chunks
+from .articles import (get_articles_columns_names,
+                       save_articles)
+from .films import process_films
+from .reading import fetch_refreshed_articles_batches
+from .utils import (check_copy_support,
+                    fetch_current_time,
+                    transaction)
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_films(*,
+                        start_year: int,
+                        stop_year: int,
+                        max_age: timedelta,
+                        max_connections: int = 50,
+                        batch_size: int = WIKIPEDIA_API_TITLES_LIMIT,
+                        queue_size: int = 10,
+                        resolvers_count: int = 5,
+                        plots_fetchers_count: int = 5,
+                        fetchers_count: int = 20,
+                        deserializers_count: int = 1,
+                        writers_count: int = 5,
+                        names_ids_cache_size: int = NAMES_IDS_CACHE_SIZE,
+                        db_uri: URL,
+                        use_copy: bool = False,
+                        session: ClientSession,
+                        cache: Optional[ResponsesCache] = None,
+                        archive: Optional[RawFilmsArchive] = None,
+                        loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_copy_support(use_copy=use_copy,
+                       is_mysql=db_is_mysql)
+    async with get_connection_pool(db_uri=db_uri,
+                                   is_mysql=db_is_mysql,
+                                   max_size=max_connections,
+                                   loop=loop) as connection_pool:
+        # "updated_at" is set by database clock,
+        # which can differ from crawler's one
+        async with connection_pool.acquire() as connection:
+            current_time = await fetch_current_time(
+                connection=connection,
+                is_mysql=db_is_mysql)
+        updated_before = current_time - max_age
+        tasks = [ensure_future(
+            refresh_films_articles(year=year,
+                                   is_mysql=db_is_mysql,
+                                   use_copy=use_copy,
+                                   connection_pool=connection_pool,
+                                   session=session,
+                                   cache=cache))
+            for year in range(start_year, stop_year)]
+        await gather(*tasks)
+        # new articles are not processed yet,
+        # so they are picked up along with stale films
+        articles_batches = fetch_refreshed_articles_batches(
+            updated_before=updated_before,
+            batch_size=batch_size,
+            is_mysql=db_is_mysql,
+            connection_pool=connection_pool)
+        await process_films(articles_batches,
+                            queue_size=queue_size,
+                            resolvers_count=resolvers_count,
+                            plots_fetchers_count=plots_fetchers_count,
+                            fetchers_count=fetchers_count,
+                            deserializers_count=deserializers_count,
+                            writers_count=writers_count,
+                            names_ids_cache_size=names_ids_cache_size,
+                            skip_saved=False,
+                            is_mysql=db_is_mysql,
+                            use_copy=use_copy,
+                            connection_pool=connection_pool,
+                            session=session,
+                            cache=cache,
+                            archive=archive)
+
+
+async def refresh_films_articles(*, year: int,
+                                 is_mysql: bool,
+                                 use_copy: bool,
+                                 connection_pool: ConnectionPoolType,
+                                 session: ClientSession,
+                                 cache: Optional[ResponsesCache]) -> None:
+    articles_titles = get_articles_titles(year=year,
+                                          session=session,
+                                          cache=cache)
+    table_name = Article.__tablename__
+    columns_names, unique_columns_names = get_articles_columns_names()
+    new_articles_count = 0
+    try:
+        async with connection_pool.acquire() as connection, \
+                transaction(connection,
+                            is_mysql=is_mysql):
+            saved_records = await fetch(
+                table_name=table_name,
+                columns_names=[Article.title.name],
+                filters=('=', (Article.year.name, year)),
+                is_mysql=is_mysql,
+                connection=connection)
+            saved_titles = {title for title, in saved_records}
+            async for titles in async_chunks(articles_titles,
+                                             ARTICLES_BATCH_SIZE):
+                records = []
+                for title in titles:
+                    if title in saved_titles:
+                        continue
+                    saved_titles.add(title)
+                    records.append((title, year))
+                if not records:
+                    continue
+                await save_articles(records,
+                                    table_name=table_name,
+                                    columns_names=columns_names,
+                                    unique_columns_names=unique_columns_names,
+                                    is_mysql=is_mysql,
+                                    use_copy=use_copy,
+                                    connection=connection)
+                new_articles_count += len(records)
+    except StreamingError as error:
+        logger.warning(f'Failed to fetch films articles of {year} year, '
+                       f'year is left unrefreshed: {error}')
+        return
+    logger.info(f'Found {new_articles_count} new films articles '
+                f'of {year} year.')
@@ -0,0 +1,79 @@
+from itertools import chain
+from typing import (Iterable,
+                    List, Tuple)
+
+from cetus.data_access import insert
+from cetus.data_access.execution import execute
+from cetus.types import ConnectionType
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql
+
+from vizier.metrics import measure_write
+from .copying import copy_insert_missing
+
+
+async def save_relation(
+        *, films_ids: Iterable[int],
+        films_related_objects_ids: Iterable[List[int]],
+        relation_table: Table,
+        connection: ConnectionType,
+        is_mysql: bool,
+        use_copy: bool = False) -> None:
+    pairs = to_unique_pairs(films_ids=films_ids,
+                            films_related_objects_ids=films_related_objects_ids)
+    if not pairs:
+        return
+    columns_names = [column.name
+                     for column in relation_table.columns]
+    with measure_write(table_name=relation_table.name,
+                       rows_count=len(pairs)):
+        if is_mysql:
+            await insert(table_name=relation_table.name,
+                         columns_names=columns_names,
+                         unique_columns_names=columns_names,
+                         records=pairs,
+                         connection=connection,
+                         is_mysql=is_mysql)
+        elif use_copy:
+            await copy_insert_missing(pairs,
+                                      table_name=relation_table.name,
+                                      columns_names=columns_names,
+                                      key_columns_names=columns_names,
+                                      connection=connection)
+        else:
+            await save_postgres_relation(pairs,
+                                         relation_table=relation_table,
+                                         connection=connection)
+
+
+async def save_postgres_relation(pairs: List[Tuple[int, int]], *,
+                                 relation_table: Table,
+                                 connection: ConnectionType) -> None:
+    table_name = relation_table.name
+    film_column, related_object_column = relation_table.columns
+    film_column_type, related_object_column_type = (
+        column.type.compile(dialect=postgresql.dialect())
+        for column in relation_table.columns)
+    films_ids, related_objects_ids = zip(*pairs)
+    # already saved pairs are skipped by composite primary key
+    # so reprocessed films do not get duplicate relations
+    query = (f'INSERT INTO {table_name} '
+             f'({film_column.name}, {related_object_column.name}) '
+             f'SELECT * FROM unnest($1::{film_column_type}[], '
+             f'$2::{related_object_column_type}[]) '
+             'ON CONFLICT DO NOTHING')
+    await execute(query, list(films_ids), list(related_objects_ids),
+                  is_mysql=False,
+                  connection=connection)
+
+
+def to_unique_pairs(*, films_ids: Iterable[int],
+                    films_related_objects_ids: Iterable[List[int]]
+                    ) -> List[Tuple[int, int]]:
+    pairs = chain.from_iterable(
+        ((film_id, related_object_id)
+         for related_object_id in film_related_objects_ids)
+        for film_id, film_related_objects_ids in zip(
+            films_ids, films_related_objects_ids))
+    # preserving order for deterministic insertion
+    return list(dict.fromkeys(pairs))
@@ -0,0 +1,245 @@
+import logging
+from asyncio import (AbstractEventLoop,
+                     Queue)
+from functools import partial
+from typing import (Any,
+                    Optional,
+                    Dict, List)
+
+from cetus.data_access import (get_connection_pool,
+                               is_db_uri_mysql)
+from cetus.data_access.execution import (execute,
+                                         execute_many)
+from cetus.data_access.reading import fetch_columns
+from cetus.types import (ConnectionPoolType,
+                         ConnectionType,
+                         RecordType)
+from cetus.utils import join_str
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine.url import URL
+
+from vizier.config import (WIKIPEDIA_API_TITLES_LIMIT,
+                           NAMES_IDS_CACHE_SIZE)
+from vizier.models import (Article,
+                           Genre, Writer,
+                           Director, Actor,
+                           Country, Language)
+from vizier.services.archive import read_archive
+from vizier.utils import chunks
+from .films import (RawFilmsType,
+                    deserialize_films,
+                    save_films)
+from .names import NamesIds
+from .pipeline import (STOP,
+                       run_pipeline,
+                       run_stage)
+from .utils import check_copy_support
+
+logger = logging.getLogger(__name__)
+
+
+async def replay_films(*,
+                       archive_path: str,
+                       start_year: Optional[int] = None,
+                       stop_year: Optional[int] = None,
+                       max_connections: int = 50,
+                       batch_size: int = WIKIPEDIA_API_TITLES_LIMIT,
+                       queue_size: int = 10,
+                       articles_writers_count: int = 1,
+                       deserializers_count: int = 1,
+                       writers_count: int = 5,
+                       names_ids_cache_size: int = NAMES_IDS_CACHE_SIZE,
+                       db_uri: URL,
+                       use_copy: bool = False,
+                       loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_copy_support(use_copy=use_copy,
+                       is_mysql=db_is_mysql)
+    archived_films_queue = Queue(queue_size)
+    raw_films_queue = Queue(queue_size)
+    films_batches_queue = Queue(queue_size)
+    names_ids = {cls: NamesIds(names_ids_cache_size)
+                 for cls in [Genre, Director, Writer, Actor,
+                             Country, Language]}
+    async with get_connection_pool(db_uri=db_uri,
+                                   is_mysql=db_is_mysql,
+                                   max_size=max_connections,
+                                   loop=loop) as connection_pool:
+        await run_pipeline(
+            read_archived_films(archive_path,
+                                start_year=start_year,
+                                stop_year=stop_year,
+                                batch_size=batch_size,
+                                loop=loop,
+                                target=archived_films_queue),
+            run_stage(partial(save_archived_articles,
+                              is_mysql=db_is_mysql,
+                              connection_pool=connection_pool),
+                      source=archived_films_queue,
+                      target=raw_films_queue,
+                      workers_count=articles_writers_count),
+            run_stage(deserialize_films,
+                      source=raw_films_queue,
+                      target=films_batches_queue,
+                      workers_count=deserializers_count),
+            run_stage(partial(save_films,
+                              names_ids=names_ids,
+                              is_mysql=db_is_mysql,
+                              use_copy=use_copy,
+                              connection_pool=connection_pool),
+                      source=films_batches_queue,
+                      workers_count=writers_count))
+        if not db_is_mysql:
+            async with connection_pool.acquire() as connection:
+                await reset_articles_ids_sequence(connection=connection)
+    logger.info('Successfully replayed archived films.')
+
+
+async def read_archived_films(archive_path: str, *,
+                              start_year: Optional[int],
+                              stop_year: Optional[int],
+                              batch_size: int,
+                              loop: AbstractEventLoop,
+                              target: Queue) -> None:
+    entries = read_archive(archive_path,
+                           start_year=start_year,
+                           stop_year=stop_year)
+    batches = chunks(entries, batch_size)
+    entries_count = 0
+    while True:
+        # decompression and parsing do not block event loop
+        batch = await loop.run_in_executor(None, next, batches, None)
+        if batch is None:
+            break
+        entries_count += len(batch)
+        await target.put(to_raw_films(batch))
+    logger.info(f'Found {entries_count} archived films.')
+    await target.put(STOP)
+
+
+def to_raw_films(entries: List[Dict[str, Any]]) -> RawFilmsType:
+    articles_records = [(entry['article']['id'],
+                         entry['article']['title'],
+                         entry['article']['year'])
+                        for entry in entries]
+    raw_films = [entry['film'] for entry in entries]
+    plots_contents = {entry['article']['id']: entry['wikipedia_plot']
+                      for entry in entries
+                      if entry['wikipedia_plot'] is not None}
+    return articles_records, raw_films, plots_contents
+
+
+async def save_archived_articles(raw_films_with_plots: RawFilmsType, *,
+                                 is_mysql: bool,
+                                 connection_pool: ConnectionPoolType
+                                 ) -> RawFilmsType:
+    articles_records, raw_films, plots_contents = raw_films_with_plots
+    # films refer to articles by original ids
+    records = list(dict.fromkeys(articles_records))
+    titles = list(dict.fromkeys(title for _, title, _ in records))
+    async with connection_pool.acquire() as connection:
+        if is_mysql:
+            await save_mysql_articles(records,
+                                      connection=connection)
+        else:
+            await save_postgres_articles(records,
+                                         connection=connection)
+        titles_ids = await fetch_articles_ids(titles,
+                                              is_mysql=is_mysql,
+                                              connection=connection)
+    # articles with already saved titles are replaced by saved ones,
+    # ones with ids taken by other titles are skipped
+    articles_ids = {article_id: titles_ids.get(title)
+                    for article_id, title, _ in records}
+    skipped_count = sum(article_id is None
+                        for article_id in articles_ids.values())
+    if skipped_count:
+        logger.warning(f'Skipping {skipped_count} archived article(s) '
+                       'with ids taken by other titles.')
+    articles_records = list(dict.fromkeys(
+        (articles_ids[article_id], title, year)
+        for article_id, title, year in articles_records
+        if articles_ids[article_id] is not None))
+    raw_films = [{**raw_film,
+                  'article_id': articles_ids[raw_film['article_id']]}
+                 for raw_film in raw_films
+                 if articles_ids[raw_film['article_id']] is not None]
+    plots_contents = {articles_ids[article_id]: plot_content
+                      for article_id, plot_content in plots_contents.items()
+                      if articles_ids[article_id] is not None}
+    return articles_records, raw_films, plots_contents
+
+
+async def save_postgres_articles(records: List[RecordType], *,
+                                 connection: ConnectionType) -> None:
+    columns_names = [Article.id.name,
+                     Article.title.name,
+                     Article.year.name]
+    columns_types = [
+        Article.__table__.columns[column_name].type.compile(
+            dialect=postgresql.dialect())
+        for column_name in columns_names]
+    labels = join_str(f'${index}::{column_type}[]'
+                      for index, column_type in enumerate(columns_types,
+                                                          start=1))
+    # conflicts on both ids and titles are skipped
+    query = (f'INSERT INTO {Article.__tablename__} '
+             f'({join_str(columns_names)}) '
+             f'SELECT * FROM unnest({labels}) '
+             'ON CONFLICT DO NOTHING')
+    await execute(query, *map(list, zip(*records)),
+                  is_mysql=False,
+                  connection=connection)
+
+
+async def save_mysql_articles(records: List[RecordType], *,
+                              connection: ConnectionType) -> None:
+    columns_names = [Article.id.name,
+                     Article.title.name,
+                     Article.year.name]
+    labels = join_str(['%s'] * len(columns_names))
+    # conflicts on both ids and titles are skipped
+    await execute_many(f'INSERT IGNORE INTO {Article.__tablename__} '
+                       f'({join_str(columns_names)}) '
+                       f'VALUES ({labels})',
+                       args=records,
+                       is_mysql=True,
+                       connection=connection)
+
+
+async def fetch_articles_ids(titles: List[str], *,
+                             is_mysql: bool,
+                             connection: ConnectionType) -> Dict[str, int]:
+    id_column_name = Article.id.name
+    title_column_name = Article.title.name
+    if is_mysql:
+        titles_filter = f'IN ({join_str(["%s"] * len(titles))})'
+        args = titles
+    else:
+        titles_filter = '= ANY($1)'
+        args = [titles]
+    records = await fetch_columns(f'SELECT {id_column_name}, '
+                                  f'{title_column_name} '
+                                  f'FROM {Article.__tablename__} '
+                                  f'WHERE {title_column_name} '
+                                  f'{titles_filter}',
+                                  *args,
+                                  columns_names=[id_column_name,
+                                                 title_column_name],
+                                  is_mysql=is_mysql,
+                                  connection=connection)
+    return {title: article_id for article_id, title in records}
+
+
+async def reset_articles_ids_sequence(*, connection: ConnectionType
+                                      ) -> None:
+    table_name = Article.__tablename__
+    id_column_name = Article.id.name
+    # explicitly inserted ids do not advance PostgreSQL sequences
+    await execute(f'SELECT setval('
+                  f'pg_get_serial_sequence(\'{table_name}\', '
+                  f'\'{id_column_name}\'), '
+                  f'(SELECT COALESCE(MAX({id_column_name}), 1) '
+                  f'FROM {table_name}))',
+                  is_mysql=False,
+                  connection=connection)
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from asyncio_extras import async_contextmanager
+from cetus.data_access.reading import fetch_columns
+from cetus.types import ConnectionType
+
+
+def check_copy_support(*, use_copy: bool,
+                       is_mysql: bool) -> None:
+    if use_copy and is_mysql:
+        err_msg = ('Invalid write backend: '
+                   '"COPY" is supported only by PostgreSQL.')
+        raise ValueError(err_msg)
+
+
+@async_contextmanager
+async def transaction(connection: ConnectionType, *,
+                      is_mysql: bool):
+    if is_mysql:
+        await connection.begin()
+        try:
+            yield
+        except Exception:
+            await connection.rollback()
+            raise
+        await connection.commit()
+    else:
+        async with connection.transaction():
+            yield
+
+
+async def fetch_current_time(*, connection: ConnectionType,
+                             is_mysql: bool) -> datetime:
+    # database clock is shared by all writers and readers
+    records = await fetch_columns('SELECT LOCALTIMESTAMP AS now',
+                                  columns_names=['now'],
+                                  is_mysql=is_mysql,
+                                  connection=connection)
+    now, = records[0]
+    return now
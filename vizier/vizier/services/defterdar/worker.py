@@ -0,0 +1,314 @@
+import logging
+import os
+import socket
+from asyncio import (FIRST_COMPLETED,
+                     AbstractEventLoop,
+                     ensure_future,
+                     sleep,
+                     wait)
+from datetime import timedelta
+from typing import (Awaitable,
+                    Callable,
+                    Optional)
+
+from aiohttp import ClientSession
+from cetus.data_access import (get_connection_pool,
+                               is_db_uri_mysql)
+from cetus.data_access.reading import fetch_columns
+from cetus.types import (ConnectionPoolType,
+                         ConnectionType)
+from sqlalchemy.engine.url import URL
+
+from vizier.config import (WIKIPEDIA_API_TITLES_LIMIT,
+                           NAMES_IDS_CACHE_SIZE,
+                           FILMS_LEASE_UNIT_SIZE,
+                           MAX_LEASE_ATTEMPTS_COUNT,
+                           LEASES_POLLING_INTERVAL_IN_SECONDS)
+from vizier.models import Article
+from vizier.models.checkpoint import (ARTICLES_STAGE,
+                                      FILMS_STAGE)
+from vizier.services.archive import RawFilmsArchive
+from vizier.services.cache import ResponsesCache
+from vizier.utils import join_str
+from .articles import (get_articles_columns_names,
+                       parse_films_article_batch)
+from .films import process_films
+from .leasing import (check_leasing_support,
+                      reset_leases,
+                      reopen_lease,
+                      create_leases,
+                      acquire_lease,
+                      renew_lease,
+                      release_lease,
+                      complete_lease,
+                      count_uncompleted_leases,
+                      fetch_failed_units)
+from .reading import (fetch_articles_range_batches,
+                      to_unprocessed_filter)
+from .utils import check_copy_support
+
+logger = logging.getLogger(__name__)
+
+# handlers report whether unit is processed successfully
+UnitHandlerType = Callable[[int], Awaitable[bool]]
+
+
+async def run_crawl_worker(*,
+                           start_year: int,
+                           stop_year: int,
+                           lease_duration: timedelta,
+                           reset: bool = False,
+                           max_connections: int = 50,
+                           batch_size: int = WIKIPEDIA_API_TITLES_LIMIT,
+                           queue_size: int = 10,
+                           resolvers_count: int = 5,
+                           plots_fetchers_count: int = 5,
+                           fetchers_count: int = 20,
+                           deserializers_count: int = 1,
+                           writers_count: int = 5,
+                           names_ids_cache_size: int = NAMES_IDS_CACHE_SIZE,
+                           db_uri: URL,
+                           use_copy: bool = False,
+                           session: ClientSession,
+                           cache: Optional[ResponsesCache] = None,
+                           archive: Optional[RawFilmsArchive] = None,
+                           loop: AbstractEventLoop) -> None:
+    db_is_mysql = await is_db_uri_mysql(db_uri)
+    check_leasing_support(is_mysql=db_is_mysql)
+    check_copy_support(use_copy=use_copy,
+                       is_mysql=db_is_mysql)
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    logger.info(f'Starting "{worker}" worker.')
+    table_name = Article.__tablename__
+    columns_names, unique_columns_names = get_articles_columns_names()
+    async with get_connection_pool(db_uri=db_uri,
+                                   is_mysql=db_is_mysql,
+                                   max_size=max_connections,
+                                   loop=loop) as connection_pool:
+        async def parse_year(year: int) -> bool:
+            return await parse_films_article_batch(
+                year=year,
+                table_name=table_name,
+                columns_names=columns_names,
+                unique_columns_names=unique_columns_names,
+                session=session,
+                cache=cache,
+                is_mysql=db_is_mysql,
+                use_copy=use_copy,
+                connection_pool=connection_pool)
+
+        async def parse_articles_range(unit: int) -> bool:
+            start_id = unit * FILMS_LEASE_UNIT_SIZE
+            stop_id = (unit + 1) * FILMS_LEASE_UNIT_SIZE
+            articles_batches = fetch_articles_range_batches(
+                start_id=start_id,
+                stop_id=stop_id,
+                batch_size=batch_size,
+                # range could be partially processed by crashed worker
+                skip_completed=True,
+                is_mysql=db_is_mysql,
+                connection_pool=connection_pool)
+            await process_films(articles_batches,
+                                queue_size=queue_size,
+                                resolvers_count=resolvers_count,
+                                plots_fetchers_count=plots_fetchers_count,
+                                fetchers_count=fetchers_count,
+                                deserializers_count=deserializers_count,
+                                writers_count=writers_count,
+                                names_ids_cache_size=names_ids_cache_size,
+                                skip_saved=True,
+                                is_mysql=db_is_mysql,
+                                use_copy=use_copy,
+                                connection_pool=connection_pool,
+                                session=session,
+                                cache=cache,
+                                archive=archive)
+            # articles are checkpointed along with their films,
+            # so unit is completed only if none of them is left
+            async with connection_pool.acquire() as connection:
+                unprocessed_count = await count_unprocessed_articles(
+                    start_id=start_id,
+                    stop_id=stop_id,
+                    connection=connection)
+            return not unprocessed_count
+
+        async with connection_pool.acquire() as connection:
+            if reset:
+                await reset_leases(connection=connection)
+            await create_leases(range(start_year, stop_year),
+                                stage=ARTICLES_STAGE,
+                                connection=connection)
+        # articles ranges are known only after all articles are saved
+        await process_stage(parse_year,
+                            stage=ARTICLES_STAGE,
+                            worker=worker,
+                            lease_duration=lease_duration,
+                            max_attempts=MAX_LEASE_ATTEMPTS_COUNT,
+                            connection_pool=connection_pool)
+        async with connection_pool.acquire() as connection:
+            max_article_id = await fetch_max_article_id(
+                connection=connection)
+            last_unit = max_article_id // FILMS_LEASE_UNIT_SIZE
+            await create_leases(range(last_unit + 1),
+                                stage=FILMS_STAGE,
+                                connection=connection)
+            # new articles could get ids in range completed before,
+            # its processed articles are skipped
+            await reopen_lease(stage=FILMS_STAGE,
+                               unit=last_unit,
+                               connection=connection)
+        await process_stage(parse_articles_range,
+                            stage=FILMS_STAGE,
+                            worker=worker,
+                            lease_duration=lease_duration,
+                            max_attempts=MAX_LEASE_ATTEMPTS_COUNT,
+                            connection_pool=connection_pool)
+    logger.info(f'Worker "{worker}" has no more work.')
+
+
+async def process_leases(handler: UnitHandlerType, *,
+                         stage: str,
+                         worker: str,
+                         lease_duration: timedelta,
+                         max_attempts: int,
+                         connection_pool: ConnectionPoolType) -> None:
+    while True:
+        async with connection_pool.acquire() as connection:
+            unit = await acquire_lease(stage=stage,
+                                       worker=worker,
+                                       duration=lease_duration,
+                                       max_attempts=max_attempts,
+                                       connection=connection)
+        if unit is None:
+            return
+        logger.info(f'Processing unit #{unit} of "{stage}" stage.')
+        handling = ensure_future(handler(unit))
+        renewing = ensure_future(
+            hold_lease(stage=stage,
+                       unit=unit,
+                       worker=worker,
+                       duration=lease_duration,
+                       connection_pool=connection_pool))
+        try:
+            await wait([handling, renewing],
+                       return_when=FIRST_COMPLETED)
+        finally:
+            renewing.cancel()
+            lease_is_lost = not handling.done()
+            if lease_is_lost:
+                handling.cancel()
+        if lease_is_lost:
+            # unit is left to worker which has taken it over
+            await wait([handling])
+            continue
+        try:
+            processed = handling.result()
+        except Exception:
+            # unit uses up its attempts instead of crashing every worker
+            logger.exception(f'Error while processing unit #{unit} '
+                             f'of "{stage}" stage.')
+            processed = False
+        if not processed:
+            logger.warning(f'Failed to process unit #{unit} '
+                           f'of "{stage}" stage.')
+            async with connection_pool.acquire() as connection:
+                await release_lease(stage=stage,
+                                    unit=unit,
+                                    worker=worker,
+                                    connection=connection)
+            continue
+        async with connection_pool.acquire() as connection:
+            await complete_lease(stage=stage,
+                                 unit=unit,
+                                 worker=worker,
+                                 connection=connection)
+
+
+async def hold_lease(*, stage: str,
+                     unit: int,
+                     worker: str,
+                     duration: timedelta,
+                     connection_pool: ConnectionPoolType) -> None:
+    # renewing well before expiration
+    while True:
+        await sleep(duration.total_seconds() / 3)
+        try:
+            async with connection_pool.acquire() as connection:
+                renewed = await renew_lease(stage=stage,
+                                            unit=unit,
+                                            worker=worker,
+                                            duration=duration,
+                                            connection=connection)
+        except Exception:
+            # lease is still held till next attempt
+            logger.exception(f'Failed to renew lease on unit #{unit} '
+                             f'of "{stage}" stage.')
+            continue
+        if not renewed:
+            logger.warning(f'Lease on unit #{unit} of "{stage}" stage '
+                           'has been taken over by another worker.')
+            return
+
+
+async def process_stage(handler: UnitHandlerType, *,
+                        stage: str,
+                        worker: str,
+                        lease_duration: timedelta,
+                        max_attempts: int,
+                        connection_pool: ConnectionPoolType) -> None:
+    # units leased by other workers are taken over
+    # if they crash, so stage is left only after its completion
+    while True:
+        await process_leases(handler,
+                             stage=stage,
+                             worker=worker,
+                             lease_duration=lease_duration,
+                             max_attempts=max_attempts,
+                             connection_pool=connection_pool)
+        async with connection_pool.acquire() as connection:
+            uncompleted_count = await count_uncompleted_leases(
+                stage=stage,
+                max_attempts=max_attempts,
+                connection=connection)
+            failed_units = await fetch_failed_units(
+                stage=stage,
+                max_attempts=max_attempts,
+                connection=connection)
+        if not uncompleted_count:
+            if failed_units:
+                logger.error(f'Giving up on unit(s) '
+                             f'{join_str(failed_units)} '
+                             f'of "{stage}" stage '
+                             f'after {max_attempts} attempt(s).')
+            return
+        logger.info(f'Waiting for {uncompleted_count} unit(s) '
+                    f'of "{stage}" stage processed by other workers.')
+        await sleep(LEASES_POLLING_INTERVAL_IN_SECONDS)
+
+
+async def fetch_max_article_id(*, connection: ConnectionType) -> int:
+    id_column_name = Article.id.name
+    query = (f'SELECT COALESCE(MAX({id_column_name}), 0) AS max_id '
+             f'FROM {Article.__tablename__}')
+    records = await fetch_columns(query,
+                                  columns_names=['max_id'],
+                                  is_mysql=False,
+                                  connection=connection)
+    max_article_id, = records[0]
+    return max_article_id
+
+
+async def count_unprocessed_articles(*, start_id: int,
+                                     stop_id: int,
+                                     connection: ConnectionType) -> int:
+    id_column_name = Article.id.name
+    query = (f'SELECT COUNT(*) FROM {Article.__tablename__} '
+             f'WHERE {id_column_name} >= $1 '
+             f'AND {id_column_name} < $2 '
+             f'AND {to_unprocessed_filter()}')
+    records = await fetch_columns(query, start_id, stop_id,
+                                  columns_names=['count'],
+                                  is_mysql=False,
+                                  connection=connection)
+    count, = records[0]
+    return count
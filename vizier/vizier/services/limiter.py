@@ -0,0 +1,109 @@
+import logging
+import time
+from asyncio import (Condition,
+                     sleep)
+from typing import (Optional,
+                    Dict)
+from urllib.parse import urlsplit
+
+from vizier.config import (HOSTS_LIMITS,
+                           DEFAULT_HOST_LIMITS)
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimiter:
+    def __init__(self, host: str, *,
+                 rate: float,
+                 min_rate: float,
+                 max_rate: float,
+                 max_concurrency: int,
+                 rate_increase: float,
+                 decrease_factor: float,
+                 retry_budget_ratio: float,
+                 min_retry_budget: float,
+                 max_retry_budget: float,
+                 max_response_size: Optional[int]):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.rate_increase = rate_increase
+        self.decrease_factor = decrease_factor
+        self.retry_budget_ratio = retry_budget_ratio
+        self.max_retry_budget = max_retry_budget
+        self.retry_budget = min_retry_budget
+        self.max_response_size = max_response_size
+
+        # token bucket allows bursts up to one second of requests
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self.in_flight_count = 0
+        self.condition = Condition()
+
+    async def acquire(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.in_flight_count < self.concurrency)
+            self.in_flight_count += 1
+        while True:
+            self.refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await sleep((1 - self.tokens) / self.rate)
+
+    async def release(self) -> None:
+        async with self.condition:
+            self.in_flight_count -= 1
+            self.condition.notify_all()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.tokens + elapsed * self.rate,
+                          max(self.rate, 1))
+
+    def on_success(self) -> None:
+        # additive increase by `rate_increase`
+        # per `rate` of successful requests, i.e. roughly per second
+        self.rate = min(self.rate + self.rate_increase / self.rate,
+                        self.max_rate)
+        if self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+        self.retry_budget = min(self.retry_budget + self.retry_budget_ratio,
+                                self.max_retry_budget)
+
+    def on_overload(self) -> None:
+        # multiplicative decrease
+        self.rate = max(self.rate * self.decrease_factor,
+                        self.min_rate)
+        self.concurrency = max(int(self.concurrency * self.decrease_factor),
+                               1)
+        self.tokens = min(self.tokens, 0)
+        logger.debug(f'Host "{self.host}" is overloaded, '
+                     f'decreasing rate to {self.rate:.2f} request(s) '
+                     f'per second and concurrency to {self.concurrency}.')
+
+    def withdraw_retry(self) -> bool:
+        if self.retry_budget < 1:
+            return False
+        self.retry_budget -= 1
+        return True
+
+
+LIMITERS = {}  # type: Dict[str, HostLimiter]
+
+
+def get_limiter(url: str) -> HostLimiter:
+    host = urlsplit(url).netloc
+    try:
+        return LIMITERS[host]
+    except KeyError:
+        limits = {**DEFAULT_HOST_LIMITS,
+                  **HOSTS_LIMITS.get(url, {})}
+        limiter = LIMITERS[host] = HostLimiter(host, **limits)
+        return limiter
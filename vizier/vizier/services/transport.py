@@ -0,0 +1,28 @@
+from typing import NamedTuple
+
+from aiohttp import (ClientSession,
+                     ClientTimeout,
+                     TCPConnector)
+
+
+class TransportSettings(NamedTuple):
+    connections_limit: int
+    # concurrency of each upstream is adjusted by its limiter
+    # up to "max_concurrency", so this is a hard cap above it
+    connections_per_host_limit: int
+    keepalive_timeout: float
+    dns_cache_ttl: int
+    connect_timeout: float
+    read_timeout: float
+
+
+async def create_session(settings: TransportSettings) -> ClientSession:
+    connector = TCPConnector(limit=settings.connections_limit,
+                             limit_per_host=settings.connections_per_host_limit,
+                             keepalive_timeout=settings.keepalive_timeout,
+                             use_dns_cache=True,
+                             ttl_dns_cache=settings.dns_cache_ttl)
+    timeout = ClientTimeout(sock_connect=settings.connect_timeout,
+                            sock_read=settings.read_timeout)
+    return ClientSession(connector=connector,
+                         timeout=timeout)
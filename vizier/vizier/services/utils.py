@@ -1 +1,273 @@
+import itertools
+import json
+import logging
+import random
+import time
+from asyncio import (TimeoutError,
+                     sleep)
+from json import JSONDecodeError
+from typing import (Any,
+                    AsyncIterator,
+                    Optional,
+                    Dict)
+from urllib.parse import urlsplit
+
+import ijson
+from aiohttp import (ClientError,
+                     ClientResponse,
+                     ClientSession,
+                     ContentTypeError)
+
+from vizier.config import (MAX_ATTEMPTS_COUNT,
+                           BACKOFF_BASE_IN_SECONDS,
+                           BACKOFF_CAP_IN_SECONDS)
+from vizier.metrics import (HTTP_REQUESTS,
+                            HTTP_REQUEST_DURATION,
+                            HTTP_RETRIES)
+from .cache import ResponsesCache
+from .limiter import (HostLimiter,
+                      get_limiter)
+
 A_TIMEOUT_OCCURRED = 524
+TOO_MANY_REQUESTS = 429
+# statuses which mean that server is overloaded
+# and the request should be repeated later
+RETRYABLE_STATUSES = {TOO_MANY_REQUESTS,
+                      500, 502, 503, 504,
+                      A_TIMEOUT_OCCURRED}
+
+logger = logging.getLogger(__name__)
+
+
+# distinguishes cached streamed items from whole responses
+STREAMED_ITEMS_PARAMETER = 'streamed_items'
+
+
+class ResponseTooLargeError(Exception):
+    pass
+
+
+class StreamingError(Exception):
+    pass
+
+
+class OfflineCacheMissError(Exception):
+    pass
+
+
+async def get_json(url: str, *,
+                   params: Dict[str, Any],
+                   session: ClientSession,
+                   cache: Optional[ResponsesCache] = None) -> Any:
+    if cache is not None:
+        try:
+            return cache.get(url, params=params)
+        except KeyError:
+            if cache.offline:
+                logger.debug(f'No cached response found for "{url}" '
+                             f'with parameters {params} '
+                             'in offline mode.')
+                return None
+    limiter = get_limiter(url)
+    host = urlsplit(url).netloc
+    for attempt_num in itertools.count(1):
+        retry_after = None
+        reason = None
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            async with session.get(url, params=params) as response:
+                HTTP_REQUEST_DURATION.observe(time.monotonic() - start,
+                                              host=host)
+                reason = response.status
+                if response.status in RETRYABLE_STATUSES:
+                    failure = f'answered with status code {response.status}'
+                    retry_after = parse_retry_after(
+                        response.headers.get('Retry-After'))
+                else:
+                    try:
+                        response_json = await read_json(
+                            response,
+                            max_size=limiter.max_response_size)
+                    except (JSONDecodeError, ContentTypeError):
+                        logger.exception('')
+                        limiter.on_success()
+                        return None
+                    except ResponseTooLargeError as error:
+                        logger.warning(f'Skipping response of "{url}" '
+                                       f'with parameters {params}: '
+                                       f'{error}')
+                        limiter.on_success()
+                        return None
+                    limiter.on_success()
+                    if cache is not None and response.status == 200:
+                        cache.set(url, response_json,
+                                  params=params)
+                    return response_json
+        except (ClientError, TimeoutError) as error:
+            # body reading could fail after status is received
+            reason = type(error).__name__
+            failure = f'failed with {error!r}'
+        finally:
+            # counted once per attempt with its final outcome
+            if reason is not None:
+                HTTP_REQUESTS.inc(host=host,
+                                  status=reason)
+            await limiter.release()
+        if not await wait_for_retry(url,
+                                    attempt_num=attempt_num,
+                                    failure=failure,
+                                    reason=reason,
+                                    retry_after=retry_after,
+                                    limiter=limiter):
+            return None
+
+
+async def stream_json_items(url: str, *,
+                            params: Dict[str, Any],
+                            prefix: str,
+                            session: ClientSession,
+                            cache: Optional[ResponsesCache] = None
+                            ) -> AsyncIterator[Any]:
+    # items are yielded while response is downloaded,
+    # so failures are raised instead of returning "None";
+    # previously cached items are used even if caching is off
+    cache_params = {**params,
+                    STREAMED_ITEMS_PARAMETER: prefix}
+    if cache is not None:
+        try:
+            items = cache.get(url, params=cache_params)
+        except KeyError:
+            if cache.offline:
+                # unlike missing films, missing listings
+                # would silently leave whole years unprocessed
+                raise OfflineCacheMissError(
+                    f'No cached response found for "{url}" '
+                    f'with parameters {params} in offline mode, '
+                    'streamed responses are cached only by runs '
+                    'with "--cache-streamed" flag.')
+        else:
+            for item in items:
+                yield item
+            return
+    limiter = get_limiter(url)
+    host = urlsplit(url).netloc
+    cache_items = cache is not None and cache.cache_streamed
+    for attempt_num in itertools.count(1):
+        retry_after = None
+        reason = None
+        # collected only for caching
+        items = []
+        items_count = 0
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            async with session.get(url, params=params) as response:
+                HTTP_REQUEST_DURATION.observe(time.monotonic() - start,
+                                              host=host)
+                reason = response.status
+                if response.status in RETRYABLE_STATUSES:
+                    failure = f'answered with status code {response.status}'
+                    retry_after = parse_retry_after(
+                        response.headers.get('Retry-After'))
+                elif response.status != 200:
+                    limiter.on_success()
+                    raise StreamingError(f'Server "{url}" answered '
+                                         'with status code '
+                                         f'{response.status}.')
+                else:
+                    try:
+                        async for item in ijson.items(response.content,
+                                                      prefix):
+                            if cache_items:
+                                items.append(item)
+                            items_count += 1
+                            yield item
+                    except ijson.JSONError as error:
+                        limiter.on_success()
+                        raise StreamingError(f'Invalid response '
+                                             f'of "{url}": '
+                                             f'{error}.') from error
+                    limiter.on_success()
+                    if cache_items:
+                        cache.set(url, items,
+                                  params=cache_params)
+                    return
+        except (ClientError, TimeoutError) as error:
+            # body reading could fail after status is received
+            reason = type(error).__name__
+            failure = f'failed with {error!r}'
+            if items_count:
+                # already yielded items can not be taken back
+                limiter.on_overload()
+                raise StreamingError(f'Server "{url}" {failure} '
+                                     f'after {items_count} '
+                                     'item(s).') from error
+        finally:
+            # counted once per attempt with its final outcome
+            if reason is not None:
+                HTTP_REQUESTS.inc(host=host,
+                                  status=reason)
+            await limiter.release()
+        if not await wait_for_retry(url,
+                                    attempt_num=attempt_num,
+                                    failure=failure,
+                                    reason=reason,
+                                    retry_after=retry_after,
+                                    limiter=limiter):
+            raise StreamingError(f'Server "{url}" {failure}.')
+
+
+async def wait_for_retry(url: str, *,
+                         attempt_num: int,
+                         failure: str,
+                         reason: Any,
+                         retry_after: Optional[float],
+                         limiter: HostLimiter) -> bool:
+    limiter.on_overload()
+    if (attempt_num >= MAX_ATTEMPTS_COUNT
+            or not limiter.withdraw_retry()):
+        logger.warning(f'Giving up after attempt #{attempt_num}: '
+                       f'server "{url}" {failure}.')
+        return False
+    HTTP_RETRIES.inc(host=limiter.host,
+                     reason=reason)
+    delay = (retry_after if retry_after is not None
+             else to_backoff_delay(attempt_num))
+    logger.debug(f'Attempt #{attempt_num} failed: '
+                 f'server "{url}" {failure}. '
+                 f'Waiting {delay:.2f} second(s) '
+                 'before next attempt.')
+    await sleep(delay)
+    return True
+
+
+async def read_json(response: ClientResponse, *,
+                    max_size: Optional[int]) -> Any:
+    if max_size is None:
+        return await response.json()
+    if (response.content_length is not None
+            and response.content_length > max_size):
+        raise ResponseTooLargeError(f'size {response.content_length} '
+                                    f'exceeds {max_size} bytes.')
+    # content length is unknown for chunked responses
+    body = bytearray()
+    async for chunk in response.content.iter_any():
+        body.extend(chunk)
+        if len(body) > max_size:
+            raise ResponseTooLargeError(f'size exceeds {max_size} bytes.')
+    return json.loads(body.decode(response.charset or 'utf-8'))
+
+
+def to_backoff_delay(attempt_num: int) -> float:
+    # exponential backoff with "full jitter"
+    return random.uniform(0, min(BACKOFF_CAP_IN_SECONDS,
+                                 BACKOFF_BASE_IN_SECONDS
+                                 * 2 ** (attempt_num - 1)))
+
+
+def parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    try:
+        return min(float(retry_after), BACKOFF_CAP_IN_SECONDS)
+    except (TypeError, ValueError):
+        return None
@@ -1,3 +1,3 @@
 from .service import (get_articles_titles,
-                      get_imdb_id)
-from .plot import parse_plot_content
+                      get_imdb_ids)
+from .plot import get_plots_contents
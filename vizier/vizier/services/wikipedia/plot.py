@@ -1,13 +1,104 @@
-import wikipedia
+import re
+from asyncio import gather
+from typing import (Optional,
+                    Iterable,
+                    Dict, List)
+
+from aiohttp import ClientSession
+
+from vizier.config import WIKIPEDIA_API_TITLES_LIMIT
+from vizier.services.cache import ResponsesCache
+from vizier.utils import chunks
+from .query import query_pages
 
 PLOT_SECTION_NAMES = ['Plot', 'PlotEdit', 'Synopsis',
                       'Plot summary', 'Plot synopsis']
 
+SECTION_HEADING_RE = re.compile(r'^(?P<level>={2,6})\s*(?P<name>.+?)\s*'
+                                r'(?P=level)\s*$',
+                                re.MULTILINE)
+COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+REFERENCE_RE = re.compile(r'<ref[^>]*/>|<ref[^>]*>.*?</ref>',
+                          re.DOTALL | re.IGNORECASE)
+# innermost templates, nested ones are removed in several passes
+TEMPLATE_RE = re.compile(r'\{\{[^{}]*\}\}')
+FILE_LINK_RE = re.compile(r'\[\[(?:File|Image):'
+                          r'(?:[^\[\]]|\[\[[^\]]*\]\])*\]\]',
+                          re.IGNORECASE)
+WIKILINK_RE = re.compile(r'\[\[(?:[^|\]]*\|)?([^\]]*)\]\]')
+EXTERNAL_LINK_RE = re.compile(r'\[https?://\S+\s*([^\]]*)\]')
+TAG_RE = re.compile(r'<[^>]+>')
+EMPHASIS_RE = re.compile(r"'{2,}")
+
+
+async def get_plots_contents(articles_titles: Iterable[str], *,
+                             session: ClientSession,
+                             cache: Optional[ResponsesCache] = None
+                             ) -> Dict[str, str]:
+    batches = [
+        get_plots_contents_batch(articles_titles_batch,
+                                 session=session,
+                                 cache=cache)
+        for articles_titles_batch in chunks(articles_titles,
+                                            WIKIPEDIA_API_TITLES_LIMIT)]
+    res = {}
+    for plots_contents in await gather(*batches):
+        res.update(plots_contents)
+    return res
+
+
+async def get_plots_contents_batch(articles_titles: List[str], *,
+                                   session: ClientSession,
+                                   cache: Optional[ResponsesCache] = None
+                                   ) -> Dict[str, str]:
+    params = dict(prop='revisions',
+                  rvprop='content',
+                  rvslots='main')
+    pages = await query_pages(articles_titles,
+                              params=params,
+                              session=session,
+                              cache=cache)
+    res = {}
+    for article_title, page in pages.items():
+        try:
+            wikitext = (page['revisions'][0]
+                        ['slots']['main']['content'])
+        except (KeyError, IndexError):
+            continue
+        plot_content = parse_plot_content(wikitext)
+        if plot_content:
+            res[article_title] = plot_content
+    return res
+
+
+def parse_plot_content(wikitext: str) -> Optional[str]:
+    headings = list(SECTION_HEADING_RE.finditer(wikitext))
+    plot_sections = []
+    for index, heading in enumerate(headings):
+        if heading.group('name') not in PLOT_SECTION_NAMES:
+            continue
+        level = len(heading.group('level'))
+        section_end = next(
+            (next_heading.start()
+             for next_heading in headings[index + 1:]
+             if len(next_heading.group('level')) <= level),
+            len(wikitext))
+        plot_sections.append(wikitext[heading.end():section_end])
+    plot_content = strip_wikitext(' '.join(plot_sections))
+    return plot_content or None
+
 
-# TODO: replace 'wikipedia' library with async functions
-async def parse_plot_content(link: str) -> str:
-    page = wikipedia.page(link, auto_suggest=False)
-    plot_sections = filter(None,
-                           (page.section(section_title)
-                            for section_title in PLOT_SECTION_NAMES))
-    return ''.join(plot_sections).replace('\n', '')
+def strip_wikitext(wikitext: str) -> str:
+    text = COMMENT_RE.sub('', wikitext)
+    text = REFERENCE_RE.sub('', text)
+    while True:
+        text, substitutions_count = TEMPLATE_RE.subn('', text)
+        if not substitutions_count:
+            break
+    text = FILE_LINK_RE.sub('', text)
+    text = WIKILINK_RE.sub(r'\1', text)
+    text = EXTERNAL_LINK_RE.sub(r'\1', text)
+    text = SECTION_HEADING_RE.sub('', text)
+    text = TAG_RE.sub('', text)
+    text = EMPHASIS_RE.sub('', text)
+    return ' '.join(text.split())
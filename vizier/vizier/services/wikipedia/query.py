@@ -0,0 +1,69 @@
+from typing import (Any,
+                    Optional,
+                    Dict, List)
+
+from aiohttp import ClientSession
+
+from vizier.config import WIKIPEDIA_API_URL
+from vizier.services.cache import ResponsesCache
+from vizier.services.utils import get_json
+
+
+async def query_pages(titles: List[str], *,
+                      params: Dict[str, str],
+                      session: ClientSession,
+                      cache: Optional[ResponsesCache] = None
+                      ) -> Dict[str, Dict[str, Any]]:
+    params = dict(action='query',
+                  titles='|'.join(titles),
+                  redirects='1',
+                  format='json',
+                  formatversion='2',
+                  **params)
+    pages_by_titles = {}
+    resolved_titles = {}
+    continuation = {}
+    while True:
+        response_json = await get_json(WIKIPEDIA_API_URL,
+                                       params={**params,
+                                               **continuation},
+                                       session=session,
+                                       cache=cache)
+        if response_json is None:
+            break
+        query = response_json.get('query', {})
+        for replacement in (query.get('normalized', [])
+                            + query.get('redirects', [])):
+            resolved_titles[replacement['from']] = replacement['to']
+        for page in query.get('pages', []):
+            if page.get('missing') or page.get('invalid'):
+                continue
+            # during continuation pages come back partially filled
+            pages_by_titles.setdefault(page['title'], {}).update(page)
+        try:
+            continuation = response_json['continue']
+        except KeyError:
+            break
+
+    res = {}
+    for title in titles:
+        page_title = resolve_title(title,
+                                   resolved_titles=resolved_titles)
+        try:
+            res[title] = pages_by_titles[page_title]
+        except KeyError:
+            continue
+    return res
+
+
+def resolve_title(title: str, *,
+                  resolved_titles: Dict[str, str]) -> str:
+    # normalization comes before redirection
+    # and redirects can point to other redirects
+    seen_titles = {title}
+    while title in resolved_titles:
+        title = resolved_titles[title]
+        if title in seen_titles:
+            break
+        seen_titles.add(title)
+    return title
@@ -1,15 +1,27 @@
 import re
+from asyncio import gather
 from typing import (Optional,
-                    Iterable)
+                    AsyncIterator,
+                    Iterable,
+                    Dict, List)
 
 from aiohttp import ClientSession
 
-from vizier.config import WIKIPEDIA_API_URL
-from vizier.utils import IMDB_ID_RE
+from vizier.config import (WIKIDATA_API_URL,
+                           WIKIPEDIA_API_TITLES_LIMIT)
+from vizier.services.cache import ResponsesCache
+from vizier.services.utils import get_json
+from vizier.utils import (IMDB_ID_RE,
+                          chunks)
 from .petscan import query_petscan
+from .query import query_pages
 
 FILE_ATTACHMENT_RE = re.compile(r'File:[^\.]+\.')
 
+WIKIDATA_ITEM_PAGE_PROPERTY = 'wikibase_item'
+# "IMDb ID" Wikidata property
+IMDB_ID_PROPERTY = 'P345'
+
 WIKILINKS_EXCEPTION = {'Keerthi Chakra',
                        'A Thousand Acres',
                        'Star Trek',
@@ -23,14 +35,14 @@ WIKILINKS_EXCEPTION = {'Keerthi Chakra',
 
 
 async def get_articles_titles(*, year: int,
-                              session: ClientSession
-                              ) -> Iterable[str]:
-    articles_dicts = await query_petscan(categories=f'{year}_films',
-                                         session=session)
-    articles_titles = (article_dict['title']
-                       for article_dict in articles_dicts)
-    articles_titles = filter(is_title_correct, articles_titles)
-    return articles_titles
+                              session: ClientSession,
+                              cache: Optional[ResponsesCache] = None
+                              ) -> AsyncIterator[str]:
+    async for title in query_petscan(categories=f'{year}_films',
+                                     session=session,
+                                     cache=cache):
+        if is_title_correct(title):
+            yield title
 
 
 def is_title_correct(title: str) -> bool:
@@ -42,20 +54,76 @@ def is_title_correct(title: str) -> bool:
             not FILE_ATTACHMENT_RE.search(title))
 
 
-async def get_imdb_id(article_title: str, *,
-                      session: ClientSession
-                      ) -> Optional[int]:
-    params = dict(action='expandtemplates',
-                  text='{{IMDb title}}',
-                  prop='wikitext',
-                  title=article_title,
+async def get_imdb_ids(articles_titles: Iterable[str], *,
+                       session: ClientSession,
+                       cache: Optional[ResponsesCache] = None
+                       ) -> Dict[str, int]:
+    batches = [
+        get_imdb_ids_batch(articles_titles_batch,
+                           session=session,
+                           cache=cache)
+        for articles_titles_batch in chunks(articles_titles,
+                                            WIKIPEDIA_API_TITLES_LIMIT)]
+    res = {}
+    for imdb_ids in await gather(*batches):
+        res.update(imdb_ids)
+    return res
+
+
+async def get_imdb_ids_batch(articles_titles: List[str], *,
+                             session: ClientSession,
+                             cache: Optional[ResponsesCache] = None
+                             ) -> Dict[str, int]:
+    pages = await query_pages(articles_titles,
+                              params=dict(prop='pageprops',
+                                          ppprop=WIKIDATA_ITEM_PAGE_PROPERTY),
+                              session=session,
+                              cache=cache)
+    wikidata_items_ids = {}
+    for article_title, page in pages.items():
+        try:
+            wikidata_item_id = (page['pageprops']
+                                [WIKIDATA_ITEM_PAGE_PROPERTY])
+        except KeyError:
+            continue
+        wikidata_items_ids[article_title] = wikidata_item_id
+    if not wikidata_items_ids:
+        return {}
+    wikidata_imdb_ids = await query_wikidata_imdb_ids(
+        sorted(set(wikidata_items_ids.values())),
+        session=session,
+        cache=cache)
+    return {article_title: wikidata_imdb_ids[wikidata_item_id]
+            for article_title, wikidata_item_id in wikidata_items_ids.items()
+            if wikidata_item_id in wikidata_imdb_ids}
+
+
+async def query_wikidata_imdb_ids(wikidata_items_ids: Iterable[str], *,
+                                  session: ClientSession,
+                                  cache: Optional[ResponsesCache] = None
+                                  ) -> Dict[str, int]:
+    params = dict(action='wbgetentities',
+                  ids='|'.join(wikidata_items_ids),
+                  props='claims',
                   format='json')
-    async with session.get(WIKIPEDIA_API_URL,
-                           params=params) as response:
-        response_json = await response.json()
-        templates = response_json['expandtemplates']
-        imdb_link = templates.get('wikitext', '')
-        search_res = IMDB_ID_RE.search(imdb_link)
-        if search_res is None:
-            return None
-        return int(search_res.group(0))
+    response_json = await get_json(WIKIDATA_API_URL,
+                                   params=params,
+                                   session=session,
+                                   cache=cache)
+    if response_json is None:
+        return {}
+    res = {}
+    for wikidata_item_id, entity in response_json.get('entities',
+                                                      {}).items():
+        claims = entity.get('claims', {}).get(IMDB_ID_PROPERTY, [])
+        for claim in claims:
+            try:
+                imdb_link = claim['mainsnak']['datavalue']['value']
+            except KeyError:
+                continue
+            search_res = IMDB_ID_RE.search(imdb_link)
+            if search_res is None:
+                continue
+            res[wikidata_item_id] = int(search_res.group(0))
+            break
+    return res
@@ -1,6 +1,11 @@
 import logging
 import re
-from typing import Iterable
+from itertools import islice
+from typing import (Any,
+                    AsyncIterator,
+                    Iterable,
+                    Iterator,
+                    List)
 
 logger = logging.getLogger(__name__)
 
@@ -9,3 +14,24 @@ IMDB_ID_RE = re.compile(r'(?<=tt)(\d+)')
 
 def join_str(elements: Iterable, sep=',') -> str:
     return sep.join(map(str, elements))
+
+
+def chunks(elements: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(elements)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def async_chunks(elements: AsyncIterator[Any],
+                       size: int) -> AsyncIterator[List]:
+    chunk = []
+    async for element in elements:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk